@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+announce_queue.py
+
+Cross-process announcement queue shared by the web interface and the announcer.
+The web interface drops job files into a spool directory and returns a job id
+immediately; the announcer claims them in priority order, synthesizes and plays
+them through its playback engine, and records the job status so the web
+interface can report progress. Only the announcer process touches the audio
+device, so instant announcements can no longer overlap scheduled ones.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import playback
+
+logger = logging.getLogger("announce_queue")
+
+DEFAULT_QUEUE_DIR = "announce_queue"
+POLL_INTERVAL_SECONDS = 0.25
+# Finished job status files older than this are removed
+STATUS_RETENTION_SECONDS = 24 * 60 * 60
+# Jobs not updated for this long are not reported as active (e.g. the announcer was stopped)
+ACTIVE_JOB_MAX_AGE_SECONDS = 10 * 60
+FINISHED_STATUSES = ("done", "failed", "timeout", "preempted")
+
+
+def _pending_dir(directory: str) -> str:
+    return os.path.join(directory, "pending")
+
+
+def _status_dir(directory: str) -> str:
+    return os.path.join(directory, "jobs")
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _valid_job_id(job_id: str) -> bool:
+    return bool(job_id) and all(c in "0123456789abcdef" for c in job_id)
+
+
+def create_job(text: str, priority: int = playback.PRIORITY_INSTANT, kind: str = "instant",
+               directory: str = DEFAULT_QUEUE_DIR) -> Dict[str, Any]:
+    """
+    Record a new queued job so its status can be reported, and return it.
+    The job still has to be spooled (submit) or dispatched by the announcer.
+    """
+    os.makedirs(_status_dir(directory), exist_ok=True)
+    job = {
+        "id": uuid.uuid4().hex,
+        "text": text,
+        "kind": kind,
+        "priority": priority,
+        "status": "queued",
+        "submitted": time.time()
+    }
+    _write_json_atomic(os.path.join(_status_dir(directory), f"{job['id']}.json"), job)
+    return job
+
+
+def submit(text: str, priority: int = playback.PRIORITY_INSTANT, kind: str = "instant",
+           directory: str = DEFAULT_QUEUE_DIR) -> str:
+    """
+    Queue an announcement for the announcer process. Returns the job id.
+    """
+    os.makedirs(_pending_dir(directory), exist_ok=True)
+    job = create_job(text, priority, kind, directory)
+    # Zero-padded priority and timestamp make directory order the claim order
+    name = f"{priority:03d}-{time.time_ns():020d}-{job['id']}.json"
+    _write_json_atomic(os.path.join(_pending_dir(directory), name), job)
+    return job["id"]
+
+
+def get_status(job_id: str, directory: str = DEFAULT_QUEUE_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Return the recorded status of a job, or None if it is unknown.
+    """
+    if not _valid_job_id(job_id):
+        return None
+    try:
+        with open(os.path.join(_status_dir(directory), f"{job_id}.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_status(job: Dict[str, Any], status: str, directory: str = DEFAULT_QUEUE_DIR, **fields) -> None:
+    """
+    Record a new status for a job.
+    """
+    job.update(fields)
+    job["status"] = status
+    job["updated"] = time.time()
+    try:
+        _write_json_atomic(os.path.join(_status_dir(directory), f"{job['id']}.json"), job)
+    except OSError as e:
+        logger.warning("Could not record status for announcement job %s: %s", job['id'], e)
+
+
+def claim_pending(directory: str = DEFAULT_QUEUE_DIR) -> List[Dict[str, Any]]:
+    """
+    Remove and return all pending jobs in priority order.
+    """
+    pending = _pending_dir(directory)
+    try:
+        names = sorted(n for n in os.listdir(pending) if n.endswith(".json"))
+    except FileNotFoundError:
+        return []
+    jobs = []
+    for name in names:
+        path = os.path.join(pending, name)
+        try:
+            with open(path) as f:
+                job = json.load(f)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as e:
+            logger.error("Discarding unreadable announcement job %s: %s", name, e)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        jobs.append(job)
+    return jobs
+
+
+def active_jobs(directory: str = DEFAULT_QUEUE_DIR, max_age: float = ACTIVE_JOB_MAX_AGE_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Return jobs that are queued, synthesizing or playing, oldest first.
+    Only status files updated within max_age seconds are read.
+    """
+    cutoff = time.time() - max_age
+    jobs = []
+    try:
+        entries = list(os.scandir(_status_dir(directory)))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                continue
+            with open(entry.path) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if job.get("status") not in FINISHED_STATUSES:
+            jobs.append(job)
+    return sorted(jobs, key=lambda job: job.get("submitted", 0))
+
+
+def prune_status(directory: str = DEFAULT_QUEUE_DIR, max_age: float = STATUS_RETENTION_SECONDS) -> int:
+    """
+    Delete status files of jobs that finished more than max_age seconds ago.
+    """
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(_status_dir(directory)))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class QueueConsumer:
+    """
+    Announcer-side consumer that claims queued jobs and hands them to the playback engine.
+    Runs either as its own thread (start) or as a task on an event loop (run_async).
+    """
+    def __init__(self, synthesize: Callable[[str], Optional[str]],
+                 engine_getter: Callable[[], playback.PlaybackEngine],
+                 directory: str = DEFAULT_QUEUE_DIR,
+                 shutdown_event: Optional[threading.Event] = None,
+                 speak: Optional[Callable[..., Optional[playback.PlaybackJob]]] = None):
+        self.synthesize = synthesize
+        # Optional speak(text, priority, on_status) that synthesizes (or streams) and queues playback itself
+        self.speak = speak
+        self.engine_getter = engine_getter
+        self.directory = directory
+        self.shutdown_event = shutdown_event or threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _prepare(self) -> None:
+        os.makedirs(_pending_dir(self.directory), exist_ok=True)
+        os.makedirs(_status_dir(self.directory), exist_ok=True)
+        prune_status(self.directory)
+        logger.info("Announcement queue consumer watching %s", self.directory)
+
+    def start(self) -> None:
+        self._prepare()
+        self._thread = threading.Thread(target=self._run, name="announce-queue", daemon=True)
+        self._thread.start()
+
+    async def run_async(self) -> None:
+        """
+        Process the queue as a task on the running event loop.
+        Spool I/O and synthesis run in the loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._prepare)
+        while not self.shutdown_event.is_set():
+            try:
+                await loop.run_in_executor(None, self.process_pending)
+            except Exception as e:
+                logger.error("Announcement queue processing failed: %s", e, exc_info=True)
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    def process_pending(self) -> int:
+        """
+        Claim and dispatch every pending job. Returns the number dispatched.
+        """
+        dispatched = 0
+        for job in claim_pending(self.directory):
+            self.dispatch(job)
+            dispatched += 1
+        return dispatched
+
+    def dispatch(self, job: Dict[str, Any]) -> None:
+        """
+        Synthesize a job and hand it to the playback engine. Never raises: a
+        failure is logged and recorded in the job's status, so it is not left
+        reported as synthesizing.
+        """
+        try:
+            self._dispatch(job)
+        except Exception as e:
+            logger.error("Dispatching announcement %s failed: %s", job.get('id'), e, exc_info=True)
+            update_status(job, "failed", self.directory, error=str(e))
+
+    def _dispatch(self, job: Dict[str, Any]) -> None:
+        logger.info("Dispatching queued %s announcement %s", job.get('kind', 'instant'), job['id'])
+        update_status(job, "synthesizing", self.directory)
+
+        def on_status(playback_job: playback.PlaybackJob) -> None:
+            fields = {}
+            if playback_job.error:
+                fields["error"] = playback_job.error
+            if playback_job.start_latency is not None:
+                fields["start_latency"] = playback_job.start_latency
+            update_status(job, playback_job.status, self.directory, **fields)
+
+        priority = int(job.get("priority", playback.PRIORITY_INSTANT))
+        if self.speak is not None:
+            if self.speak(job["text"], priority, on_status) is None:
+                update_status(job, "failed", self.directory, error="Failed to synthesize speech")
+            return
+        path = self.synthesize(job["text"])
+        if not path:
+            update_status(job, "failed", self.directory, error="Failed to synthesize speech")
+            return
+        self.engine_getter().submit(path, cleanup=False, priority=priority, on_status=on_status)
+
+    def _run(self) -> None:
+        while not self.shutdown_event.is_set():
+            try:
+                self.process_pending()
+            except Exception as e:
+                logger.error("Announcement queue processing failed: %s", e, exc_info=True)
+            self.shutdown_event.wait(POLL_INTERVAL_SECONDS)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+announcement_templates.py
+
+Compiled announcement templates. A template is parsed once into its
+placeholders, which are checked against the variables an announcement slot
+provides, so a misspelled placeholder is rejected when the template is saved
+in the web interface (and reported when the announcer loads the file) instead
+of failing when the announcement is due.
+
+Variables available to every template:
+
+    {time}               the slot time, e.g. "2:30 PM"
+    {color1}, {color2}   the color at each rotation position, as many as the
+                         database returns; missing positions read "unknown"
+    {color_count}        number of colors in the rotation
+    {next_color}         the color that moves to position 1 at the next rotation
+    {minutes_remaining}  minutes until the color order next advances
+
+Rendered text is memoized per template and the values of the variables it
+uses. The text is also what keys the audio cache, so a slot that renders to
+the same sentence as an earlier one reuses its audio without synthesis.
+"""
+
+import functools
+import logging
+import re
+import string
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger("announcement_templates")
+
+VARIABLES = ('time', 'color_count', 'next_color', 'minutes_remaining')
+COLOR_FIELD = re.compile(r'color([1-9][0-9]*)$')
+UNKNOWN_VALUE = 'unknown'
+COMPILED_CACHE_SIZE = 256
+RENDERED_CACHE_SIZE = 1024
+
+# Values used to check format specs and conversions when a template is compiled:
+# a full rotation, and no rotation, where every color and minutes_remaining read "unknown"
+_SAMPLE_VALUES = {'time': '12:00 PM', 'color_count': 4, 'next_color': 'Red', 'minutes_remaining': 30}
+_FALLBACK_VALUES = {'time': '12:00 PM', 'color_count': 0}
+
+
+class TemplateError(ValueError):
+    """
+    A template that cannot be parsed or uses a placeholder no slot provides.
+    """
+
+
+def is_variable(name: str) -> bool:
+    return name in VARIABLES or COLOR_FIELD.match(name) is not None
+
+
+def describe_variables() -> str:
+    return '{time}, {color1}, {color2}, ..., ' + ', '.join('{' + name + '}' for name in VARIABLES[1:])
+
+
+def value_of(field: str, variables: Mapping[str, Any]) -> Any:
+    """
+    The value of a placeholder. Color positions the rotation does not have
+    read "unknown"; any other missing variable raises KeyError.
+    """
+    if field in variables:
+        return variables[field]
+    if COLOR_FIELD.match(field):
+        return UNKNOWN_VALUE
+    raise KeyError(field)
+
+
+class CompiledTemplate:
+    """
+    A parsed and validated template. fields holds the placeholder names it uses.
+    """
+    def __init__(self, text: str):
+        self.text = text
+        try:
+            pieces = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Invalid template {text!r}: {e}") from None
+        fields = []
+        for _, field, spec, _ in pieces:
+            if field is None:
+                continue
+            if not field or field.isdigit():
+                raise TemplateError(f"Placeholders need a name, e.g. {{time}} (in {text!r})")
+            if not is_variable(field):
+                raise TemplateError(f"Unknown placeholder {{{field}}} in {text!r}; "
+                                    f"available: {describe_variables()}")
+            if spec and '{' in spec:
+                raise TemplateError(f"Nested placeholders are not supported (in {text!r})")
+            fields.append(field)
+        self.fields: Tuple[str, ...] = tuple(sorted(set(fields)))
+        try:
+            text.format(**{field: _SAMPLE_VALUES.get(field, 'Red') for field in self.fields})
+            text.format(**{field: _FALLBACK_VALUES.get(field, UNKNOWN_VALUE) for field in self.fields})
+        except (ValueError, TypeError) as e:
+            raise TemplateError(f"Invalid format in {text!r}: {e} "
+                                f"(a value that is not available reads {UNKNOWN_VALUE!r})") from None
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        """
+        Fill the template. Only the variables it uses key the memoized result.
+        """
+        return _render(self.text, tuple((field, value_of(field, variables)) for field in self.fields))
+
+
+@functools.lru_cache(maxsize=RENDERED_CACHE_SIZE)
+def _render(text: str, values: Tuple[Tuple[str, Any], ...]) -> str:
+    return text.format(**dict(values))
+
+
+@functools.lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_template(text: str) -> CompiledTemplate:
+    """
+    Compile a template once; raises TemplateError if it is invalid.
+    """
+    return CompiledTemplate(text)
+
+
+def check_templates(templates: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Compile every template of an [announcements] section.
+    Returns {key: error} for the invalid ones.
+    """
+    errors = {}
+    for key, text in templates.items():
+        try:
+            compile_template(text)
+        except TemplateError as e:
+            errors[key] = str(e)
+    return errors
+
+
+def build_variables(time_text: str, color_data: Optional[Mapping[str, Mapping[str, str]]],
+                    minutes_remaining: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Build the template variables from the slot time and a color order as
+    returned by the rotation query (any number of positions).
+    """
+    variables: Dict[str, Any] = {}
+    for name, entry in (color_data or {}).items():
+        if COLOR_FIELD.match(name):
+            variables[name] = entry.get('color', UNKNOWN_VALUE) if isinstance(entry, Mapping) else str(entry)
+    count = len(variables)
+    variables['time'] = time_text
+    variables['color_count'] = count
+    # Each rotation moves every color up one position
+    variables['next_color'] = variables.get('color2' if count > 1 else 'color1', UNKNOWN_VALUE)
+    variables['minutes_remaining'] = minutes_remaining if minutes_remaining is not None else UNKNOWN_VALUE
+    return variables
@@ -5,44 +5,102 @@ announcer.py
 This module handles announcement operations including configuration loading,
 speech synthesis, playing sounds, and fetching color data from the database.
 It includes improved concurrency (global RLock and file locking with fcntl),
-a retry mechanism for transient errors, and enhanced logging.
+pooled database connections that retry transient errors (db_pool.py), and
+queued, rotated logging (log_setup.py).
+The announcer runs on a single long-lived asyncio event loop (see run()),
+exports its metrics on 127.0.0.1:9464/metrics (see metrics.py) and takes
+commands from the web interface on the announcer.sock control socket (see control.py).
 """
 
 import asyncio
-import edge_tts
 import pymssql
 import datetime
 import time
 import sys
 import os
 import logging
-import subprocess
 import threading
-import random
-import functools
-from typing import Optional, Dict, Tuple
-from contextlib import contextmanager
+import signal
+from typing import Optional, Dict, List, Tuple
 import fcntl
 
+import announce_queue
+import announcement_templates
+import audio_cache
+import config_store
+import config_watcher as config_watcher_module
+import color_rotation
+import control
+import db_pool
+import fragments
+import log_setup
+import metrics
+import playback
+import prerender
+import schedule_engine
+import status_board as status_board_module
+import streaming
+import timing
+import tts_backends
+import tts_pool
+# Re-exported for settings.py and other callers
+from config_store import locked_file
+
+logger = logging.getLogger("announcer")
+
 # Global lock for shared resources and thread safety
 global_lock = threading.RLock()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler("announcement_script.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
 # Global flag to signal configuration reload
 config_reload_signal = False
+# Configuration file to load on the next reload, set by the control socket's switch_config
+_requested_config: Optional[str] = None
+# Set by explicit reload requests, which are applied without waiting for edits to settle
+_reload_immediately = False
+
+# The announcer's event loop while run() is active; synthesis from worker threads is scheduled on it
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Watcher that reports configuration changes; None until main() starts it
+config_watcher: Optional["config_watcher_module.ConfigWatcher"] = None
+
+# Live status shared with the web interface; None until run() opens it
+status_board: Optional["status_board_module.StatusBoard"] = None
+
+# Color rotation inputs for minutes_remaining in templates; None until run() creates it
+rotation_engine: Optional[color_rotation.RotationEngine] = None
+
+# Speech synthesis pools keyed by backend and pool settings
+_synthesis_pools: Dict[tuple, tts_pool.SynthesisPool] = {}
+
+# Database connection pools keyed by connection settings
+_db_pools: Dict[Tuple[str, str, str, str], db_pool.ConnectionPool] = {}
+# Last color order successfully read from the database and when it was read
+_last_known_colors: Optional[Dict[str, Dict[str, str]]] = None
+_last_known_colors_at: Optional[datetime.datetime] = None
+
+# Wristband color names produced by the color rotation query
+COLOR_NAMES = list(color_rotation.COLOR_CODES.values()) + [color_rotation.UNKNOWN_COLOR]
+
+# A burst of configuration changes (e.g. several edits in the web interface) is
+# reloaded once, after no change has arrived for this long...
+RELOAD_SETTLE_SECONDS = 1.5
+# ...but never later than this after the first change of the burst
+RELOAD_MAX_DELAY_SECONDS = 10.0
+
+COLOR_QUERY_SECONDS = metrics.histogram("announcer_color_query_seconds",
+                                        "Color rotation queries against the database by outcome", ["result"])
+COLOR_SOURCE = metrics.counter("announcer_color_fetches_total",
+                               "Color orders used for announcements by source", ["source"])
+RENDER_SECONDS = metrics.histogram("announcer_render_seconds",
+                                   "Rendering and synthesizing a scheduled announcement before its slot")
+ANNOUNCEMENTS = metrics.counter("announcer_announcements_total",
+                                "Scheduled announcements by type and result", ["type", "result"])
+CONFIG_RELOADS = metrics.counter("announcer_config_reloads_total", "Configuration reloads by result", ["result"])
 
 class Config:
     def __init__(self):
+        self.path: Optional[str] = None
         self.database = {
             "server": "",
             "database": "",
@@ -58,80 +116,89 @@ class Config:
         }
         self.tts = {
             "voice_id": "",
-            "output_format": "mp3"
+            "output_format": "mp3",
+            "cache_dir": audio_cache.DEFAULT_CACHE_DIR,
+            "cache_max_mb": str(audio_cache.DEFAULT_MAX_BYTES // (1024 * 1024)),
+            "cache_max_age_days": str(audio_cache.DEFAULT_MAX_AGE_SECONDS // (24 * 60 * 60)),
+            "prerender_count": str(prerender.DEFAULT_PRERENDER_COUNT),
+            "assembly": "sentence",
+            "player": "mpg123",
+            "playback_timeout": str(int(playback.DEFAULT_TIMEOUT_SECONDS)),
+            "backends": tts_backends.DEFAULT_BACKENDS,
+            "backend_selection": "order",
+            "backend_timeout": str(int(tts_backends.DEFAULT_ATTEMPT_TIMEOUT_SECONDS)),
+            "espeak_voice": tts_backends.DEFAULT_ESPEAK_VOICE,
+            "streaming": "false",
+            "synthesis_workers": str(tts_pool.DEFAULT_CONCURRENCY),
+            "synthesis_timeout": str(int(tts_pool.DEFAULT_TIMEOUT_SECONDS)),
+            "hedge_after": str(int(tts_pool.DEFAULT_HEDGE_AFTER_SECONDS))
         }
+        # Optional [logging] section: levels and rotation (see log_setup.py)
+        self.logging = {}
 
 def get_day_config_filename() -> str:
     """
-    Get the appropriate config filename based on the current day.
+    Get the appropriate config filename based on the current operating day.
+    The day changes at the 1:00 AM reload, not at midnight.
     Returns the default config.ini if not an operating day.
     """
-    days_mapping = {
-    0: "mon.ini",    # Monday
-    1: "tue.ini",    # Tuesday
-    2: "wed.ini",    # Wednesday
-    3: "thurs.ini",  # Thursday
-    4: "fri.ini",    # Friday
-    5: "sat.ini",    # Saturday
-    6: "sun.ini"     # Sunday
-}
-
-    current_day = datetime.datetime.now().weekday()
-    return days_mapping.get(current_day, "config.ini")
+    current_day = schedule_engine.operating_weekday(datetime.datetime.now())
+    return schedule_engine.DAY_CONFIG_FILES.get(current_day, schedule_engine.DEFAULT_CONFIG_FILE)
 
 def check_for_config_changes() -> bool:
     """
     Check if there's a request to reload the configuration.
-    Checks both the reload_config file and the global reload signal.
+    Checks the changes reported by the configuration watcher (or, without a
+    watcher, the reload_config file) and the global reload signal.
     """
     global config_reload_signal
-    if os.path.exists("reload_config"):
-        logging.info("Found reload_config file – signaling configuration reload")
-        return True
+    if config_watcher is None:
+        if os.path.exists("reload_config"):
+            logger.info("Found reload_config file – signaling configuration reload")
+            return True
+    else:
+        # The marker's own removal by load_config is not a reload request
+        changed = [name for name in config_watcher.consume_changes()
+                   if name != config_watcher_module.RELOAD_MARKER or os.path.exists(name)]
+        if changed:
+            logger.info("Configuration files changed (%s) – signaling configuration reload", ', '.join(changed))
+            return True
     if config_reload_signal:
-        logging.info("Detected configuration reload signal")
+        logger.info("Detected configuration reload signal")
         with global_lock:
             config_reload_signal = False
         return True
     return False
 
-# File locking context manager using fcntl
-@contextmanager
-def locked_file(filepath, mode='r', lock_type=fcntl.LOCK_SH):
-    with open(filepath, mode) as f:
-        fcntl.flock(f, lock_type)
-        try:
-            yield f
-        finally:
-            fcntl.flock(f, fcntl.LOCK_UN)
-
-# Retry decorator with exponential backoff
-def retry(exceptions, tries=3, delay=1, backoff=2, jitter=0.1):
-    def decorator_retry(func):
-        @functools.wraps(func)
-        def wrapper_retry(*args, **kwargs):
-            _tries = tries
-            _delay = delay
-            while _tries > 1:
-                try:
-                    return func(*args, **kwargs)
-                except exceptions as e:
-                    logging.error(f"{func.__name__} error: {e}, retrying in {_delay} seconds")
-                    time.sleep(_delay + random.uniform(0, jitter))
-                    _tries -= 1
-                    _delay *= backoff
-            return func(*args, **kwargs)
-        return wrapper_retry
-    return decorator_retry
+def config_from_snapshot(snapshot: config_store.ConfigSnapshot) -> Config:
+    """
+    Build a Config from a parsed configuration snapshot.
+    """
+    config = Config()
+    config.path = snapshot.path
+    config.database.update(snapshot.section('database'))
+    config.times.update(snapshot.section('times'))
+    config.announcements.update(snapshot.section('announcements'))
+    config.logging.update(snapshot.section('logging'))
+    for key, value in snapshot.section('tts').items():
+        if key in ('output_format', 'assembly', 'player', 'backends', 'backend_selection'):
+            config.tts[key] = value.lower()
+        elif key in config.tts:
+            config.tts[key] = value
+    return config
 
 def load_config(config_path: Optional[str] = None) -> Config:
     """
     Load configuration from the specified path or determine the appropriate day-based config.
     Uses file locking when accessing the reload_config and configuration files.
     """
-    global config_reload_signal
+    global config_reload_signal, _requested_config, _reload_immediately
     with global_lock:
         config_reload_signal = False
+        if config_path is None:
+            config_path = _requested_config
+        _requested_config = None
+        _reload_immediately = False
 
     try:
         if os.path.exists("reload_config"):
@@ -139,54 +206,35 @@ def load_config(config_path: Optional[str] = None) -> Config:
                 requested_config = f.read().strip()
             if requested_config and os.path.exists(requested_config):
                 config_path = requested_config
-                logging.info(f"Loading requested configuration from reload_config: {config_path}")
+                logger.info("Loading requested configuration from reload_config: %s", config_path)
             try:
                 with locked_file("reload_config", "w", fcntl.LOCK_EX) as f:
                     pass
                 os.remove("reload_config")
             except Exception as e:
-                logging.warning(f"Could not remove reload_config file: {e}")
+                logger.warning("Could not remove reload_config file: %s", e)
 
         if config_path is None:
             config_path = get_day_config_filename()
 
-        config = Config()
-        current_section = None
-
         if not os.path.exists(config_path):
-            logging.error(f"Config file not found: {config_path}")
+            logger.error("Config file not found: %s", config_path)
             if config_path != "config.ini":
-                logging.warning("Falling back to default config.ini")
+                logger.warning("Falling back to default config.ini")
                 config_path = "config.ini"
                 if not os.path.exists(config_path):
                     raise FileNotFoundError(f"Default config file not found: {config_path}")
             else:
                 raise FileNotFoundError(f"Config file not found: {config_path}")
 
-        logging.info(f"Loading configuration from {config_path}")
-        with locked_file(config_path, "r", fcntl.LOCK_SH) as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if line.startswith('[') and line.endswith(']'):
-                    current_section = line[1:-1].lower()
-                    continue
-                if '=' not in line:
-                    continue
-                key, value = [x.strip() for x in line.split('=', 1)]
-                clean_value = value.strip('"\'')
-                if current_section == 'database':
-                    config.database[key.lower()] = clean_value
-                elif current_section == 'times':
-                    config.times[key] = clean_value
-                elif current_section == 'announcements':
-                    config.announcements[key.lower()] = clean_value
-                elif current_section == 'tts':
-                    if key.lower() == 'voice_id':
-                        config.tts['voice_id'] = clean_value
-                    elif key.lower() == 'output_format':
-                        config.tts['output_format'] = clean_value.lower()
+        logger.info("Loading configuration from %s", config_path)
+        snapshot = config_store.load(config_path)
+        if snapshot is None:
+            raise FileNotFoundError(f"Config file not found: {config_path}")
+        config = config_from_snapshot(snapshot)
+        # Compiling here also warms the template cache used at announcement time
+        for key, error in announcement_templates.check_templates(config.announcements).items():
+            logger.error("Template %s in %s will not be announced: %s", key, config_path, error)
 
         if not all([config.database['server'], config.database['database'],
                     config.database['username'], config.database['password']]):
@@ -194,59 +242,41 @@ def load_config(config_path: Optional[str] = None) -> Config:
         if not config.tts['voice_id']:
             raise ValueError("Missing required TTS voice_id configuration")
 
-        logging.info("Configuration loaded successfully")
+        logger.info("Configuration loaded successfully")
         return config
     except Exception as e:
-        logging.error(f"Error loading config: {e}", exc_info=True)
+        logger.error("Error loading config: %s", e, exc_info=True)
         raise
 
-def calculate_next_1am() -> datetime.datetime:
+def connect_db(config: Config):
     """
-    Calculate the next 1:00 AM time.
-    If current time is after 1 AM, returns 1 AM of the next day.
+    Open a connection to the CenterEdge database.
     """
-    now = datetime.datetime.now()
-    next_1am = now.replace(hour=1, minute=0, second=0, microsecond=0)
-    if now.hour >= 1:
-        next_1am += datetime.timedelta(days=1)
-    return next_1am
+    return pymssql.connect(
+        server=config.database['server'],
+        user=config.database['username'],
+        password=config.database['password'],
+        database=config.database['database'],
+        timeout=30
+    )
 
-def schedule_config_reload(shutdown_event: threading.Event) -> None:
+def get_db_pool(config: Config) -> db_pool.ConnectionPool:
     """
-    Schedule a daily configuration reload at 1:00 AM.
+    Return the persistent connection pool for the configured database.
     """
-    global config_reload_signal
-    while not shutdown_event.is_set():
-        now = datetime.datetime.now()
-        next_1am = calculate_next_1am()
-        seconds_until_1am = (next_1am - now).total_seconds()
-        logging.info(f"Next configuration reload scheduled at {next_1am.strftime('%Y-%m-%d %H:%M:%S')} (in {int(seconds_until_1am)} seconds)")
-        while seconds_until_1am > 0 and not shutdown_event.is_set():
-            wait_time = min(60, seconds_until_1am)
-            if shutdown_event.wait(timeout=wait_time):
-                return
-            seconds_until_1am -= wait_time
-        if not shutdown_event.is_set():
-            logging.info("It's 1:00 AM - signaling day-specific configuration reload")
-            config_reload_signal = True
+    key = (config.database['server'], config.database['database'],
+           config.database['username'], config.database['password'])
+    with global_lock:
+        pool = _db_pools.get(key)
+        if pool is None:
+            for stale in _db_pools.values():
+                stale.close()
+            _db_pools.clear()
+            pool = db_pool.ConnectionPool(lambda: connect_db(config), name="CenterEdge")
+            _db_pools[key] = pool
+        return pool
 
-@retry(Exception, tries=3, delay=2, backoff=2)
-def get_color_message_from_db(config: Config) -> Optional[Dict[str, Dict[str, str]]]:
-    """
-    Fetch color data from the database, rotating every 30 minutes.
-    Retries automatically on transient errors.
-    """
-    try:
-        logging.info(f"Connecting to database: {config.database['server']}")
-        with pymssql.connect(
-            server=config.database['server'],
-            user=config.database['username'],
-            password=config.database['password'],
-            database=config.database['database'],
-            timeout=30
-        ) as conn:
-            with conn.cursor() as cursor:
-                query = """
+COLOR_ROTATION_QUERY = """
                 DECLARE @PrinterGroup INT = 1;
                 DECLARE @CurrentTime TIME = CAST(CURRENT_TIMESTAMP AS TIME);
                 DECLARE @ShiftStart TIME;
@@ -276,70 +306,338 @@ def get_color_message_from_db(config: Config) -> Optional[Dict[str, Dict[str, st
                 )
                 SELECT adjusted_position + 1 as position, color_name FROM ColorOrder ORDER BY position;
                 """
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                if not rows:
-                    logging.error("No colors found in database")
-                    return None
-                color_data = {}
-                for row in rows:
-                    position, color_name = row
-                    color_data[f'color{position}'] = {
-                        'color': str(color_name).strip(),
-                        'time': f'Interval {position}'
-                    }
-                    logging.info(f"Position {position} -> Color: {color_name}")
-                logging.info(f"Current color sequence: {color_data}")
-                return color_data
+
+def _run_color_query(conn) -> list:
+    cursor = conn.cursor()
+    try:
+        cursor.execute(COLOR_ROTATION_QUERY)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def query_colors_from_db(config: Config) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Run the color rotation query over the connection pool.
+    Raises if the database cannot be reached.
+    """
+    global _last_known_colors, _last_known_colors_at
+    pool = get_db_pool(config)
+    started = time.perf_counter()
+    try:
+        rows = pool.run(_run_color_query)
+    except Exception:
+        COLOR_QUERY_SECONDS.observe(time.perf_counter() - started, result="error")
+        raise
+    COLOR_QUERY_SECONDS.observe(time.perf_counter() - started, result="ok")
+    stats = pool.stats()
+    logger.info("Color query completed (connect %.0f ms, query %.0f ms)",
+                stats['last_connect_ms'], stats['last_query_ms'])
+    if not rows:
+        logger.error("No colors found in database")
+        return None
+    color_data = {}
+    for row in rows:
+        position, color_name = row
+        color_data[f'color{position}'] = {
+            'color': str(color_name).strip(),
+            'time': f'Interval {position}'
+        }
+        logger.debug("Position %s -> Color: %s", position, color_name)
+    logger.debug("Current color sequence: %s", color_data)
+    with global_lock:
+        _last_known_colors = color_data
+        _last_known_colors_at = datetime.datetime.now()
+    return color_data
+
+def last_known_good_colors() -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Return the last colors read from the database, rotated forward to now.
+    """
+    with global_lock:
+        colors, fetched_at = _last_known_colors, _last_known_colors_at
+    if not colors:
+        return None
+    return prerender.predict_colors(colors, fetched_at, datetime.datetime.now())
+
+def get_color_message_from_db(config: Config) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Fetch color data from the database, rotating every 30 minutes.
+    Uses the pooled connection; while the database is unreachable the
+    last-known-good colors are served instead.
+    """
+    try:
+        colors = query_colors_from_db(config)
+        COLOR_SOURCE.inc(source="database")
+        return colors
+    except Exception as e:
+        logger.error("Database error in get_color_message_from_db: %s", e, exc_info=True)
+        fallback = last_known_good_colors()
+        if fallback:
+            logger.warning("Database degraded – serving last-known-good colors")
+            COLOR_SOURCE.inc(source="last_known_good")
+            return fallback
+        raise
+
+def fetch_announcement_colors(config: Config, rotation_engine: color_rotation.RotationEngine) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Return the current color order, computed locally and verified against the database.
+    Falls back to the local result if the verification query fails, and to the
+    database result if the local rotation inputs are missing or out of date.
+    """
+    fetch_time = datetime.datetime.now()
+    local_colors = rotation_engine.colors_at(fetch_time)
+    if get_db_pool(config).degraded and local_colors:
+        logger.warning("Database degraded – skipping color verification")
+        COLOR_SOURCE.inc(source="local")
+        return local_colors
+    try:
+        db_colors = query_colors_from_db(config)
     except Exception as e:
-        logging.error(f"Database error in get_color_message_from_db: {e}", exc_info=True)
+        if local_colors:
+            logger.error("Color verification query failed, using locally computed colors: %s", e)
+            COLOR_SOURCE.inc(source="local")
+            return local_colors
+        fallback = last_known_good_colors()
+        if fallback:
+            logger.warning("Database degraded – serving last-known-good colors")
+            COLOR_SOURCE.inc(source="last_known_good")
+            return fallback
         raise
+    if local_colors is not None and rotation_engine.verify(fetch_time, db_colors):
+        logger.info("Locally computed color order verified against the database")
+        COLOR_SOURCE.inc(source="verified_local")
+        return local_colors
+    COLOR_SOURCE.inc(source="database")
+    return db_colors or local_colors
 
 async def synthesize_speech_async(text: str, voice_id: str, output_path: str) -> bool:
     """
     Synthesize speech using edge_tts and save the result to a file.
     """
+    return await tts_backends.EdgeBackend()(text, voice_id, output_path)
+
+def run_coroutine(coro):
+    """
+    Run a coroutine to completion from synchronous code and return its result.
+    In the announcer it is scheduled on the long-lived event loop (the caller
+    must be a worker thread, not the loop itself); elsewhere, such as in the
+    web interface, a short-lived loop is used.
+    """
+    loop = _event_loop
+    if loop is not None and loop.is_running():
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("run_coroutine() called from the event loop thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    return asyncio.run(coro)
+
+def get_audio_cache(tts: Dict[str, str]) -> audio_cache.AudioCache:
+    """
+    Return the shared audio cache configured by the [tts] section.
+    """
     try:
-        logging.info(f"Synthesizing speech (first 50 chars): {text[:50]}...")
-        communicate = edge_tts.Communicate(text, voice_id)
-        await communicate.save(output_path)
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            logging.info("Speech synthesis successful")
-            return True
+        max_bytes = int(float(tts.get('cache_max_mb', audio_cache.DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024)
+        max_age = float(tts.get('cache_max_age_days', audio_cache.DEFAULT_MAX_AGE_SECONDS / 86400)) * 86400
+    except ValueError:
+        logger.warning("Invalid audio cache budget in configuration; using defaults")
+        max_bytes, max_age = audio_cache.DEFAULT_MAX_BYTES, audio_cache.DEFAULT_MAX_AGE_SECONDS
+    return audio_cache.get_cache(tts.get('cache_dir') or audio_cache.DEFAULT_CACHE_DIR, max_bytes, max_age)
+
+def get_synthesis_pool(tts: Dict[str, str]) -> tts_pool.SynthesisPool:
+    """
+    Return the shared speech synthesis pool configured by the [tts] section.
+    """
+    backends = ','.join(name.strip() for name in (tts.get('backends') or tts_backends.DEFAULT_BACKENDS).split(','))
+    try:
+        workers = int(tts.get('synthesis_workers', tts_pool.DEFAULT_CONCURRENCY))
+        timeout = float(tts.get('synthesis_timeout', tts_pool.DEFAULT_TIMEOUT_SECONDS))
+        hedge_after = float(tts.get('hedge_after', tts_pool.DEFAULT_HEDGE_AFTER_SECONDS))
+    except ValueError:
+        logger.warning("Invalid synthesis pool settings in configuration; using defaults")
+        workers, timeout, hedge_after = (tts_pool.DEFAULT_CONCURRENCY, tts_pool.DEFAULT_TIMEOUT_SECONDS,
+                                         tts_pool.DEFAULT_HEDGE_AFTER_SECONDS)
+    key = (backends, tts.get('backend_selection', ''), tts.get('backend_timeout', ''), tts.get('espeak_voice', ''),
+           workers, timeout, hedge_after)
+    with global_lock:
+        pool = _synthesis_pools.get(key)
+        if pool is None:
+            pool = tts_pool.SynthesisPool(tts_backends.create_failover(tts), workers, timeout, hedge_after)
+            _synthesis_pools[key] = pool
+        return pool
+
+def synthesize_texts(texts: List[str], tts: Dict[str, str]) -> List[Optional[str]]:
+    """
+    Return a playable audio file for each text, synthesizing the cache misses
+    concurrently through the synthesis pool. Returns None for texts that failed.
+    The returned paths belong to the cache and must not be deleted by the caller.
+    """
+    voice_id = tts.get('voice_id', '')
+    output_format = tts.get('output_format', 'mp3') or 'mp3'
+    cache = get_audio_cache(tts)
+    results: List[Optional[str]] = []
+    misses: Dict[str, List[int]] = {}
+    for index, text in enumerate(texts):
+        key = audio_cache.make_key(text, voice_id, output_format)
+        cached_path = cache.lookup(key, output_format)
+        if cached_path:
+            logger.debug("Audio cache hit for announcement (%s hits / %s misses)", cache.hits, cache.misses)
         else:
-            logging.error("Speech synthesis failed – output file empty or missing")
-            return False
+            misses.setdefault(text, []).append(index)
+        results.append(cached_path)
+    if not misses:
+        return results
+    items = []
+    for text in misses:
+        key = audio_cache.make_key(text, voice_id, output_format)
+        items.append((text, key, cache.temp_path(key, output_format)))
+    try:
+        pool = get_synthesis_pool(tts)
+        outcomes = run_coroutine(pool.synthesize_many(
+            [(text, voice_id, temp_path) for text, _, temp_path in items]))
+        for (text, key, temp_path), backend_name in zip(items, outcomes):
+            if backend_name and backend_name != pool.backend.primary:
+                # Fallback audio is kept apart so the primary voice is retried next time
+                key = audio_cache.make_key(text, f"{voice_id}#{backend_name}", output_format)
+            path = cache.put(key, output_format, temp_path) if backend_name else None
+            for index in misses[text]:
+                results[index] = path
+    finally:
+        for _, _, temp_path in items:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError as e:
+                    logger.warning("Failed to clean up file %s: %s", temp_path, e)
+    return results
+
+def synthesize_text(text: str, tts: Dict[str, str]) -> Optional[str]:
+    """
+    Return a playable audio file for the given text, synthesizing only on a cache miss.
+    The returned path belongs to the cache and must not be deleted by the caller.
+    """
+    return synthesize_texts([text], tts)[0]
+
+def streaming_enabled(tts: Dict[str, str]) -> bool:
+    return str(tts.get('streaming', 'false')).strip().lower() in ('1', 'true', 'yes', 'on')
+
+async def stream_text(text: str, tts: Dict[str, str], priority: int = playback.PRIORITY_INSTANT,
+                      on_status=None) -> Optional[playback.PlaybackJob]:
+    """
+    Play text while it is being synthesized, streaming audio chunks straight
+    into the player. Cached audio is played directly; if no backend can stream,
+    the text is synthesized to the cache first. The streamed audio is stored
+    in the cache after playback has started.
+    """
+    loop = asyncio.get_running_loop()
+    voice_id = tts.get('voice_id', '')
+    output_format = tts.get('output_format', 'mp3') or 'mp3'
+    cache = get_audio_cache(tts)
+    key = audio_cache.make_key(text, voice_id, output_format)
+    engine = get_playback_engine(tts)
+    cached_path = await loop.run_in_executor(None, cache.lookup, key, output_format)
+    if cached_path:
+        logger.info("Audio cache hit for streamed announcement")
+        return engine.submit(cached_path, cleanup=False, priority=priority, on_status=on_status)
+    pool = get_synthesis_pool(tts)
+    requested = time.monotonic()
+    try:
+        backend_name, chunks = await pool.backend.open_stream(text, voice_id)
     except Exception as e:
-        logging.error(f"Error during speech synthesis: {e}", exc_info=True)
-        return False
+        logger.warning("Streaming unavailable (%s); synthesizing the whole announcement first", e)
+        path = await loop.run_in_executor(None, synthesize_text, text, tts)
+        if not path:
+            return None
+        return engine.submit(path, cleanup=False, priority=priority, on_status=on_status)
+    job, audio = await streaming.stream_to_player(chunks, engine, requested, priority, on_status)
+    if audio:
+        if backend_name != pool.backend.primary:
+            key = audio_cache.make_key(text, f"{voice_id}#{backend_name}", output_format)
+        await loop.run_in_executor(None, store_audio, cache, key, output_format, audio)
+    return job
+
+def store_audio(cache: audio_cache.AudioCache, key: str, output_format: str, audio: bytes) -> Optional[str]:
+    """
+    Write in-memory audio into the cache under key.
+    """
+    temp_path = cache.temp_path(key, output_format)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(audio)
+        return cache.put(key, output_format, temp_path)
+    except OSError as e:
+        logger.warning("Could not cache streamed audio: %s", e)
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError as e:
+                logger.warning("Failed to clean up file %s: %s", temp_path, e)
+
+def speak_text(text: str, tts: Dict[str, str], priority: int = playback.PRIORITY_INSTANT,
+               on_status=None) -> Optional[playback.PlaybackJob]:
+    """
+    Queue text for playback, streaming it when `streaming` is enabled in [tts].
+    Called from worker threads; returns the playback job or None on failure.
+    """
+    if streaming_enabled(tts):
+        return run_coroutine(stream_text(text, tts, priority, on_status))
+    path = synthesize_text(text, tts)
+    if not path:
+        return None
+    return get_playback_engine(tts).submit(path, cleanup=False, priority=priority, on_status=on_status)
+
+def get_playback_engine(tts: Dict[str, str]) -> playback.PlaybackEngine:
+    """
+    Return the persistent playback engine configured by the [tts] section.
+    """
+    try:
+        timeout = float(tts.get('playback_timeout', playback.DEFAULT_TIMEOUT_SECONDS))
+    except ValueError:
+        logger.warning("Invalid playback_timeout in configuration; using default")
+        timeout = playback.DEFAULT_TIMEOUT_SECONDS
+    return playback.get_engine(tts.get('player') or 'mpg123', timeout)
 
-def play_sound(sound_path: str, output_format: str) -> bool:
+def priority_for_type(announcement_type: str) -> int:
     """
-    Play a sound file using mpg123.
+    Return the playback priority for a scheduled announcement type.
+    """
+    if announcement_type.startswith("custom:"):
+        return playback.PRIORITY_CUSTOM
+    return {
+        "hour": playback.PRIORITY_HOUR,
+        ":55": playback.PRIORITY_FIFTYFIVE,
+        "rules": playback.PRIORITY_RULES,
+        "ad": playback.PRIORITY_AD
+    }.get(announcement_type, playback.PRIORITY_HOUR)
+
+def submit_sound(sound_path: str, tts: Optional[Dict[str, str]] = None, cleanup: bool = True,
+                 priority: int = playback.PRIORITY_HOUR, on_status=None) -> Optional[playback.PlaybackJob]:
+    """
+    Queue a sound file on the persistent playback engine and return its job, or None on error.
     """
     if not sound_path or not os.path.exists(sound_path):
-        logging.error(f"Invalid sound path: {sound_path}")
-        return False
+        logger.error("Invalid sound path: %s", sound_path)
+        return None
     try:
-        logging.info(f"Playing sound file: {sound_path}")
-        if subprocess.run(['which', 'mpg123'], capture_output=True).returncode != 0:
-            logging.error("mpg123 is not installed")
-            return False
-        subprocess.run(['mpg123', '-q', sound_path], check=True)
-        logging.info("Sound played successfully")
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error playing sound: {e}", exc_info=True)
-        return False
+        return get_playback_engine(tts or {}).submit(sound_path, cleanup=cleanup, priority=priority,
+                                                     on_status=on_status)
     except Exception as e:
-        logging.error(f"Error playing sound: {e}", exc_info=True)
-        return False
-    finally:
-        try:
-            os.remove(sound_path)
-            logging.debug(f"Cleaned up sound file: {sound_path}")
-        except Exception as e:
-            logging.warning(f"Failed to clean up file {sound_path}: {e}")
+        logger.error("Error playing sound: %s", e, exc_info=True)
+        return None
+
+def play_sound(sound_path: str, output_format: str, cleanup: bool = True,
+               tts: Optional[Dict[str, str]] = None, priority: int = playback.PRIORITY_HOUR) -> bool:
+    """
+    Play a sound file through the persistent playback engine and wait for it to finish.
+    Set cleanup to False for files owned by the audio cache.
+    """
+    job = submit_sound(sound_path, tts, cleanup, priority)
+    return job.wait() if job is not None else False
 
 def convert_to_12hr_format(time_str: str) -> str:
     """
@@ -354,173 +652,543 @@ def convert_to_12hr_format(time_str: str) -> str:
             hour = 12
         return f"{hour}:{minute:02d} {period}"
     except Exception as e:
-        logging.error(f"Error converting time format: {e}", exc_info=True)
+        logger.error("Error converting time format: %s", e, exc_info=True)
         return time_str
 
-def calculate_next_announcement(times: Dict[str, str], current_time: datetime.datetime) -> Optional[Tuple[datetime.datetime, str]]:
+def compile_schedule(config: Config) -> schedule_engine.CompiledSchedule:
+    """
+    Compile the weekly announcement timeline for a loaded configuration.
+    The loaded configuration supplies the current day; the other days come from their day files.
+    """
+    return schedule_engine.compile_week(config.path, config.times)
+
+def config_for_event(config: Config, config_path: str) -> Config:
     """
-    Calculate the next scheduled announcement.
-    Returns a tuple (announcement_time, announcement_type) or None if no upcoming announcement exists.
+    Return the configuration whose templates apply to a scheduled slot.
+    Slots after the day rollover use their own day file; the loaded config otherwise.
     """
-    announcement_times = []
-    for time_str, announcement_type in times.items():
+    if not config_path or config_path == config.path:
+        return config
+    try:
+        snapshot = config_store.load(config_path)
+    except OSError as e:
+        logger.warning("Could not read %s, using the loaded configuration: %s", config_path, e)
+        return config
+    if snapshot is None:
+        return config
+    return config_from_snapshot(snapshot)
+
+def get_announcement_template(config: Config, announcement_type: str) -> str:
+    """
+    Return the template configured for an announcement type.
+    """
+    template_mapping = {":55": "fiftyfive", "hour": "hour", "rules": "rules", "ad": "ad"}
+    template_key = template_mapping.get(announcement_type, "hour")
+    if announcement_type.startswith("custom:"):
+        custom_name = announcement_type.replace("custom:", "")
+        template_key = f"custom_{custom_name}"
+    return config.announcements.get(template_key, "Attention! It's {time}.")
+
+def build_format_vars(time_str: str, color_data: Dict[str, Dict[str, str]],
+                      minutes_remaining: Optional[int] = None) -> Dict[str, object]:
+    """
+    Build the template variables for an announcement slot.
+    Without a known shift start, minutes_remaining assumes the colors rotate
+    on the hour and half hour, counted from when the slot's colors are taken.
+    """
+    if not color_data:
+        logger.warning("No color data available; using default placeholders")
+    if minutes_remaining is None:
         try:
-            hour, minute = map(int, time_str.split(':'))
-            announcement_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
-            if announcement_time <= current_time:
-                # If the time has passed today, schedule it for tomorrow
-                announcement_time += datetime.timedelta(days=1)
-            announcement_times.append((announcement_time, announcement_type))
+            color_time = datetime.datetime.strptime(time_str, "%H:%M") - prerender.DEFAULT_COLOR_LEAD
+            minutes_remaining = color_rotation.INTERVAL_MINUTES - color_time.minute % color_rotation.INTERVAL_MINUTES
         except ValueError:
-            logging.warning(f"Invalid time format in configuration: {time_str}")
-            continue
-    if not announcement_times:
+            pass
+    return announcement_templates.build_variables(convert_to_12hr_format(time_str), color_data, minutes_remaining)
+
+def render_announcement_text(template: str, time_str: str, color_data: Dict[str, Dict[str, str]],
+                             minutes_remaining: Optional[int] = None) -> Optional[str]:
+    """
+    Fill a template with the announcement time and color data.
+    Returns the announcement text or None if the template cannot be formatted.
+    """
+    try:
+        compiled = announcement_templates.compile_template(template)
+        announcement_text = compiled.render(build_format_vars(time_str, color_data, minutes_remaining))
+        logger.info("Announcement text generated: %s", announcement_text)
+        return announcement_text
+    except KeyError as e:
+        logger.error("Template formatting error – missing key: %s", e)
+        return None
+    except Exception as e:
+        logger.error("Template formatting error: %s", e)
         return None
-    return min(announcement_times, key=lambda x: x[0])
 
 def synthesize_announcement(template: str, announcement_type: str, time_str: str,
-                            color_data: Dict[str, Dict[str, str]], config: Config) -> Optional[str]:
+                            color_data: Dict[str, Dict[str, str]], config: Config,
+                            minutes_remaining: Optional[int] = None) -> Optional[str]:
     """
     Generate and synthesize an announcement using a template and color data.
-    Returns the path to the synthesized audio file or None on failure.
+    Returns the path to the cached audio file or None on failure.
     """
     try:
-        time_12hr = convert_to_12hr_format(time_str)
-        logging.info(f"Generating announcement for type: {announcement_type}")
-
-        if not color_data:
-            logging.warning("No color data available; using default placeholders")
-            color_data = {
-                'color1': {'color': 'unknown'},
-                'color2': {'color': 'unknown'},
-                'color3': {'color': 'unknown'},
-                'color4': {'color': 'unknown'}
-            }
-
-        format_vars = {
-            'time': time_12hr,
-            'color1': color_data.get('color1', {}).get('color', 'unknown'),
-            'color2': color_data.get('color2', {}).get('color', 'unknown'),
-            'color3': color_data.get('color3', {}).get('color', 'unknown'),
-            'color4': color_data.get('color4', {}).get('color', 'unknown')
-        }
+        logger.debug("Generating announcement for type: %s", announcement_type)
+        if config.tts.get('assembly') == 'fragments':
+            try:
+                assembled_path = fragments.assemble(template, build_format_vars(time_str, color_data, minutes_remaining),
+                                                    config.tts, get_audio_cache(config.tts))
+            except Exception as e:
+                logger.error("Fragment assembly failed: %s", e, exc_info=True)
+                assembled_path = None
+            if assembled_path:
+                logger.info("Announcement assembled from cached fragments")
+                return assembled_path
+            logger.info("Fragments incomplete – falling back to full-sentence synthesis")
+            rebuild_fragments(config)
+        announcement_text = render_announcement_text(template, time_str, color_data, minutes_remaining)
+        if announcement_text is None:
+            return None
+        return synthesize_text(announcement_text, config.tts)
+    except Exception as e:
+        logger.error("Error synthesizing announcement: %s", e, exc_info=True)
+        return None
 
-        logging.info(f"Template before formatting: {template}")
-        logging.info(f"Format variables: {format_vars}")
+def rebuild_fragments(config: Config, shutdown_event: Optional[threading.Event] = None) -> bool:
+    """
+    Synthesize, in the background, every fragment the configured templates need:
+    their static segments plus each color name and each scheduled time.
+    """
+    slot_values = {
+        'time': [convert_to_12hr_format(t) for t in config.times],
+        'color': COLOR_NAMES + ['unknown'],
+        'next_color': COLOR_NAMES + ['unknown'],
+        'color_count': range(1, len(COLOR_NAMES) + 1),
+        'minutes_remaining': range(1, color_rotation.INTERVAL_MINUTES + 1)
+    }
+    texts = fragments.required_fragments(config.announcements.values(), slot_values)
+    return fragments.build_fragments_async(texts, lambda text: synthesize_text(text, config.tts), shutdown_event,
+                                           synthesize_batch=lambda batch: synthesize_texts(batch, config.tts))
 
-        try:
-            announcement_text = template.format(**format_vars)
-            logging.info(f"Announcement text generated: {announcement_text}")
-        except KeyError as e:
-            logging.error(f"Template formatting error – missing key: {e}")
-            return None
-        except Exception as e:
-            logging.error(f"Template formatting error: {e}")
-            return None
+def prepare_announcement(config: Config, announcement_type: str, announcement_time: datetime.datetime,
+                         color_data: Dict[str, Dict[str, str]]) -> Optional[str]:
+    """
+    Render and synthesize the announcement for a scheduled slot.
+    Used both by the pre-renderer and just before the slot with verified colors.
+    """
+    template = get_announcement_template(config, announcement_type)
+    # Colors are taken shortly before the slot; count the minutes from the same instant
+    color_time = announcement_time - prerender.DEFAULT_COLOR_LEAD
+    minutes_remaining = rotation_engine.minutes_until_rotation(color_time) if rotation_engine else None
+    return synthesize_announcement(template, announcement_type, announcement_time.strftime("%H:%M"),
+                                   color_data or {}, config, minutes_remaining)
 
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_path = temp_file.name
+def create_prerenderer(config: Config, shutdown_event: threading.Event,
+                       rotation_engine: Optional[color_rotation.RotationEngine] = None) -> prerender.PreRenderer:
+    """
+    Build the background pre-renderer for upcoming announcements.
+    """
+    try:
+        count = int(config.tts.get('prerender_count', prerender.DEFAULT_PRERENDER_COUNT))
+    except ValueError:
+        logger.warning("Invalid prerender_count in configuration; using default")
+        count = prerender.DEFAULT_PRERENDER_COUNT
+    return prerender.PreRenderer(get_color_message_from_db, prepare_announcement,
+                                 count=count, shutdown_event=shutdown_event,
+                                 predict=rotation_engine.colors_at if rotation_engine else None,
+                                 resolve_config=config_for_event)
 
-        success = asyncio.run(synthesize_speech_async(announcement_text, config.tts['voice_id'], temp_path))
-        if success:
-            return temp_path
-        else:
-            return None
+def publish_status(**fields) -> None:
+    """
+    Update fields of the live status record read by the web interface.
+    """
+    if status_board is None:
+        return
+    try:
+        status_board.publish(**fields)
     except Exception as e:
-        logging.error(f"Error synthesizing announcement: {e}", exc_info=True)
-        return None
+        logger.warning("Could not publish announcer status: %s", e)
 
-def main():
+def track_playback(label: str, kind: str, on_status=None):
     """
-    Main function for the announcer.
-    Sets up configuration reload scheduling and handles the announcement loop.
+    Wrap a playback on_status callback so the status record shows what is playing.
+    """
+    def callback(job: playback.PlaybackJob) -> None:
+        if job.status == "playing":
+            publish_status(now_playing={"label": label, "kind": kind, "started": time.time()})
+        elif job.status in announce_queue.FINISHED_STATUSES:
+            publish_status(now_playing=None, last_playback={
+                "label": label,
+                "kind": kind,
+                "status": job.status,
+                "start_latency_ms": round(job.start_latency * 1000, 1) if job.start_latency is not None else None,
+                "finished": time.time()
+            })
+        if on_status is not None:
+            on_status(job)
+    return callback
+
+def request_reload(config_path: Optional[str] = None, immediate: bool = False) -> None:
+    """
+    Signal a configuration reload, optionally switching to config_path for it.
+    An immediate reload does not wait for a burst of changes to settle.
+    """
+    global config_reload_signal, _requested_config, _reload_immediately
+    with global_lock:
+        config_reload_signal = True
+        # A plain reload must not cancel a pending switch
+        if config_path is not None:
+            _requested_config = config_path
+        _reload_immediately = _reload_immediately or immediate
+
+def signal_daily_reload() -> None:
+    """
+    Request the day-specific configuration reload at 1:00 AM.
+    """
+    global config_reload_signal
+    logger.info("It's 1:00 AM - signaling day-specific configuration reload")
+    with global_lock:
+        config_reload_signal = True
+
+async def wait_for_job(job: playback.PlaybackJob) -> bool:
+    """
+    Await a playback job from the event loop without blocking it. Returns the playback result.
     """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(finished: playback.PlaybackJob) -> None:
+        if not future.done():
+            future.set_result(finished.result)
+
+    job.add_done_callback(lambda finished: loop.call_soon_threadsafe(resolve, finished))
+    return await future
+
+async def run() -> None:
+    """
+    Announcer main coroutine. Scheduling, configuration watching and the instant
+    announcement queue run as tasks on this one event loop; database queries,
+    cache I/O and rendering run in its default executor, and all speech
+    synthesis is awaited on the loop itself.
+    """
+    global config_watcher, status_board, rotation_engine, _event_loop
+    loop = asyncio.get_running_loop()
+    _event_loop = loop
     shutdown_event = threading.Event()
     main.shutdown_event = shutdown_event
-    reload_thread = threading.Thread(target=schedule_config_reload, args=(shutdown_event,), daemon=True)
-    reload_thread.start()
-    logging.info("Configuration reload scheduler started")
+    wake = asyncio.Event()
+    config_watcher = config_watcher_module.ConfigWatcher(".")
+    config_watcher.add_wake_callback(lambda: loop.call_soon_threadsafe(wake.set))
+    config_watcher.schedule_daily(1, 0, signal_daily_reload, "daily configuration reload")
+    config_watcher.start()
+    metrics_server = metrics.serve()
+    try:
+        status_board = status_board_module.StatusBoard()
+    except (OSError, ValueError) as e:
+        logger.warning("Live status record not available: %s", e)
+    publish_status(pid=os.getpid(), started=time.time(), running=True, now_playing=None)
+
+    def request_shutdown() -> None:
+        logger.info("Shutdown requested")
+        shutdown_event.set()
+        wake.set()
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, request_shutdown)
+    except (NotImplementedError, RuntimeError):
+        pass
+    config = None
+    # Looks up the pool for the current config on every refresh so reloads take effect
+    rotation_engine = color_rotation.RotationEngine(
+        lambda fn: get_db_pool(config).run(fn),
+        # The web interface predicts colors for upcoming slots from the published inputs
+        on_change=lambda rotation: publish_status(rotation=rotation.to_dict()))
+    queue_consumer = None
+    queue_task = None
+    control_server = None
+    started = time.monotonic()
+
+    async def wait(timeout: float) -> bool:
+        """
+        Sleep until timeout, a configuration change or shutdown. Returns True on shutdown.
+        """
+        if timeout > 0 and not shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        wake.clear()
+        return shutdown_event.is_set()
+
+    async def wait_deadline(deadline: float, interrupt_on_change: bool) -> Optional[str]:
+        """
+        Sleep until the monotonic deadline. Returns 'shutdown', 'changed'
+        (if interrupt_on_change) or None once the deadline is reached.
+        """
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            if await wait(remaining):
+                return 'shutdown'
+            if interrupt_on_change and (config_watcher.has_changes() or config_reload_signal):
+                return 'changed'
+
+    async def settle_reload() -> bool:
+        """
+        Let a burst of configuration changes finish so it is reloaded once:
+        wait until none has arrived for RELOAD_SETTLE_SECONDS, at most
+        RELOAD_MAX_DELAY_SECONDS. Returns True on shutdown.
+        """
+        first = last = loop.time()
+        while True:
+            if _reload_immediately:
+                return False
+            remaining = min(last + RELOAD_SETTLE_SECONDS, first + RELOAD_MAX_DELAY_SECONDS) - loop.time()
+            if remaining <= 0:
+                return False
+            if await wait(remaining):
+                return True
+            if check_for_config_changes():
+                last = loop.time()
+
+    def deadline_for(target: datetime.datetime) -> float:
+        # The loop clock is monotonic
+        return loop.time() + (target - datetime.datetime.now()).total_seconds()
+
+    # Control socket commands from the web interface; they run on this loop
+    def control_reload(request: dict) -> dict:
+        request_reload(immediate=bool(request.get("immediate")))
+        wake.set()
+        return {}
+
+    def control_switch_config(request: dict) -> dict:
+        config_file = str(request.get("config_file") or "")
+        if not config_file.endswith(".ini") or os.path.basename(config_file) != config_file:
+            raise ValueError(f"Invalid configuration file {config_file!r}")
+        if not os.path.exists(config_file):
+            raise LookupError(f"Configuration file {config_file} does not exist")
+        request_reload(config_file, immediate=True)
+        wake.set()
+        return {"config_file": config_file}
+
+    def log_dispatch_failure(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Dispatching an enqueued announcement failed: %s", future.exception())
+
+    async def control_enqueue(request: dict) -> dict:
+        text = request.get("text")
+        if not text or not isinstance(text, str):
+            raise ValueError("Missing announcement text")
+        if queue_consumer is None:
+            raise LookupError("Announcer has not loaded its configuration yet")
+        priority = int(request.get("priority", playback.PRIORITY_INSTANT))
+        job = await loop.run_in_executor(None, announce_queue.create_job, text, priority,
+                                         str(request.get("kind", "instant")))
+        # Synthesis runs in the executor, like jobs claimed from the spool; dispatch
+        # records its own failures in the job status
+        loop.run_in_executor(None, queue_consumer.dispatch, job).add_done_callback(log_dispatch_failure)
+        return {"job_id": job["id"], "status": "queued"}
+
+    def control_status(request: dict) -> dict:
+        next_event = schedule.next_event(datetime.datetime.now(), after=last_announced) if schedule else None
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - started, 1),
+            "config_file": config.path if config else None,
+            "scheduled": len(schedule) if schedule else 0,
+            "next_announcement": {
+                "time": next_event.when.isoformat(timespec="minutes"),
+                "type": next_event.announcement_type,
+                "config_file": next_event.config_path
+            } if next_event else None,
+            "last_announced": last_announced.isoformat(timespec="minutes") if last_announced else None,
+            "playback": get_playback_engine(config.tts).stats() if config else None
+        }
 
     try:
         day_config = get_day_config_filename()
-        logging.info(f"Starting with configuration: {day_config}")
-        config = None
+        logger.info("Starting with configuration: %s", day_config)
+        prerenderer = None
+        schedule = None
+        timing_tracker = timing.TimingTracker()
+        # Slots at or before this were already announced (possibly before a restart)
+        last_announced = schedule_engine.load_last_announced()
+        control_server = control.ControlServer({
+            "reload": control_reload,
+            "switch_config": control_switch_config,
+            "enqueue": control_enqueue,
+            "status": control_status
+        })
+        await control_server.start()
 
         while True:
             try:
                 if config is None or check_for_config_changes():
-                    config = load_config()
-                    logging.info("Configuration reloaded")
+                    if config is not None and await settle_reload():
+                        return
+                    config = await loop.run_in_executor(None, load_config)
+                    schedule = await loop.run_in_executor(None, compile_schedule, config)
+                    log_setup.apply_levels(config.logging)
+                    publish_status(config_file=config.path, scheduled=len(schedule))
+                    logger.info("Configuration reloaded")
+                    CONFIG_RELOADS.inc(result="ok")
+                    if config.tts.get('assembly') == 'fragments':
+                        rebuild_fragments(config, shutdown_event)
+                    if prerenderer is None:
+                        prerenderer = create_prerenderer(config, shutdown_event, rotation_engine)
+                        prerenderer.update_config(config, schedule)
+                        prerenderer.start()
+                        # Instant announcements from the web interface; reads the current config
+                        queue_consumer = announce_queue.QueueConsumer(
+                            lambda text: synthesize_text(text, config.tts),
+                            lambda: get_playback_engine(config.tts),
+                            shutdown_event=shutdown_event,
+                            speak=lambda text, priority, on_status: speak_text(
+                                text, config.tts, priority, track_playback(text, "instant", on_status)))
+                        queue_task = loop.create_task(queue_consumer.run_async())
+                    else:
+                        prerenderer.update_config(config, schedule)
+                        # Refreshes the rotation while the schedule loop carries on
+                        loop.run_in_executor(None, rotation_engine.refresh)
             except Exception as e:
-                logging.error(f"Failed to load configuration, retrying in 60s: {e}", exc_info=True)
-                if shutdown_event.wait(timeout=60):
+                logger.error("Failed to load configuration, retrying in 60s: %s", e, exc_info=True)
+                CONFIG_RELOADS.inc(result="error")
+                if await wait(60):
                     return
                 continue
 
-            if not config.times:
-                logging.warning("No announcements scheduled. Retrying in 60s.")
-                if shutdown_event.wait(timeout=60):
+            if not len(schedule):
+                logger.warning("No announcements scheduled. Waiting for a configuration change.")
+                if await wait(60):
                     return
                 continue
 
             current_time = datetime.datetime.now()
-            next_announcement = calculate_next_announcement(config.times, current_time)
+            next_announcement = schedule.next_event(current_time, after=last_announced)
+            publish_status(next_announcement={
+                "time": next_announcement.when.isoformat(timespec="minutes"),
+                "type": next_announcement.announcement_type,
+                "config_file": next_announcement.config_path,
+                "deadline": next_announcement.when.timestamp()
+            } if next_announcement else None)
             if not next_announcement:
-                logging.info("No upcoming announcements. Checking again in 60s.")
-                if shutdown_event.wait(timeout=60):
+                logger.info("No upcoming announcements. Waiting for a configuration change.")
+                if await wait(60):
                     return
                 continue
 
-            next_time, announcement_type = next_announcement
+            next_time, announcement_type = next_announcement.when, next_announcement.announcement_type
+            slot_config = config_for_event(config, next_announcement.config_path)
             sleep_seconds = (next_time - current_time).total_seconds()
-            if sleep_seconds <= 0:
-                continue
+            if sleep_seconds < 0:
+                logger.warning("Catching up missed announcement '%s' scheduled for %s (%.0fs late)",
+                               announcement_type, next_announcement.time_str, -sleep_seconds)
 
             if sleep_seconds > 60:
                 wait_before_query = sleep_seconds - 60
-                logging.info(f"Next announcement '{announcement_type}' in {sleep_seconds:.0f}s. Waiting {wait_before_query:.0f}s before fetching colors.")
-                wait_start = datetime.datetime.now()
-                while (datetime.datetime.now() - wait_start).total_seconds() < wait_before_query:
-                    if shutdown_event.wait(timeout=min(60, wait_before_query)):
-                        return
-                    if check_for_config_changes():
-                        logging.info("Configuration reload detected during wait")
-                        break
-                if check_for_config_changes():
-                    continue
-                logging.info("Fetching color data 1 minute before announcement...")
-                color_data = get_color_message_from_db(config)
-                if shutdown_event.wait(timeout=60):
+                logger.info("Next announcement '%s' in %.0fs. Waiting %.0fs before fetching colors.",
+                            announcement_type, sleep_seconds, wait_before_query)
+                outcome = await wait_deadline(deadline_for(next_time - datetime.timedelta(seconds=60)),
+                                              interrupt_on_change=True)
+                if outcome == 'shutdown':
                     return
+                if outcome == 'changed':
+                    logger.info("Configuration reload detected during wait")
+                    continue
+                logger.info("Fetching color data 1 minute before announcement...")
             else:
-                logging.info(f"Next announcement '{announcement_type}' in {sleep_seconds:.0f}s. Fetching color data immediately.")
-                color_data = get_color_message_from_db(config)
-                if shutdown_event.wait(timeout=sleep_seconds):
-                    return
+                logger.info("Next announcement '%s' in %.0fs. Fetching color data immediately.",
+                            announcement_type, sleep_seconds)
+            color_data = await loop.run_in_executor(None, fetch_announcement_colors, config, rotation_engine)
+
+            # Render with the verified colors now; a matching prediction is a cache hit
+            render_started = time.monotonic()
+            announcement_path = await loop.run_in_executor(None, prepare_announcement, slot_config,
+                                                           announcement_type, next_time, color_data or {})
+            timing_tracker.record_synthesis(time.monotonic() - render_started)
+            RENDER_SECONDS.observe(time.monotonic() - render_started)
+            if prerenderer.predicted_text_matches((next_time, announcement_type), announcement_path):
+                logger.info("Verified colors match prediction – using pre-rendered audio")
+            else:
+                logger.info("Announcement audio rendered with verified colors")
+            prerenderer.observe_colors(color_data)
+            publish_status(colors={key: value.get('color') for key, value in (color_data or {}).items()},
+                           colors_at=time.time())
+
+            # Changes in the last minute are applied after this announcement.
+            # The final wait ends early by the learned player start-up latency
+            # so the audio itself starts on the slot.
+            deadline = deadline_for(next_time)
+            start_offset = timing_tracker.start_offset()
+            if await wait_deadline(deadline - start_offset, interrupt_on_change=False) == 'shutdown':
+                return
 
-            template_mapping = {":55": "fiftyfive", "hour": "hour", "rules": "rules", "ad": "ad"}
-            template_key = template_mapping.get(announcement_type, "hour")
-            if announcement_type.startswith("custom:"):
-                custom_name = announcement_type.replace("custom:", "")
-                template_key = f"custom_{custom_name}"
-
-            template = config.announcements.get(template_key, "Attention! It's {time}.")
-            announcement_path = synthesize_announcement(template, announcement_type, next_time.strftime("%H:%M"), color_data or {}, config)
-            if announcement_path:
-                if not play_sound(announcement_path, config.tts['output_format']):
-                    logging.error("Failed to play announcement")
+            last_announced = next_time
+            schedule_engine.save_last_announced(next_time)
+            on_status = track_playback(f"{announcement_type} {next_announcement.time_str}", announcement_type)
+            job = submit_sound(announcement_path, config.tts, cleanup=False,
+                               priority=priority_for_type(announcement_type),
+                               on_status=on_status) if announcement_path else None
+            if job is not None:
+                played = await wait_for_job(job)
+                ANNOUNCEMENTS.inc(type=announcement_type, result="played" if played else "failed")
+                if not played:
+                    logger.error("Failed to play announcement")
+                lateness_ms = timing_tracker.record_playback(next_time.strftime("%Y-%m-%d %H:%M"), announcement_type,
+                                                             deadline, job.started_at, job.start_latency)
+                publish_status(last_announcement={
+                    "time": next_time.isoformat(timespec="minutes"),
+                    "type": announcement_type,
+                    "result": "played" if played else "failed",
+                    "lateness_ms": round(lateness_ms, 1) if lateness_ms is not None else None
+                })
+                if lateness_ms is not None:
+                    logger.info("Announcement started %+.0f ms from schedule (started %.0f ms early)",
+                                lateness_ms, start_offset * 1000)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Audio cache stats: %s", get_audio_cache(config.tts).stats())
+                    logger.debug("Playback stats: %s", get_playback_engine(config.tts).stats())
+                    logger.debug("TTS backend stats: %s", get_synthesis_pool(config.tts).backend.stats())
             else:
-                logging.error("Failed to create announcement audio")
+                ANNOUNCEMENTS.inc(type=announcement_type, result="no_audio")
+                publish_status(last_announcement={"time": next_time.isoformat(timespec="minutes"),
+                                                  "type": announcement_type, "result": "no_audio",
+                                                  "lateness_ms": None})
+                logger.error("Failed to create announcement audio")
 
-            if shutdown_event.wait(timeout=1):
+            if await wait(1):
                 return
 
     except Exception as e:
-        logging.critical(f"Unhandled exception in main: {e}", exc_info=True)
+        logger.critical("Unhandled exception in main: %s", e, exc_info=True)
         sys.exit(1)
     finally:
         shutdown_event.set()
+        if queue_task is not None:
+            queue_task.cancel()
+        if control_server is not None:
+            await control_server.close()
+        publish_status(running=False, now_playing=None, next_announcement=None)
+        if status_board is not None:
+            status_board.close()
+            status_board = None
+        config_watcher.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if config is not None:
+            get_playback_engine(config.tts).close()
+        _event_loop = None
+
+def main():
+    """
+    Main function for the announcer.
+    Runs the announcer on a single long-lived asyncio event loop.
+    """
+    log_setup.setup_logging(log_setup.ANNOUNCER_LOG_FILE, log_setup.read_options(get_day_config_filename()))
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        logger.info("Announcer stopped")
 
 if __name__ == "__main__":
     main()
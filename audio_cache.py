@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+audio_cache.py
+
+Persistent, content-addressed cache for synthesized announcement audio.
+Entries are keyed by (rendered text, voice_id, output_format) so repeat
+announcements can skip network synthesis entirely. The cache enforces a
+size and age budget with least-recently-used eviction and keeps hit, miss
+and eviction counters so it can be sized from the logs.
+
+The cache directory may be shared by the announcer and the web interface;
+the in-memory index is advisory and the filesystem is the source of truth.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger("audio_cache")
+
+DEFAULT_CACHE_DIR = "tts_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+LOOKUPS = metrics.counter("announcer_audio_cache_lookups_total", "Audio cache lookups by result (hit, miss)", ["result"])
+
+_caches: Dict[str, "AudioCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def make_key(text: str, voice_id: str, output_format: str) -> str:
+    """
+    Build the content address for a piece of synthesized audio.
+    """
+    digest = hashlib.sha256()
+    for part in (text, voice_id, output_format):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """
+    On-disk LRU cache of synthesized audio files.
+    """
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._lock = threading.RLock()
+        # key -> (path, size, last_used); ordered oldest to newest
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        Rebuild the in-memory LRU index from the files already on disk.
+        """
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or ".tmp-" in entry.name:
+                    continue
+                key = entry.name.split(".", 1)[0]
+                st = entry.stat()
+                found.append((st.st_mtime, key, entry.path, st.st_size))
+        found.sort()
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            for mtime, key, path, size in found:
+                self._entries[key] = (path, size, mtime)
+                self.total_bytes += size
+        logger.info("Audio cache loaded from %s: %s entries, %s bytes", self.directory, len(found), self.total_bytes)
+        self.evict()
+
+    def path_for(self, key: str, output_format: str) -> str:
+        """
+        Return the final on-disk path for a cache key.
+        """
+        return os.path.join(self.directory, f"{key}.{output_format or 'mp3'}")
+
+    def temp_path(self, key: str, output_format: str) -> str:
+        """
+        Return a process-unique scratch path inside the cache directory.
+        Synthesizing here lets put() publish the file with an atomic rename.
+        """
+        return f"{self.path_for(key, output_format)}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+    def lookup(self, key: str, output_format: str, count: bool = True) -> Optional[str]:
+        """
+        Return the cached file for key, or None. Updates LRU order and,
+        unless count is False, the hit/miss counters.
+        """
+        path = self.path_for(key, output_format)
+        now = time.time()
+        with self._lock:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._drop(key)
+                self.misses += count
+                if count:
+                    LOOKUPS.inc(result="miss")
+                return None
+            if now - st.st_mtime > self.max_age_seconds or st.st_size == 0:
+                self._remove(key, path)
+                self.evictions += 1
+                self.misses += count
+                if count:
+                    LOOKUPS.inc(result="miss")
+                return None
+            try:
+                os.utime(path, (now, now))
+            except OSError as e:
+                logger.debug("Could not touch cache entry %s: %s", path, e)
+            if key not in self._entries:
+                self.total_bytes += st.st_size
+            self._entries[key] = (path, st.st_size, now)
+            self._entries.move_to_end(key)
+            self.hits += count
+            if count:
+                LOOKUPS.inc(result="hit")
+            return path
+
+    def peek(self, key: str, output_format: str) -> Optional[str]:
+        """
+        Like lookup() but without counting towards the hit/miss statistics.
+        Used for internal lookups such as announcement fragments.
+        """
+        return self.lookup(key, output_format, count=False)
+
+    def get(self, text: str, voice_id: str, output_format: str) -> Optional[str]:
+        """
+        Look up audio for the given rendered text and voice.
+        """
+        return self.lookup(make_key(text, voice_id, output_format), output_format)
+
+    def put(self, key: str, output_format: str, source_path: str) -> str:
+        """
+        Move a freshly synthesized file into the cache and return its final path.
+        """
+        path = self.path_for(key, output_format)
+        size = os.path.getsize(source_path)
+        now = time.time()
+        os.replace(source_path, path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self.total_bytes -= previous[1]
+            self._entries[key] = (path, size, now)
+            self.total_bytes += size
+        self.evict(protect=key)
+        return path
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry[1]
+
+    def _remove(self, key: str, path: str) -> None:
+        self._drop(key)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to remove cache entry %s: %s", path, e)
+
+    def evict(self, protect: Optional[str] = None) -> int:
+        """
+        Enforce the age and size budget. Returns the number of evicted entries.
+        """
+        evicted = 0
+        cutoff = time.time() - self.max_age_seconds
+        with self._lock:
+            for key, (path, size, last_used) in list(self._entries.items()):
+                if key != protect and last_used < cutoff:
+                    self._remove(key, path)
+                    evicted += 1
+            while self.total_bytes > self.max_bytes and self._entries:
+                key, (path, size, last_used) = next(iter(self._entries.items()))
+                if key == protect:
+                    if len(self._entries) == 1:
+                        break
+                    self._entries.move_to_end(key)
+                    continue
+                self._remove(key, path)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            logger.info("Audio cache evicted %s entries (%s bytes in use)", evicted, self.total_bytes)
+        return evicted
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return hit/miss/eviction counters and current usage.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds
+            }
+
+
+def get_cache(directory: str = DEFAULT_CACHE_DIR,
+              max_bytes: int = DEFAULT_MAX_BYTES,
+              max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS) -> AudioCache:
+    """
+    Return the process-wide cache for a directory, creating it on first use.
+    Budget changes from a reloaded configuration are applied in place.
+    """
+    directory = os.path.abspath(directory)
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = AudioCache(directory, max_bytes, max_age_seconds)
+            _caches[directory] = cache
+        elif cache.max_bytes != max_bytes or cache.max_age_seconds != max_age_seconds:
+            cache.max_bytes = max_bytes
+            cache.max_age_seconds = max_age_seconds
+            cache.evict()
+        return cache
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+Benchmarks for the announcement pipeline, written as JSON so results can be
+compared across versions:
+
+    python benchmark.py                      # full run, JSON to stdout
+    python benchmark.py --quick -o out.json  # fewer iterations, JSON to a file
+    python benchmark.py --only schedule      # benchmarks whose name contains 'schedule'
+
+Everything runs in a scratch directory against generated INI files, a fake
+database connection, the fake TTS backend and the fake player, so no network,
+database or sound hardware is needed.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+COLOR_CODES = [-65536, -256, -16711681, -16711936, -23296]
+SHIFT_START = datetime.datetime(1900, 1, 1, 6, 0)
+
+
+def git_version() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 1) -> Dict[str, float]:
+    """
+    Time fn over iterations runs and summarize the per-call latency in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+        "max_ms": samples[-1]
+    }
+
+
+def write_ini(path: str, times: int, custom: int = 0, seed: int = 1) -> Dict[str, str]:
+    """
+    Write a day INI with the given number of scheduled times. Returns the times.
+    """
+    rng = random.Random(seed)
+    schedule = {}
+    for minute in rng.sample(range(1, 24 * 60), min(times, 24 * 60 - 1)):
+        schedule[f"{minute // 60:02d}:{minute % 60:02d}"] = rng.choice(["hour", ":55", "rules", "ad"])
+    lines = [
+        "[database]", "server = db.example", "database = rink", "username = bench", "password = bench",
+        "", "[times]"
+    ]
+    lines += [f"{t} = {kind}" for t, kind in sorted(schedule.items())]
+    lines += [
+        "", "[announcements]",
+        'hour = "It is {time}. {color1} bands are now expired. {color2} bands have thirty minutes."',
+        'fiftyfive = "Five minute warning for {color1} wristbands. The time is {time}."',
+        'rules = "Please skate in a counter clockwise direction and no racing."',
+        'ad = "Visit the snack bar for fresh pizza."'
+    ]
+    lines += [f'custom_{i} = "Custom announcement number {i} for {{color1}}"' for i in range(custom)]
+    lines += ["", "[tts]", "voice_id = en-US-GuyNeural", "player = fake", "backends = fake", "prerender_count = 3"]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return schedule
+
+
+def linear_next_announcement(times: Dict[str, str],
+                             current_time: datetime.datetime) -> Optional[Tuple[datetime.datetime, str]]:
+    """
+    The announcer's former per-iteration lookup: parse every HH:MM key and take
+    the earliest upcoming one. Kept as the baseline for the compiled schedule.
+    """
+    announcement_times = []
+    for time_str, announcement_type in times.items():
+        try:
+            hour, minute = map(int, time_str.split(':'))
+            announcement_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        except ValueError:
+            continue
+        if announcement_time <= current_time:
+            announcement_time += datetime.timedelta(days=1)
+        announcement_times.append((announcement_time, announcement_type))
+    if not announcement_times:
+        return None
+    return min(announcement_times, key=lambda x: x[0])
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection"):
+        self.conn = conn
+        self._rows: List[tuple] = []
+
+    def execute(self, query: str, params: Any = None) -> None:
+        if self.conn.latency:
+            time.sleep(self.conn.latency)
+        if "applicationinfo" in query and "DECLARE" not in query:
+            self._rows = [(SHIFT_START,)]
+        elif "SELECT color, corder" in query:
+            self._rows = [(code, i) for i, code in enumerate(COLOR_CODES, start=1)]
+        elif query.strip() == "SELECT 1":
+            self._rows = [(1,)]
+        else:
+            # The rotation query: compute the answer the real database would give
+            import color_rotation
+            rotation = color_rotation.ColorRotation(SHIFT_START.time(),
+                                                    [color_rotation.color_name(c) for c in COLOR_CODES])
+            colors = rotation.colors_at(datetime.datetime.now())
+            self._rows = [(int(key[len("color"):]), value["color"]) for key, value in colors.items()]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeConnection:
+    """
+    DB-API connection answering the announcer's color queries, with optional latency.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def close(self) -> None:
+        pass
+
+
+def run_benchmarks(quick: bool, only: Optional[str], db_latency: float) -> Dict[str, Any]:
+    scale = 0.1 if quick else 1.0
+
+    def n(iterations: int) -> int:
+        return max(3, int(iterations * scale))
+
+    import announcer
+    import color_rotation
+    import config_store
+    import prerender
+    import schedule_engine
+    try:
+        import settings
+    except ImportError as e:
+        settings, settings_error = None, str(e)
+    # Keep benchmark output clean and log I/O out of the timed loops. Unlike a
+    # level, this also holds if something sets the levels again later.
+    logging.disable(logging.INFO)
+
+    results: Dict[str, Any] = {}
+
+    def bench(name: str, fn: Callable[[], Any], iterations: int, **extra: Any) -> None:
+        if only and only not in name:
+            return
+        try:
+            results[name] = dict(measure(fn, iterations), **extra)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    # Configuration loading
+    for times in (100, 1000):
+        path = f"bench_{times}.ini"
+        write_ini(path, times, custom=50)
+        bench(f"load_config.cold.{times}_times", lambda: (config_store.invalidate(path), announcer.load_config(path)),
+              n(200), times=times)
+        bench(f"load_config.warm.{times}_times", lambda: announcer.load_config(path), n(2000), times=times)
+        if settings is None:
+            results[f"read_config.{times}_times"] = {"skipped": f"settings unavailable: {settings_error}"}
+        else:
+            handler = settings.ConfigHandler(path)
+            bench(f"read_config.cold.{times}_times", lambda: (config_store.invalidate(path), handler.read_config()),
+                  n(200), times=times)
+            bench(f"read_config.warm.{times}_times", handler.read_config, n(2000), times=times)
+
+    # Next-announcement lookup
+    now = datetime.datetime.now().replace(second=30, microsecond=0)
+    for times in (100, 500, 1400):
+        schedule = write_ini("schedule.ini", times, seed=times)
+        bench(f"schedule.calculate_next_announcement.{times}_times",
+              lambda: linear_next_announcement(schedule, now), n(2000), times=times)
+        entries = [(day * schedule_engine.MINUTES_PER_DAY + int(t[:2]) * 60 + int(t[3:]), kind, "schedule.ini")
+                   for day in range(7) for t, kind in schedule.items()]
+        compiled = schedule_engine.CompiledSchedule(entries)
+        bench(f"schedule.compiled_next_event.{times}_times", lambda: compiled.next_event(now), n(2000),
+              times=times, weekly_entries=len(entries))
+
+    # Template rendering
+    colors = {f"color{i}": {"color": name, "time": f"Interval {i}"}
+              for i, name in enumerate(["Red", "Yellow", "Blue", "Green"], start=1)}
+    template = "It is {time}. {color1} bands are now expired. {color2} bands have thirty minutes."
+    bench("render.announcement_text", lambda: announcer.render_announcement_text(template, "14:30", colors), n(5000))
+
+    # Color rotation
+    rotation = color_rotation.ColorRotation(SHIFT_START.time(), ["Red", "Yellow", "Blue", "Green", "Orange"])
+    bench("colors.rotation_colors_at", lambda: rotation.colors_at(now), n(20000))
+    bench("colors.predict_colors", lambda: prerender.predict_colors(colors, now, now + datetime.timedelta(hours=3)),
+          n(20000))
+    engine = color_rotation.RotationEngine(lambda fn: fn(FakeConnection(db_latency)))
+    bench("colors.rotation_refresh", engine.refresh, n(200), db_latency_ms=db_latency * 1000)
+
+    # End to end: fetch colors, render, synthesize (fake TTS), play (fake player)
+    if not only or "end_to_end" in only:
+        results.update(end_to_end(announcer, color_rotation, n, db_latency))
+    return results
+
+
+def end_to_end(announcer, color_rotation, n: Callable[[int], int], db_latency: float) -> Dict[str, Any]:
+    import db_pool
+    write_ini("e2e.ini", 24)
+    config = announcer.load_config("e2e.ini")
+    pool = db_pool.ConnectionPool(lambda: FakeConnection(db_latency), name="benchmark-db")
+    # Route the announcer's pooled queries to the fake database
+    announcer._db_pools[tuple(config.database[k] for k in ("server", "database", "username", "password"))] = pool
+    rotation_engine = color_rotation.RotationEngine(pool.run)
+    counter = iter(range(10 ** 9))
+
+    def announce(cold: bool) -> None:
+        slot = datetime.datetime.now().replace(second=0, microsecond=0)
+        colors = announcer.fetch_announcement_colors(config, rotation_engine)
+        if cold:
+            # A distinct template per call forces a cache miss and a fresh synthesis
+            config.announcements["hour"] = f"Benchmark {next(counter)}: it is {{time}}, {{color1}} expired."
+        path = announcer.prepare_announcement(config, "hour", slot, colors)
+        if not path or not announcer.play_sound(path, "mp3", cleanup=False, tts=config.tts):
+            raise RuntimeError("announcement failed")
+
+    results = {}
+    for label, cold in (("cold_cache", True), ("warm_cache", False)):
+        try:
+            results[f"end_to_end.{label}"] = dict(measure(lambda: announce(cold), n(100)),
+                                                  db_latency_ms=db_latency * 1000)
+        except Exception as e:
+            results[f"end_to_end.{label}"] = {"error": f"{type(e).__name__}: {e}"}
+    announcer.get_playback_engine(config.tts).close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the announcement pipeline")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the iterations")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this string")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="simulated database round trip")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    original_dir = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="announcer-bench-")
+    os.chdir(scratch)
+    try:
+        started = time.time()
+        results = run_benchmarks(args.quick, args.only, args.db_latency_ms / 1000)
+        report = {
+            "version": git_version(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "duration_s": round(time.time() - started, 2),
+            "results": results
+        }
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any("error" in r for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+color_rotation.py
+
+Local computation of the wristband color rotation. The rotation is fully
+determined by the shift start time in applicationinfo and the ordered rows of
+ticketprintergroupcolors: every 30 minutes since the shift start the color
+order advances by one position. The base rows are loaded from the database
+once and refreshed on a slow interval, so the color order for any timestamp
+(current or future) is computed in Python without a database round trip.
+
+The computation mirrors the rotation query in announcer.get_color_message_from_db,
+which is still used to verify the local result shortly before announcements.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("color_rotation")
+
+# Color values stored by the ticket printer configuration
+COLOR_CODES = {
+    -65536: 'Red',
+    -256: 'Yellow',
+    -16711681: 'Blue',
+    -16711936: 'Green',
+    -23296: 'Orange'
+}
+UNKNOWN_COLOR = 'Unknown'
+PRINTER_GROUP = 1
+INTERVAL_MINUTES = 30
+DEFAULT_REFRESH_SECONDS = 60 * 60
+# Minimum delay between reload attempts while the database is unreachable
+RETRY_SECONDS = 60
+
+
+def color_name(code: Any) -> str:
+    """
+    Translate a stored color value to its name.
+    """
+    try:
+        return COLOR_CODES.get(int(code), UNKNOWN_COLOR)
+    except (TypeError, ValueError):
+        return UNKNOWN_COLOR
+
+
+def _parse_shift_start(value: Any) -> datetime.time:
+    if isinstance(value, datetime.datetime):
+        return value.time()
+    if isinstance(value, datetime.time):
+        return value
+    text = str(value).strip()
+    for fmt in ("%H:%M:%S.%f", "%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.datetime.strptime(text[:15], fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized shift start time: {value!r}")
+
+
+class ColorRotation:
+    """
+    The rotation inputs: shift start time and the base color order.
+    """
+    def __init__(self, shift_start: datetime.time, colors: List[str],
+                 loaded_at: Optional[datetime.datetime] = None):
+        self.shift_start = shift_start
+        self.colors = list(colors)
+        self.loaded_at = loaded_at or datetime.datetime.now()
+
+    def interval_at(self, ts: datetime.datetime) -> int:
+        """
+        Return the rotation interval index at ts, matching the SQL
+        DATEDIFF(MINUTE, shift_start, current_time) / 30 % color_count.
+        """
+        if not self.colors:
+            return 0
+        return (self._minutes_since_shift_start(ts) // INTERVAL_MINUTES) % len(self.colors)
+
+    def _minutes_since_shift_start(self, ts: datetime.datetime) -> int:
+        minutes = (ts.hour * 60 + ts.minute) - (self.shift_start.hour * 60 + self.shift_start.minute)
+        if minutes < 0:
+            minutes += 24 * 60
+        return minutes
+
+    def minutes_until_rotation(self, ts: datetime.datetime) -> int:
+        """
+        Return the whole minutes from ts until the color order next advances.
+        """
+        return INTERVAL_MINUTES - self._minutes_since_shift_start(ts) % INTERVAL_MINUTES
+
+    def colors_at(self, ts: datetime.datetime) -> Dict[str, Dict[str, str]]:
+        """
+        Return the color order at ts in the same shape as get_color_message_from_db.
+        """
+        total = len(self.colors)
+        if not total:
+            return {}
+        interval = self.interval_at(ts)
+        return {
+            f'color{position}': {
+                'color': self.colors[(position - 1 + interval) % total],
+                'time': f'Interval {position}'
+            }
+            for position in range(1, total + 1)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The inputs as JSON-compatible values, e.g. for the announcer's status record.
+        """
+        return {"shift_start": self.shift_start.strftime("%H:%M:%S"), "colors": list(self.colors)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColorRotation":
+        return cls(_parse_shift_start(data["shift_start"]), list(data["colors"]))
+
+
+def load_rotation(conn, printer_group: int = PRINTER_GROUP, placeholder: str = "%s") -> ColorRotation:
+    """
+    Load the rotation inputs over any DB-API connection.
+    placeholder is the driver's parameter marker ('%s' for pymssql, '?' for sqlite3).
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT shiftdatechangetime FROM applicationinfo")
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError("No shift start time in applicationinfo")
+        shift_start = _parse_shift_start(row[0])
+        cursor.execute(
+            "SELECT color, corder FROM ticketprintergroupcolors "
+            f"WHERE ticketprintergroupno = {placeholder} ORDER BY corder",
+            (printer_group,)
+        )
+        colors = [color_name(color) for color, _ in cursor.fetchall()]
+    finally:
+        cursor.close()
+    if not colors:
+        raise ValueError("No colors found in ticketprintergroupcolors")
+    return ColorRotation(shift_start, colors)
+
+
+class RotationEngine:
+    """
+    Keeps the rotation inputs loaded and answers color-order queries locally.
+    """
+    def __init__(self, run_query: Callable[[Callable[[Any], Any]], Any],
+                 refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 printer_group: int = PRINTER_GROUP, placeholder: str = "%s",
+                 on_change: Optional[Callable[[ColorRotation], None]] = None):
+        """
+        run_query(fn) must call fn with a DB-API connection and return its result,
+        e.g. db_pool.ConnectionPool.run. on_change(rotation) is called whenever
+        newly loaded inputs differ from the previous ones.
+        """
+        self.run_query = run_query
+        self.on_change = on_change
+        self.refresh_seconds = refresh_seconds
+        self.printer_group = printer_group
+        self.placeholder = placeholder
+        self.rotation: Optional[ColorRotation] = None
+        self.mismatches = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Optional[ColorRotation]:
+        """
+        Reload the rotation inputs from the database. Keeps the previous
+        inputs if the database is unreachable.
+        """
+        try:
+            rotation = self.run_query(lambda conn: load_rotation(conn, self.printer_group, self.placeholder))
+        except Exception as e:
+            logger.error("Could not load color rotation inputs: %s", e)
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+            return self.rotation
+        with self._lock:
+            changed = self.rotation is None or (self.rotation.shift_start, self.rotation.colors) != (rotation.shift_start, rotation.colors)
+            self.rotation = rotation
+        if changed:
+            logger.info("Color rotation loaded: shift start %s, colors %s", rotation.shift_start, rotation.colors)
+            if self.on_change is not None:
+                try:
+                    self.on_change(rotation)
+                except Exception as e:
+                    logger.warning("Color rotation change callback failed: %s", e)
+        return rotation
+
+    def _current(self) -> Optional[ColorRotation]:
+        with self._lock:
+            rotation = self.rotation
+        stale = rotation is None or (datetime.datetime.now() - rotation.loaded_at).total_seconds() > self.refresh_seconds
+        if stale and time.monotonic() >= self._retry_at:
+            rotation = self.refresh()
+        return rotation
+
+    def colors_at(self, ts: datetime.datetime) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Return the predicted color order at ts, or None if the inputs are unavailable.
+        """
+        rotation = self._current()
+        return rotation.colors_at(ts) if rotation else None
+
+    def minutes_until_rotation(self, ts: datetime.datetime) -> Optional[int]:
+        """
+        Return the minutes from ts until the color order next advances, or None if the inputs are unavailable.
+        """
+        rotation = self._current()
+        return rotation.minutes_until_rotation(ts) if rotation else None
+
+    def verify(self, ts: datetime.datetime, db_colors: Optional[Dict[str, Dict[str, str]]]) -> bool:
+        """
+        Compare a color order fetched from the database with the local prediction.
+        A mismatch means the inputs changed, so they are reloaded.
+        """
+        if not db_colors:
+            return False
+        predicted = self.colors_at(ts)
+        if predicted == db_colors:
+            return True
+        self.mismatches += 1
+        logger.warning("Local color rotation differs from the database – reloading rotation inputs")
+        self.refresh()
+        return False
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+config_store.py
+
+Shared INI parsing for the announcer and the web interface. Parsed files are
+cached in-process keyed by their identity (path, mtime, size, inode), so
+repeated reads of an unchanged file are dictionary lookups and the parse cost
+(open, shared flock, line parsing) is only paid when the file actually changes.
+
+Snapshots are immutable; callers that want to modify a configuration copy the
+sections they need.
+"""
+
+import fcntl
+import os
+import stat
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+# Sections whose keys are case-sensitive (times are HH:MM keys)
+CASE_SENSITIVE_SECTIONS = ('times',)
+
+FileIdentity = Tuple[int, int, int]
+
+_cache: Dict[str, "ConfigSnapshot"] = {}
+_cache_lock = threading.Lock()
+
+
+# File locking context manager using fcntl
+@contextmanager
+def locked_file(filepath, mode='r', lock_type=fcntl.LOCK_SH):
+    with open(filepath, mode) as f:
+        fcntl.flock(f, lock_type)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _identity(st: os.stat_result) -> FileIdentity:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def file_identity(path: str) -> Optional[FileIdentity]:
+    """
+    Return (mtime_ns, size, inode) for path, or None if it does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _identity(st)
+
+
+def write_atomic(path: str, text: str) -> None:
+    """
+    Replace the contents of path with text. Readers (and the announcer's
+    watcher) see the old file or the new one, never a partial write.
+    """
+    temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(temp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        invalidate(path)
+
+
+def parse_ini_text(text: str) -> Dict[str, Dict[str, str]]:
+    """
+    Parse the announcer INI format into {section: {key: value}}.
+    Section names and keys are lower-cased (except [times] keys) and
+    surrounding quotes are stripped from values.
+    """
+    sections: Dict[str, Dict[str, str]] = {}
+    current_section = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            current_section = line[1:-1].lower()
+            sections.setdefault(current_section, {})
+            continue
+        if '=' not in line or current_section is None:
+            continue
+        key, value = [x.strip() for x in line.split('=', 1)]
+        if current_section not in CASE_SENSITIVE_SECTIONS:
+            key = key.lower()
+        sections[current_section][key] = value.strip('"\'')
+    return sections
+
+
+class ConfigSnapshot:
+    """
+    Immutable parsed view of one configuration file version.
+    """
+    def __init__(self, path: str, identity: FileIdentity, text: str):
+        self.path = path
+        self.identity = identity
+        self.text = text
+        parsed = parse_ini_text(text)
+        self.sections: Mapping[str, Mapping[str, str]] = MappingProxyType(
+            {name: MappingProxyType(values) for name, values in parsed.items()}
+        )
+
+    def section(self, name: str) -> Mapping[str, str]:
+        """
+        Return a section's values, or an empty mapping if the section is absent.
+        """
+        return self.sections.get(name, MappingProxyType({}))
+
+
+def load(path: str) -> Optional[ConfigSnapshot]:
+    """
+    Return the parsed snapshot for path, re-parsing only if the file changed.
+    Returns None if the file does not exist.
+    """
+    identity = file_identity(path)
+    key = os.path.abspath(path)
+    if identity is None:
+        with _cache_lock:
+            _cache.pop(key, None)
+        return None
+    with _cache_lock:
+        snapshot = _cache.get(key)
+    if snapshot is not None and snapshot.identity == identity:
+        return snapshot
+    try:
+        with locked_file(path, 'r', fcntl.LOCK_SH) as f:
+            text = f.read()
+            # Identity of the file actually read: a writer may have replaced the
+            # path since, and its new inode must not be cached with the old text
+            identity = _identity(os.fstat(f.fileno()))
+    except FileNotFoundError:
+        return None
+    snapshot = ConfigSnapshot(path, identity, text)
+    with _cache_lock:
+        _cache[key] = snapshot
+    return snapshot
+
+
+def invalidate(path: Optional[str] = None) -> None:
+    """
+    Drop the cached snapshot for path (or every snapshot) after a write.
+    """
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(path), None)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+config_watcher.py
+
+Event-driven configuration change detection for the announcer. The watcher
+uses Linux inotify on the configuration directory (via ctypes, no extra
+dependencies) and falls back to polling file identities where inotify is not
+available. Relevant changes (day INI files and the reload_config marker) wake
+the scheduler immediately instead of waiting for its next poll.
+
+The watcher thread also runs wall-clock scheduled events such as the daily
+1:00 AM configuration reload, so no separate timer thread is needed.
+"""
+
+import ctypes
+import ctypes.util
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("config_watcher")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+DEFAULT_POLL_INTERVAL = 2.0
+# Bursts of events (e.g. an INI write followed by the reload marker) are coalesced
+SETTLE_SECONDS = 0.2
+RELOAD_MARKER = "reload_config"
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def is_config_file(name: str) -> bool:
+    """
+    Return True for files whose changes should trigger a configuration reload.
+    """
+    return name == RELOAD_MARKER or name.endswith(".ini")
+
+
+class ConfigWatcher:
+    """
+    Watches the configuration directory and runs scheduled wall-clock events.
+    """
+    def __init__(self, directory: str = ".", poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 use_inotify: bool = True):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend = "none"
+        # Set whenever a relevant change is seen or a scheduled event fires
+        self.wake = threading.Event()
+        self._changed: List[str] = []
+        self._changed_lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+        self._wake_callbacks: List[Callable[[], None]] = []
+        self._schedule: List[Tuple[float, int, str, Callable[[], None], Optional[Tuple[int, int]]]] = []
+        self._schedule_seq = itertools.count()
+        self._schedule_lock = threading.Lock()
+        self._identities: Dict[str, Tuple[int, int, int]] = {}
+        self._stop = threading.Event()
+        self._fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Call callback(filename) on every relevant change.
+        """
+        self._listeners.append(callback)
+
+    def add_wake_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback() (from the watcher thread) whenever wake is set,
+        e.g. to wake an asyncio loop with call_soon_threadsafe.
+        """
+        self._wake_callbacks.append(callback)
+
+    def _set_wake(self) -> None:
+        self.wake.set()
+        for callback in self._wake_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Configuration wake callback failed: %s", e, exc_info=True)
+
+    def schedule_at(self, when: datetime.datetime, callback: Callable[[], None], name: str) -> None:
+        """
+        Run callback once at the given local wall-clock time.
+        """
+        self._push(when.timestamp(), name, callback, None)
+
+    def schedule_daily(self, hour: int, minute: int, callback: Callable[[], None], name: str) -> datetime.datetime:
+        """
+        Run callback every day at hour:minute local time. Returns the first run time.
+        """
+        when = self._next_daily(hour, minute)
+        self._push(when.timestamp(), name, callback, (hour, minute))
+        logger.info("Scheduled '%s' at %s", name, when.strftime('%Y-%m-%d %H:%M:%S'))
+        return when
+
+    @staticmethod
+    def _next_daily(hour: int, minute: int) -> datetime.datetime:
+        now = datetime.datetime.now()
+        when = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if when <= now:
+            when += datetime.timedelta(days=1)
+        return when
+
+    def _push(self, when_ts: float, name: str, callback: Callable[[], None],
+              daily: Optional[Tuple[int, int]]) -> None:
+        with self._schedule_lock:
+            heapq.heappush(self._schedule, (when_ts, next(self._schedule_seq), name, callback, daily))
+        self._set_wake()
+
+    def consume_changes(self) -> List[str]:
+        """
+        Return and clear the names of files changed since the last call.
+        """
+        with self._changed_lock:
+            changed, self._changed = self._changed, []
+        return changed
+
+    def has_changes(self) -> bool:
+        with self._changed_lock:
+            return bool(self._changed)
+
+    def start(self) -> None:
+        libc = _load_libc() if self.use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(self.directory)), WATCH_MASK) >= 0:
+                self._fd = fd
+                self.backend = "inotify"
+            else:
+                logger.warning("inotify unavailable (errno %s); polling for configuration changes", ctypes.get_errno())
+                if fd >= 0:
+                    os.close(fd)
+        if self._fd is None:
+            self.backend = "polling"
+            self._identities = self._scan()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Configuration watcher started on %s (%s)", os.path.abspath(self.directory), self.backend)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._set_wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _notify(self, names: List[str]) -> None:
+        names = sorted(set(names))
+        if not names:
+            return
+        with self._changed_lock:
+            self._changed.extend(n for n in names if n not in self._changed)
+        logger.info("Configuration change detected: %s", ', '.join(names))
+        for callback in self._listeners:
+            for name in names:
+                try:
+                    callback(name)
+                except Exception as e:
+                    logger.error("Configuration change listener failed: %s", e, exc_info=True)
+        self._set_wake()
+
+    def _scan(self) -> Dict[str, Tuple[int, int, int]]:
+        identities = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and is_config_file(entry.name):
+                        st = entry.stat()
+                        identities[entry.name] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError as e:
+            logger.warning("Could not scan configuration directory: %s", e)
+        return identities
+
+    def _poll(self) -> List[str]:
+        current = self._scan()
+        changed = [name for name, identity in current.items() if self._identities.get(name) != identity]
+        self._identities = current
+        return changed
+
+    def _read_inotify(self) -> List[str]:
+        names = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].split(b"\0", 1)[0].decode(errors="replace")
+                offset += length
+                if is_config_file(name):
+                    names.append(name)
+        return names
+
+    def _run_due_events(self) -> float:
+        """
+        Run scheduled events that are due. Returns seconds until the next one.
+        """
+        while True:
+            with self._schedule_lock:
+                if not self._schedule:
+                    return self.poll_interval
+                when_ts, _, name, callback, daily = self._schedule[0]
+                delay = when_ts - time.time()
+                if delay > 0:
+                    return delay
+                heapq.heappop(self._schedule)
+            logger.info("Running scheduled event '%s'", name)
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Scheduled event '%s' failed: %s", name, e, exc_info=True)
+            if daily is not None:
+                self.schedule_daily(daily[0], daily[1], callback, name)
+            self._set_wake()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            timeout = min(self._run_due_events(), self.poll_interval)
+            if self._fd is not None:
+                ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+                if ready and not self._stop.is_set():
+                    time.sleep(SETTLE_SECONDS)
+                    self._notify(self._read_inotify())
+            else:
+                if self._stop.wait(max(timeout, 0)):
+                    break
+                self._notify(self._poll())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+control.py
+
+Local control channel between the web interface and the announcer. The
+announcer serves a Unix domain socket (announcer.sock in its working
+directory) on its event loop; the web interface sends one JSON request per
+connection and reads one JSON reply, so a configuration change or an instant
+announcement reaches the running announcer in milliseconds without a
+restart or a file poll.
+
+    -> {"command": "reload", "immediate": true}
+    <- {"ok": true}
+    -> {"command": "switch_config", "config_file": "sat.ini"}
+    -> {"command": "enqueue", "text": "...", "priority": 0}
+    <- {"ok": true, "job_id": "..."}
+    -> {"command": "status"}
+    <- {"ok": true, "config_file": "fri.ini", "next_announcement": {...}, ...}
+    <- {"ok": false, "error": "..."}
+
+send() returns None when the announcer is not listening (stopped, or an
+older version); callers then fall back to the reload_config marker and the
+announce_queue spool, which the announcer still picks up when it starts.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+import metrics
+
+logger = logging.getLogger("control")
+
+CONTROL_SOCKET = "announcer.sock"
+# Replies are small; the limit only guards against a runaway client
+MAX_MESSAGE_BYTES = 64 * 1024
+CLIENT_TIMEOUT_SECONDS = 2.0
+SERVER_READ_TIMEOUT_SECONDS = 5.0
+
+Handler = Callable[[Dict[str, Any]], Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+
+COMMANDS = metrics.counter("announcer_control_commands_total", "Control socket commands by result",
+                           ["command", "result"])
+COMMAND_SECONDS = metrics.histogram("announcer_control_command_seconds", "Control socket command handling time",
+                                    ["command"])
+
+
+class ControlServer:
+    """
+    Announcer-side control socket. handlers maps a command name to a function
+    taking the request and returning the reply fields (or an awaitable of them);
+    raising ValueError or LookupError replies with ok=false and the message.
+    """
+    def __init__(self, handlers: Dict[str, Handler], path: str = CONTROL_SOCKET):
+        self.handlers = handlers
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> bool:
+        """
+        Start listening. Returns False if the socket could not be created.
+        """
+        if _listening(self.path):
+            logger.warning("Another announcer is already listening on %s; control socket not started", self.path)
+            return False
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove stale control socket %s: %s", self.path, e)
+            return False
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=MAX_MESSAGE_BYTES)
+            # The web interface may run as another user in the same group
+            os.chmod(self.path, 0o660)
+        except OSError as e:
+            logger.warning("Control socket not started on %s: %s", self.path, e)
+            return False
+        logger.info("Listening for control commands on %s", self.path)
+        return True
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        command = "unknown"
+        try:
+            line = await asyncio.wait_for(reader.readline(), SERVER_READ_TIMEOUT_SECONDS)
+            request = json.loads(line.decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            name = str(request.get("command", ""))
+            handler = self.handlers.get(name)
+            if handler is None:
+                raise ValueError(f"Unknown command {name!r}")
+            command = name
+            with COMMAND_SECONDS.time(command=command):
+                result = handler(request)
+                if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+                    result = await result
+            reply = dict(result or {}, ok=True)
+            COMMANDS.inc(command=command, result="ok")
+        except (ValueError, LookupError) as e:
+            reply = {"ok": False, "error": str(e)}
+            COMMANDS.inc(command=command, result="rejected")
+        except asyncio.TimeoutError:
+            reply = {"ok": False, "error": "Timed out reading request"}
+            COMMANDS.inc(command=command, result="rejected")
+        except Exception as e:
+            logger.error("Control command %s failed: %s", command, e, exc_info=True)
+            reply = {"ok": False, "error": str(e)}
+            COMMANDS.inc(command=command, result="error")
+        try:
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+
+def _listening(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(0.5)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def send(command: str, path: str = CONTROL_SOCKET, timeout: float = CLIENT_TIMEOUT_SECONDS,
+         **fields) -> Optional[Dict[str, Any]]:
+    """
+    Send a command to the announcer and return its reply, or None if the
+    announcer could not be reached (the caller should fall back). A reply
+    with ok=false means the announcer received the command and rejected it.
+    """
+    request = dict(fields, command=command)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        data = b""
+        while not data.endswith(b"\n") and len(data) < MAX_MESSAGE_BYTES:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return json.loads(data.decode("utf-8"))
+    except (OSError, ValueError) as e:
+        logger.debug("Announcer control socket unavailable for %s: %s", command, e)
+        return None
+    finally:
+        sock.close()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+db_pool.py
+
+Small pool of persistent, health-checked database connections. Connections are
+reused across queries instead of paying a TCP + TDS login per call; idle
+connections are pinged before reuse and a failed query is retried once on a
+fresh connection without sleeping. Connect and query latency are recorded per
+call, and the pool reports itself degraded while the database is unreachable
+so callers can fall back to last-known-good data.
+
+Works with any DB-API 2.0 connection factory, so it can be exercised with a
+fake or sqlite3 connection.
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import metrics
+
+logger = logging.getLogger("db_pool")
+
+T = TypeVar("T")
+
+DEFAULT_POOL_SIZE = 2
+# Idle connections older than this are pinged before reuse
+PING_AFTER_SECONDS = 30.0
+# Idle connections older than this are closed instead of reused
+MAX_IDLE_SECONDS = 15 * 60.0
+# How long to keep reporting degraded after a failure without a successful call
+RECOVERY_BACKOFF_SECONDS = 30.0
+
+QUERY_SECONDS = metrics.histogram("announcer_db_query_seconds",
+                                  "Pooled database calls, including connecting, by outcome", ["pool", "result"])
+RETRIES = metrics.counter("announcer_db_retries_total", "Database calls retried on a fresh connection", ["pool"])
+CONNECTS = metrics.counter("announcer_db_connects_total", "New database connections opened", ["pool"])
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable DB-API connections.
+    """
+    def __init__(self, connect: Callable[[], Any], size: int = DEFAULT_POOL_SIZE,
+                 ping_query: str = "SELECT 1", name: str = "db"):
+        self.connect = connect
+        self.size = size
+        self.ping_query = ping_query
+        self.name = name
+        self.connects = 0
+        self.connect_failures = 0
+        self.query_failures = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.last_error: Optional[str] = None
+        self.degraded_until = 0.0
+        # (finished_at, connect_ms, query_ms, ok) for the most recent calls
+        self.latencies: Deque[Tuple[float, float, float, bool]] = collections.deque(maxlen=100)
+        self._idle: List[Tuple[Any, float]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+    def _open(self) -> Any:
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._lock:
+                self.connect_failures += 1
+            raise
+        with self._lock:
+            self.connects += 1
+        CONNECTS.inc(pool=self.name)
+        return conn
+
+    def _ping(self, conn: Any) -> bool:
+        with self._lock:
+            self.pings += 1
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning("%s connection failed liveness ping: %s", self.name, e)
+            with self._lock:
+                self.ping_failures += 1
+            return False
+
+    @staticmethod
+    def _close(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _acquire(self) -> Any:
+        """
+        Return a live connection, reusing an idle one when possible.
+        """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > MAX_IDLE_SECONDS:
+                self._close(conn)
+                continue
+            if idle_for > PING_AFTER_SECONDS and not self._ping(conn):
+                self._close(conn)
+                continue
+            return conn
+        return self._open()
+
+    def _release(self, conn: Any) -> None:
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._close(conn)
+
+    def run(self, fn: Callable[[Any], T]) -> T:
+        """
+        Run fn(connection) and return its result. On failure the connection is
+        discarded and fn is retried once on a fresh connection.
+        """
+        attempts = 2
+        while True:
+            attempts -= 1
+            started = time.monotonic()
+            conn = None
+            try:
+                conn = self._acquire()
+                connected = time.monotonic()
+                result = fn(conn)
+            except Exception as e:
+                finished = time.monotonic()
+                if conn is not None:
+                    self._close(conn)
+                with self._lock:
+                    self.query_failures += 1
+                    self.last_error = str(e)
+                    self.latencies.append((time.time(), (finished - started) * 1000, 0.0, False))
+                QUERY_SECONDS.observe(finished - started, pool=self.name, result="error")
+                if attempts > 0 and conn is not None:
+                    logger.warning("%s query failed (%s); retrying on a fresh connection", self.name, e)
+                    RETRIES.inc(pool=self.name)
+                    continue
+                self.degraded_until = time.monotonic() + RECOVERY_BACKOFF_SECONDS
+                raise
+            finished = time.monotonic()
+            self._release(conn)
+            with self._lock:
+                self.degraded_until = 0.0
+                self.latencies.append((time.time(), (connected - started) * 1000, (finished - connected) * 1000, True))
+            QUERY_SECONDS.observe(finished - started, pool=self.name, result="ok")
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return pool counters and the most recent call latencies.
+        """
+        with self._lock:
+            last = self.latencies[-1] if self.latencies else None
+            return {
+                "idle": len(self._idle),
+                "connects": self.connects,
+                "connect_failures": self.connect_failures,
+                "query_failures": self.query_failures,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "degraded": self.degraded,
+                "last_error": self.last_error,
+                "last_connect_ms": last[1] if last else None,
+                "last_query_ms": last[2] if last else None
+            }
+
+    def close(self) -> None:
+        """
+        Close every idle connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+fragments.py
+
+Fragment-based announcement assembly. Templates are split into their static
+text segments and placeholder slots; every segment and every possible slot
+value (color names, scheduled times) is synthesized once into the audio cache.
+An announcement is then assembled locally by concatenating the MP3 frames of
+its fragments, so no network call is needed at announcement time.
+
+If any fragment is missing (for example right after a template was edited)
+assemble() returns None and the caller falls back to whole-sentence synthesis
+while the fragments are rebuilt in the background.
+"""
+
+import logging
+import os
+import string
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import announcement_templates
+import audio_cache
+
+logger = logging.getLogger("fragments")
+
+# Voice suffix used to keep assembled audio apart from whole-sentence audio in the cache
+ASSEMBLED_VOICE_SUFFIX = "#fragments"
+# Fragments handed to the synthesis pool at once during a rebuild
+BUILD_BATCH_SIZE = 16
+
+# Bitrates in kbit/s indexed by [version_is_mpeg1][layer][index]
+_BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+# Sample rates in Hz indexed by version bits (0 = 2.5, 2 = 2, 3 = 1)
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+_build_lock = threading.Lock()
+_building: Optional[threading.Thread] = None
+
+
+def split_template(template: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Split a template into (literal_text, field_name) pairs.
+    field_name is None for a trailing literal with no placeholder.
+    """
+    return [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+
+
+def _speakable(text: str) -> bool:
+    return any(c.isalnum() for c in text)
+
+
+def fragment_texts(template: str, format_vars: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Return the ordered fragment texts that make up the rendered template.
+    Returns None if the template references a variable that is not available.
+    """
+    texts = []
+    for literal, field in split_template(template):
+        literal = literal.strip()
+        if _speakable(literal):
+            texts.append(literal)
+        if field is None:
+            continue
+        try:
+            value = str(announcement_templates.value_of(field, format_vars)).strip()
+        except KeyError:
+            return None
+        if _speakable(value):
+            texts.append(value)
+    return texts
+
+
+def _skip_id3v2(data: bytes) -> int:
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _frame_length(header: bytes) -> int:
+    """
+    Return the length in bytes of the MPEG audio frame starting with header, or 0 if invalid.
+    """
+    b1, b2 = header[1], header[2]
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][rate_index]
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // sample_rate + padding
+    return 144 * bitrate // sample_rate + padding
+
+
+def iter_mp3_frames(data: bytes) -> Iterator[bytes]:
+    """
+    Yield the audio frames of an MP3 stream, dropping ID3 tags and Xing/Info headers.
+    """
+    pos = _skip_id3v2(data)
+    end = len(data)
+    if end >= 128 and data[-128:-125] == b"TAG":
+        end -= 128
+    while pos + 4 <= end:
+        if data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+            pos += 1
+            continue
+        length = _frame_length(data[pos:pos + 4])
+        if length <= 0 or pos + length > end:
+            pos += 1
+            continue
+        frame = data[pos:pos + length]
+        pos += length
+        if b"Xing" in frame[:48] or b"Info" in frame[:48]:
+            continue
+        yield frame
+
+
+def concat_mp3(parts: Iterable[bytes]) -> bytes:
+    """
+    Concatenate MP3 streams at frame level into a single stream.
+    """
+    return b"".join(frame for part in parts for frame in iter_mp3_frames(part))
+
+
+def assemble(template: str, format_vars: Dict[str, Any], tts: Dict[str, str],
+             cache: audio_cache.AudioCache) -> Optional[str]:
+    """
+    Assemble an announcement from cached fragments.
+    Returns the path of the assembled file, or None if any fragment is missing.
+    """
+    voice_id = tts.get('voice_id', '')
+    output_format = tts.get('output_format', 'mp3') or 'mp3'
+    if output_format != 'mp3':
+        return None
+    texts = fragment_texts(template, format_vars)
+    if not texts:
+        return None
+    text = announcement_templates.compile_template(template).render(format_vars)
+    key = audio_cache.make_key(text, voice_id + ASSEMBLED_VOICE_SUFFIX, output_format)
+    cached_path = cache.lookup(key, output_format)
+    if cached_path:
+        return cached_path
+    parts = []
+    for fragment in texts:
+        path = cache.peek(audio_cache.make_key(fragment, voice_id, output_format), output_format)
+        if path is None:
+            logger.info("Fragment not yet synthesized: %r", fragment)
+            return None
+        with open(path, 'rb') as f:
+            parts.append(f.read())
+    temp_path = cache.temp_path(key, output_format)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(concat_mp3(parts))
+        return cache.put(key, output_format, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def required_fragments(templates: Iterable[str], slot_values: Dict[str, Iterable[str]]) -> List[str]:
+    """
+    Return every distinct fragment text needed to assemble the given templates.
+    slot_values maps a placeholder name (or its prefix, e.g. 'color') to its possible values.
+    """
+    needed: Dict[str, None] = {}
+    for template in templates:
+        try:
+            pieces = split_template(template)
+        except ValueError as e:
+            logger.warning("Skipping unparsable template for fragments: %s", e)
+            continue
+        for literal, field in pieces:
+            literal = literal.strip()
+            if _speakable(literal):
+                needed[literal] = None
+            if field is None:
+                continue
+            values = slot_values.get(field)
+            if values is None:
+                values = slot_values.get(field.rstrip('0123456789'), ())
+            for value in values:
+                value = str(value).strip()
+                if _speakable(value):
+                    needed[value] = None
+    return list(needed)
+
+
+def build_fragments(texts: Iterable[str], synthesize: Callable[[str], Optional[str]],
+                    shutdown_event: Optional[threading.Event] = None,
+                    synthesize_batch: Optional[Callable[[List[str]], List[Optional[str]]]] = None) -> Tuple[int, int]:
+    """
+    Synthesize every fragment into the cache. Returns (ready, failed) counts.
+    With synthesize_batch, fragments are rendered BUILD_BATCH_SIZE at a time.
+    """
+    ready = failed = 0
+    texts = list(texts)
+    batch_size = BUILD_BATCH_SIZE if synthesize_batch is not None else 1
+    for start in range(0, len(texts), batch_size):
+        if shutdown_event is not None and shutdown_event.is_set():
+            break
+        batch = texts[start:start + batch_size]
+        results = synthesize_batch(batch) if synthesize_batch is not None else [synthesize(batch[0])]
+        for path in results:
+            if path:
+                ready += 1
+            else:
+                failed += 1
+    logger.info("Fragment build finished: %s ready, %s failed", ready, failed)
+    return ready, failed
+
+
+def build_fragments_async(texts: List[str], synthesize: Callable[[str], Optional[str]],
+                          shutdown_event: Optional[threading.Event] = None,
+                          synthesize_batch: Optional[Callable[[List[str]], List[Optional[str]]]] = None) -> bool:
+    """
+    Start a background fragment build unless one is already running.
+    """
+    global _building
+    with _build_lock:
+        if _building is not None and _building.is_alive():
+            return False
+        _building = threading.Thread(target=build_fragments, args=(texts, synthesize, shutdown_event, synthesize_batch),
+                                     name="fragment-build", daemon=True)
+        _building.start()
+    logger.info("Rebuilding %s announcement fragments in the background", len(texts))
+    return True
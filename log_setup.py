@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+log_setup.py
+
+Logging for the announcer and the web interface. Log calls only put the
+record on an in-memory queue; a background listener thread formats it and
+writes it to a rotating file (and stdout), so a slow disk never holds up an
+announcement. If the queue fills up, records are dropped and counted rather
+than blocking the caller.
+
+Each process writes its own file (announcement_script.log for the announcer,
+settings.log for the web interface), so rotation is never raced by a second
+writer. Levels and rotation are set from an optional [logging] section in
+the INI; `level` is the root level, `rotate` is size (max_mb per file) or
+daily, `console` also logs to stdout, and any other key sets the level of
+that component's logger (loggers are named after their modules):
+
+    [logging]
+    level = INFO
+    rotate = size
+    max_mb = 10
+    backups = 5
+    console = true
+    playback = DEBUG
+    db_pool = WARNING
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import Dict, Mapping, Optional
+
+import config_store
+import metrics
+
+ANNOUNCER_LOG_FILE = "announcement_script.log"
+SETTINGS_LOG_FILE = "settings.log"
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_MB = 10
+DEFAULT_BACKUPS = 5
+# Records waiting for the writer thread; beyond this they are dropped
+QUEUE_SIZE = 10000
+# [logging] keys that are options rather than component levels
+OPTION_KEYS = ("level", "rotate", "max_mb", "backups", "console")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+# Component loggers whose level was set from the INI, so removed keys can be reset
+_component_levels: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: when the queue is full the record is dropped.
+    """
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in this process, so the record does not need to be
+        # pickled; formatting is left to the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_level(value: str, default: int) -> int:
+    level = logging.getLevelName(str(value).strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def _file_handler(log_file: str, options: Mapping[str, str]) -> logging.Handler:
+    try:
+        backups = int(options.get("backups", DEFAULT_BACKUPS))
+        max_bytes = int(float(options.get("max_mb", DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError:
+        backups, max_bytes = DEFAULT_BACKUPS, DEFAULT_MAX_MB * 1024 * 1024
+    if str(options.get("rotate", "size")).strip().lower() == "daily":
+        return logging.handlers.TimedRotatingFileHandler(log_file, when="midnight", backupCount=backups,
+                                                         encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                                encoding="utf-8")
+
+
+def read_options(config_path: str) -> Mapping[str, str]:
+    """
+    Return the [logging] section of an INI file, or an empty mapping.
+    """
+    try:
+        snapshot = config_store.load(config_path)
+    except Exception:
+        return {}
+    return snapshot.section("logging") if snapshot is not None else {}
+
+
+def setup_logging(log_file: str, options: Optional[Mapping[str, str]] = None) -> None:
+    """
+    Route all logging through a background writer to log_file. Replaces any
+    handlers already on the root logger. Safe to call again, e.g. after the
+    [logging] section changed; the file handler is then recreated.
+    """
+    global _listener, _queue_handler
+    options = options or {}
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    handlers = [_file_handler(log_file, options)]
+    if str(options.get("console", "true")).strip().lower() in ("1", "true", "yes", "on"):
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    with _lock:
+        shutdown_logging()
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        # respect_handler_level lets a handler be quieter than the loggers feeding it
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(_queue_handler)
+        _listener.start()
+    apply_levels(options)
+
+
+def apply_levels(options: Mapping[str, str]) -> None:
+    """
+    Set the root level and per-component levels from a [logging] section.
+    Components no longer listed go back to inheriting the root level.
+    """
+    logging.getLogger().setLevel(_parse_level(options.get("level", DEFAULT_LEVEL), logging.INFO))
+    levels = {name: _parse_level(value, logging.NOTSET) for name, value in options.items()
+              if name not in OPTION_KEYS}
+    with _lock:
+        for name in set(_component_levels) - set(levels):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(level)
+        _component_levels.clear()
+        _component_levels.update(levels)
+
+
+def dropped_records() -> int:
+    """
+    Number of records dropped because the writer could not keep up.
+    """
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def shutdown_logging() -> None:
+    """
+    Flush queued records and stop the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+metrics.gauge("log_records_dropped", "Log records dropped because the log writer fell behind",
+              function=dropped_records)
+atexit.register(shutdown_logging)
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+playback.py
+
+Long-lived audio playback engine. Instead of spawning a new mpg123 process for
+every announcement, a single mpg123 instance runs in remote-control mode (-R)
+and is fed LOAD commands over its stdin pipe. Jobs are processed one at a time
+from a priority queue with a bounded per-job timeout, and the start latency
+(time from dequeue to the first decoded stream header) is measured for each job.
+
+Lower priority numbers play first. A job that arrives while a preemptible job
+(rules, ads) is playing stops it; the interrupted job is re-queued once.
+
+A FakeSink is provided so the engine can be exercised without sound hardware.
+"""
+
+import itertools
+import logging
+import os
+import queue
+import shutil
+import stat
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger("playback")
+
+DEFAULT_TIMEOUT_SECONDS = 120.0
+# How long to wait for mpg123 to acknowledge a LOAD before treating it as hung
+START_TIMEOUT_SECONDS = 5.0
+# How long close() lets queued jobs play before the sink is shut down
+CLOSE_TIMEOUT_SECONDS = 30.0
+
+# Playback priorities; lower numbers play first
+PRIORITY_INSTANT = 0
+PRIORITY_HOUR = 10
+PRIORITY_FIFTYFIVE = 20
+PRIORITY_CUSTOM = 30
+PRIORITY_RULES = 40
+PRIORITY_AD = 50
+# Jobs at this priority number or higher may be interrupted by more urgent ones
+PREEMPTIBLE_PRIORITY = PRIORITY_RULES
+
+QUEUE_WAIT_SECONDS = metrics.histogram("announcer_playback_queue_wait_seconds",
+                                       "Time playback jobs spent queued before the player took them")
+START_LATENCY_SECONDS = metrics.histogram("announcer_playback_start_latency_seconds",
+                                          "Time from handing a file to the player until audio started")
+DURATION_SECONDS = metrics.histogram("announcer_playback_duration_seconds", "Time the player spent on each job",
+                                     buckets=(1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180))
+JOBS = metrics.counter("announcer_playback_jobs_total", "Finished playback jobs by final status", ["status"])
+
+_job_ids = itertools.count(1)
+_engines: Dict[str, "PlaybackEngine"] = {}
+_engines_lock = threading.Lock()
+
+
+class PlaybackJob:
+    """
+    A single queued playback request.
+    """
+    def __init__(self, path: str, cleanup: bool = False, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                 priority: int = PRIORITY_HOUR, on_status: Optional[Callable[["PlaybackJob"], None]] = None):
+        self.id = next(_job_ids)
+        self.path = path
+        self.cleanup = cleanup
+        self.timeout = timeout
+        self.priority = priority
+        self.on_status = on_status
+        self.preempted = False
+        self.requeued = False
+        self.replayable = True
+        self.status = "queued"
+        self.result = False
+        self.error: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.start_latency: Optional[float] = None
+        self._done = threading.Event()
+        self._done_callbacks: List[Callable[["PlaybackJob"], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+        if self.on_status is not None:
+            try:
+                self.on_status(self)
+            except Exception as e:
+                logger.warning("Playback status callback failed for job %s: %s", self.id, e)
+
+    def finish(self, status: str, result: bool, error: Optional[str] = None) -> None:
+        self.result = result
+        self.error = error
+        self.finished_at = time.monotonic()
+        self.set_status(status)
+        JOBS.inc(status=status)
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def add_done_callback(self, callback: Callable[["PlaybackJob"], None]) -> None:
+        """
+        Call callback(job) once the job finishes (immediately if it already has).
+        Runs on the playback thread, so event loops should use call_soon_threadsafe.
+        """
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def _run_callback(self, callback: Callable[["PlaybackJob"], None]) -> None:
+        try:
+            callback(self)
+        except Exception as e:
+            logger.warning("Playback done callback failed for job %s: %s", self.id, e)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the job finishes. Returns the playback result.
+        """
+        self._done.wait(timeout)
+        return self.result
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+
+class FakeSink:
+    """
+    Sound-hardware-free sink that records what it was asked to play.
+    """
+    name = "fake"
+
+    def __init__(self, duration: float = 0.0, start_latency: float = 0.0, fail: bool = False):
+        self.duration = duration
+        self.start_latency = start_latency
+        self.fail = fail
+        self.played = []
+        self._stop = threading.Event()
+
+    def play(self, path: str, timeout: float) -> Tuple[bool, Optional[float], Optional[str]]:
+        self._stop.clear()
+        if self.start_latency:
+            time.sleep(self.start_latency)
+        self.played.append(path)
+        if stat.S_ISFIFO(os.stat(path).st_mode):
+            # Drain a live stream like a real player would; audio starts with the first chunk
+            requested = time.monotonic()
+            with open(path, "rb") as stream:
+                first = stream.read(1)
+                start_latency = self.start_latency + (time.monotonic() - requested)
+                while first and stream.read(65536):
+                    if self._stop.is_set():
+                        return False, start_latency, "stopped"
+            if not first:
+                return False, None, "no audio stream"
+            return True, start_latency, None
+        if self.fail:
+            return False, self.start_latency, "fake sink failure"
+        if self._stop.wait(min(self.duration, timeout)):
+            return False, self.start_latency, "stopped"
+        if self.duration > timeout:
+            return False, self.start_latency, "timeout"
+        return True, self.start_latency, None
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        self.stop()
+
+
+class Mpg123Sink:
+    """
+    Persistent mpg123 process driven through its remote-control interface.
+    """
+    name = "mpg123"
+
+    def __init__(self, binary: str = "mpg123"):
+        self.binary = binary
+        self._proc: Optional[subprocess.Popen] = None
+        self._events: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def _ensure_process(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        path = shutil.which(self.binary)
+        if path is None:
+            raise RuntimeError(f"{self.binary} is not installed")
+        logger.info("Starting persistent %s player", self.binary)
+        self._proc = subprocess.Popen([path, '-R'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self._events = queue.Queue()
+        threading.Thread(target=self._read_events, args=(self._proc, self._events),
+                         name="mpg123-reader", daemon=True).start()
+        # Suppress per-frame progress output; we only need stream start/stop events
+        self._send("SILENCE")
+
+    @staticmethod
+    def _read_events(proc: subprocess.Popen, events: "queue.Queue[str]") -> None:
+        for line in proc.stdout:
+            events.put(line.strip())
+        events.put("@EOF")
+
+    def _send(self, command: str) -> None:
+        self._proc.stdin.write(command + "\n")
+        self._proc.stdin.flush()
+
+    def _next_event(self, deadline: float) -> Optional[str]:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            return self._events.get(timeout=remaining)
+        except queue.Empty:
+            return None
+
+    def _restart(self) -> None:
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=2)
+            except Exception as e:
+                logger.warning("Error killing %s: %s", self.binary, e)
+        self._proc = None
+
+    def play(self, path: str, timeout: float) -> Tuple[bool, Optional[float], Optional[str]]:
+        with self._lock:
+            self._ensure_process()
+            while not self._events.empty():
+                self._events.get_nowait()
+            self._stopped = False
+            requested = time.monotonic()
+            self._send(f"LOAD {path}")
+            start_latency = None
+            start_deadline = requested + START_TIMEOUT_SECONDS
+            end_deadline = requested + timeout
+            while True:
+                event = self._next_event(start_deadline if start_latency is None else end_deadline)
+                if event is None:
+                    logger.error("%s did not finish %s within the deadline – restarting player", self.binary, path)
+                    self._restart()
+                    return False, start_latency, "timeout"
+                if event == "@EOF":
+                    self._proc = None
+                    return False, start_latency, f"{self.binary} exited unexpectedly"
+                if event.startswith("@E"):
+                    return False, start_latency, event[3:]
+                if event.startswith("@S") and start_latency is None:
+                    start_latency = time.monotonic() - requested
+                elif event == "@P 0":
+                    if self._stopped:
+                        return False, start_latency, "stopped"
+                    return start_latency is not None, start_latency, None if start_latency is not None else "no audio stream"
+
+    def stop(self) -> None:
+        self._stopped = True
+        if self._proc is not None and self._proc.poll() is None:
+            try:
+                self._send("STOP")
+            except OSError as e:
+                logger.warning("Could not stop %s: %s", self.binary, e)
+
+    def close(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            try:
+                self._send("QUIT")
+                self._proc.wait(timeout=2)
+            except Exception:
+                self._restart()
+        self._proc = None
+
+
+class PlaybackEngine:
+    """
+    Serial playback queue in front of a sink, with per-job timeouts and latency stats.
+    """
+    def __init__(self, sink, default_timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        self.sink = sink
+        self.default_timeout = default_timeout
+        self.played = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.last_start_latency: Optional[float] = None
+        self._start_latency_total = 0.0
+        self._start_latency_count = 0
+        self.preemptions = 0
+        self._queue: "queue.PriorityQueue[Tuple[int, int, Optional[PlaybackJob]]]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._current: Optional[PlaybackJob] = None
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="playback", daemon=True)
+                self._worker.start()
+
+    def submit(self, path: str, cleanup: bool = False, timeout: Optional[float] = None,
+               priority: int = PRIORITY_HOUR,
+               on_status: Optional[Callable[[PlaybackJob], None]] = None,
+               replayable: bool = True) -> PlaybackJob:
+        """
+        Queue a file for playback and return its job handle.
+        A more urgent job preempts a preemptible one that is currently playing;
+        it is replayed afterwards unless replayable is False (e.g. a live stream).
+        """
+        job = PlaybackJob(path, cleanup, timeout or self.default_timeout, priority, on_status)
+        job.replayable = replayable
+        self._ensure_worker()
+        self._enqueue(job)
+        # The worker sets and clears _current under the same lock, so the stop only
+        # reaches the job that is playing, never one started after this check
+        with self._lock:
+            current = self._current
+            if current is not None and priority < current.priority and current.priority >= PREEMPTIBLE_PRIORITY:
+                logger.info("Job %s (priority %s) preempting job %s (priority %s)",
+                            job.id, priority, current.id, current.priority)
+                current.preempted = True
+                self.sink.stop()
+        return job
+
+    def _enqueue(self, job: PlaybackJob) -> None:
+        self._queue.put((job.priority, next(self._seq), job))
+
+    def play(self, path: str, cleanup: bool = False, timeout: Optional[float] = None,
+             priority: int = PRIORITY_HOUR) -> bool:
+        """
+        Queue a file and block until it has played.
+        """
+        job = self.submit(path, cleanup, timeout, priority)
+        return job.wait()
+
+    def _run(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self._current = job
+            try:
+                self._execute(job)
+            finally:
+                with self._lock:
+                    self._current = None
+
+    def _execute(self, job: PlaybackJob) -> None:
+        job.started_at = time.monotonic()
+        QUEUE_WAIT_SECONDS.observe(job.started_at - job.submitted_at)
+        job.set_status("playing")
+        requeued_now = False
+        try:
+            if not os.path.exists(job.path):
+                job.finish("failed", False, f"Invalid sound path: {job.path}")
+                logger.error(job.error)
+                return
+            logger.info("Playing sound file: %s (job %s)", job.path, job.id)
+            ok, start_latency, error = self.sink.play(job.path, job.timeout)
+            with self._lock:
+                # Playback has ended; a later preemption must not stop the sink for it
+                self._current = None
+            job.start_latency = start_latency
+            DURATION_SECONDS.observe(time.monotonic() - job.started_at)
+            if start_latency is not None:
+                START_LATENCY_SECONDS.observe(start_latency)
+            if job.preempted and not ok:
+                with self._lock:
+                    self.preemptions += 1
+                if job.replayable and not job.requeued:
+                    # Play the interrupted announcement again once the urgent one is done
+                    logger.info("Job %s was preempted – re-queued", job.id)
+                    job.requeued = requeued_now = True
+                    job.preempted = False
+                    job.set_status("queued")
+                    self._enqueue(job)
+                    return
+                job.finish("preempted", False, "preempted")
+                return
+            with self._lock:
+                if start_latency is not None:
+                    self.last_start_latency = start_latency
+                    self._start_latency_total += start_latency
+                    self._start_latency_count += 1
+                if ok:
+                    self.played += 1
+                else:
+                    self.failures += 1
+                    if error == "timeout":
+                        self.timeouts += 1
+            if ok:
+                latency_ms = start_latency * 1000 if start_latency is not None else 0
+                logger.info("Sound played successfully (start latency %.0f ms)", latency_ms)
+                job.finish("done", True)
+            else:
+                logger.error("Error playing sound: %s", error)
+                job.finish("timeout" if error == "timeout" else "failed", False, error)
+        except Exception as e:
+            logger.error("Error playing sound: %s", e, exc_info=True)
+            with self._lock:
+                self.failures += 1
+            job.finish("failed", False, str(e))
+        finally:
+            if job.cleanup and not requeued_now:
+                try:
+                    os.remove(job.path)
+                    logger.debug("Cleaned up sound file: %s", job.path)
+                except Exception as e:
+                    logger.warning("Failed to clean up file %s: %s", job.path, e)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return playback counters and start latency figures.
+        """
+        with self._lock:
+            avg = self._start_latency_total / self._start_latency_count if self._start_latency_count else None
+            return {
+                "sink": self.sink.name,
+                "played": self.played,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "preemptions": self.preemptions,
+                "queued": self._queue.qsize(),
+                "last_start_latency": self.last_start_latency,
+                "avg_start_latency": avg
+            }
+
+    def close(self, timeout: float = CLOSE_TIMEOUT_SECONDS) -> None:
+        """
+        Let the queued jobs play for up to timeout seconds, then shut down the
+        sink. Jobs still queued after that are failed rather than played.
+        """
+        # Sorts after every real job so queued announcements still play first
+        self._queue.put((float("inf"), next(self._seq), None))
+        with self._lock:
+            worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout)
+            if worker.is_alive():
+                self._abandon_queued()
+        self.sink.close()
+
+    def _abandon_queued(self) -> None:
+        abandoned = 0
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.finish("failed", False, "playback shut down")
+                abandoned += 1
+                if job.cleanup:
+                    try:
+                        os.remove(job.path)
+                    except OSError:
+                        pass
+        # Keep the sentinel so the worker exits after the job it is playing
+        self._queue.put((float("inf"), next(self._seq), None))
+        if abandoned:
+            logger.warning("Playback shut down with %s queued job(s) unplayed", abandoned)
+
+
+def create_sink(name: str):
+    """
+    Build a sink by name: 'mpg123' (default) or 'fake'.
+    """
+    if name == "fake":
+        return FakeSink()
+    return Mpg123Sink()
+
+
+def get_engine(sink_name: str = "mpg123", default_timeout: float = DEFAULT_TIMEOUT_SECONDS) -> PlaybackEngine:
+    """
+    Return the process-wide playback engine for a sink, creating it on first use.
+    """
+    with _engines_lock:
+        engine = _engines.get(sink_name)
+        if engine is None:
+            engine = PlaybackEngine(create_sink(sink_name), default_timeout)
+            _engines[sink_name] = engine
+        engine.default_timeout = default_timeout
+        return engine
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+prerender.py
+
+Background pre-rendering of upcoming announcements. The pre-renderer walks the
+next few entries of the active schedule, predicts the wristband color rotation
+for each slot and synthesizes the audio ahead of time into the audio cache.
+When the verified colors are fetched shortly before the slot the rendered text
+matches the prediction and the audio is already on disk; if the colors differ
+the announcer simply renders the new text on a cache miss. Colors are predicted
+for the moment they are verified (the color lead before the slot), since that
+is the order the announcement is rendered with.
+"""
+
+import datetime
+import itertools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("prerender")
+
+# The color rotation advances every 30 minutes from the shift start
+ROTATION_INTERVAL_MINUTES = 30
+DEFAULT_PRERENDER_COUNT = 3
+# Colors for a slot are verified this long before it and rendered as of that moment
+DEFAULT_COLOR_LEAD = datetime.timedelta(seconds=60)
+# Re-fetch colors for prediction when the last observation is older than this
+OBSERVATION_MAX_AGE = datetime.timedelta(minutes=30)
+
+
+def rotation_intervals_between(start: datetime.datetime, end: datetime.datetime) -> int:
+    """
+    Count the rotation boundaries crossed between two timestamps.
+    Boundaries are assumed to fall on the hour and half hour.
+    """
+    def interval_index(ts: datetime.datetime) -> int:
+        return int(ts.timestamp() // (ROTATION_INTERVAL_MINUTES * 60))
+    return interval_index(end) - interval_index(start)
+
+
+def predict_colors(color_data: Dict[str, Dict[str, str]], observed_at: datetime.datetime,
+                   target: datetime.datetime) -> Dict[str, Dict[str, str]]:
+    """
+    Predict the color order at target from an order observed at observed_at.
+    Each interval moves every color one position towards color1.
+    """
+    if not color_data:
+        return {}
+    ordered = [color_data[k] for k in sorted(color_data, key=lambda k: int(k[len('color'):]))]
+    shift = rotation_intervals_between(observed_at, target) % len(ordered)
+    rotated = ordered[shift:] + ordered[:shift]
+    return {
+        f'color{position}': {'color': entry.get('color', 'unknown'), 'time': f'Interval {position}'}
+        for position, entry in enumerate(rotated, start=1)
+    }
+
+
+def upcoming_announcements(times: Dict[str, str], current_time: datetime.datetime,
+                           count: int) -> List[Tuple[datetime.datetime, str]]:
+    """
+    Return the next count (announcement_time, announcement_type) entries in order.
+    """
+    upcoming = []
+    for time_str, announcement_type in times.items():
+        try:
+            hour, minute = map(int, time_str.split(':'))
+        except ValueError:
+            continue
+        announcement_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if announcement_time <= current_time:
+            announcement_time += datetime.timedelta(days=1)
+        upcoming.append((announcement_time, announcement_type))
+    upcoming.sort(key=lambda x: x[0])
+    return upcoming[:count]
+
+
+class PreRenderer:
+    """
+    Background thread that keeps the audio for the next few announcements warm.
+    """
+    def __init__(self, fetch_colors: Callable[[object], Optional[Dict[str, Dict[str, str]]]],
+                 prepare: Callable[[object, str, datetime.datetime, Dict[str, Dict[str, str]]], Optional[str]],
+                 count: int = DEFAULT_PRERENDER_COUNT,
+                 shutdown_event: Optional[threading.Event] = None,
+                 predict: Optional[Callable[[datetime.datetime], Optional[Dict[str, Dict[str, str]]]]] = None,
+                 color_lead: datetime.timedelta = DEFAULT_COLOR_LEAD,
+                 resolve_config: Optional[Callable[[object, str], object]] = None):
+        self.fetch_colors = fetch_colors
+        self.prepare = prepare
+        self.predict = predict
+        self.resolve_config = resolve_config
+        self.color_lead = color_lead
+        self.count = count
+        self.shutdown_event = shutdown_event or threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._config = None
+        self._schedule = None
+        self._colors: Optional[Dict[str, Dict[str, str]]] = None
+        self._observed_at: Optional[datetime.datetime] = None
+        self._rendered: Dict[Tuple[datetime.datetime, str], str] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="prerender", daemon=True)
+        self._thread.start()
+        logger.info("Pre-renderer started for the next %s announcements", self.count)
+
+    def update_config(self, config, schedule=None) -> None:
+        """
+        Switch to a newly loaded configuration and re-render its upcoming slots.
+        With a compiled weekly schedule, slots after the day rollover are taken
+        from their own day's configuration.
+        """
+        with self._lock:
+            self._config = config
+            self._schedule = schedule
+            self._rendered.clear()
+        self._wake.set()
+
+    def observe_colors(self, color_data: Optional[Dict[str, Dict[str, str]]],
+                       observed_at: Optional[datetime.datetime] = None) -> None:
+        """
+        Record a verified color order to base future predictions on.
+        """
+        if not color_data:
+            return
+        with self._lock:
+            self._colors = color_data
+            self._observed_at = observed_at or datetime.datetime.now()
+        self._wake.set()
+
+    def predicted_text_matches(self, slot: Tuple[datetime.datetime, str], path: Optional[str]) -> bool:
+        """
+        Return True if the audio prepared for slot is the one that was pre-rendered.
+        """
+        with self._lock:
+            return path is not None and self._rendered.get(slot) == path
+
+    def _observation(self, config) -> Tuple[Optional[Dict[str, Dict[str, str]]], Optional[datetime.datetime]]:
+        with self._lock:
+            colors, observed_at = self._colors, self._observed_at
+        if colors is None or datetime.datetime.now() - observed_at > OBSERVATION_MAX_AGE:
+            try:
+                fresh = self.fetch_colors(config)
+            except Exception as e:
+                logger.warning("Pre-renderer could not fetch colors: %s", e)
+                fresh = None
+            if fresh:
+                self.observe_colors(fresh)
+                self._wake.clear()
+                with self._lock:
+                    colors, observed_at = self._colors, self._observed_at
+        return colors, observed_at
+
+    def render_upcoming(self) -> int:
+        """
+        Pre-render the next announcements. Returns the number newly rendered.
+        """
+        with self._lock:
+            config, schedule = self._config, self._schedule
+        if config is None:
+            return 0
+        colors = observed_at = None
+        now = datetime.datetime.now()
+        rendered = 0
+        if schedule is not None:
+            slots = [(event.when, event.announcement_type, event.config_path)
+                     for event in itertools.islice(schedule.iter_from(now + datetime.timedelta(seconds=1)), self.count)]
+        else:
+            slots = [(slot_time, announcement_type, None)
+                     for slot_time, announcement_type in upcoming_announcements(config.times, now, self.count)]
+        for slot_time, announcement_type, config_path in slots:
+            if self.shutdown_event.is_set():
+                break
+            slot = (slot_time, announcement_type)
+            slot_config = config
+            if config_path is not None and self.resolve_config is not None:
+                slot_config = self.resolve_config(config, config_path)
+            color_time = slot_time - self.color_lead
+            predicted = self.predict(color_time) if self.predict else None
+            if predicted is None:
+                if colors is None:
+                    colors, observed_at = self._observation(config)
+                predicted = predict_colors(colors, observed_at, color_time) if colors else {}
+            path = self.prepare(slot_config, announcement_type, slot_time, predicted)
+            with self._lock:
+                if self._config is not config:
+                    break
+                if path and self._rendered.get(slot) != path:
+                    rendered += 1
+                if path:
+                    self._rendered[slot] = path
+                for stale in [s for s in self._rendered if s[0] <= now]:
+                    del self._rendered[stale]
+        if rendered:
+            logger.info("Pre-rendered %s upcoming announcements", rendered)
+        return rendered
+
+    def _run(self) -> None:
+        while not self.shutdown_event.is_set():
+            try:
+                self.render_upcoming()
+            except Exception as e:
+                logger.error("Pre-render pass failed: %s", e, exc_info=True)
+            # Wake on new colors or config; otherwise re-check each rotation interval
+            self._wake.wait(timeout=ROTATION_INTERVAL_MINUTES * 60 / 2)
+            self._wake.clear()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+schedule_engine.py
+
+Compiled weekly announcement schedule. Instead of re-parsing every HH:MM key
+and scanning them linearly on each loop iteration, the [times] sections of all
+day INI files are compiled once per configuration load into a single sorted
+weekly timeline. The next event is found with a binary search (O(log n)),
+which comfortably handles thousands of entries.
+
+Each day file covers one operating day, which runs from DAY_BOUNDARY (the
+1:00 AM reload) to DAY_BOUNDARY the following day: a "00:30" entry in fri.ini
+is Saturday 00:30. Slots missed while the announcer was down are caught up if
+they are no older than the catch-up window; older ones are skipped.
+"""
+
+import bisect
+import datetime
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config_store
+
+logger = logging.getLogger("schedule_engine")
+
+# Day-specific configuration files by weekday (Monday = 0)
+DAY_CONFIG_FILES = {
+    0: "mon.ini",
+    1: "tue.ini",
+    2: "wed.ini",
+    3: "thurs.ini",
+    4: "fri.ini",
+    5: "sat.ini",
+    6: "sun.ini"
+}
+DEFAULT_CONFIG_FILE = "config.ini"
+# Operating days start at the daily configuration reload
+DAY_BOUNDARY = datetime.time(1, 0)
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Missed slots up to this old are still announced after a restart
+DEFAULT_CATCH_UP_SECONDS = 120
+STATE_FILE = "announcer_state.json"
+
+
+class ScheduledEvent:
+    """
+    One occurrence of a scheduled announcement.
+    """
+    def __init__(self, when: datetime.datetime, announcement_type: str, config_path: str):
+        self.when = when
+        self.announcement_type = announcement_type
+        self.config_path = config_path
+
+    @property
+    def time_str(self) -> str:
+        return self.when.strftime("%H:%M")
+
+    def __repr__(self) -> str:
+        return f"ScheduledEvent({self.when:%a %H:%M}, {self.announcement_type!r}, {self.config_path!r})"
+
+
+def parse_hhmm(time_str: str) -> Optional[int]:
+    """
+    Return the minute of the day for an HH:MM time, or None if it is not a valid time.
+    """
+    try:
+        hour, minute = map(int, time_str.split(':'))
+    except ValueError:
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour * 60 + minute
+
+
+def operating_weekday(now: datetime.datetime) -> int:
+    """
+    Return the weekday whose configuration is in effect at now.
+    Before DAY_BOUNDARY this is still the previous day.
+    """
+    if now.time() < DAY_BOUNDARY:
+        return (now.weekday() - 1) % 7
+    return now.weekday()
+
+
+def day_config_path(weekday: int, directory: str = ".") -> Optional[str]:
+    """
+    Return the file that configures a weekday, falling back to config.ini.
+    """
+    for name in (DAY_CONFIG_FILES.get(weekday), DEFAULT_CONFIG_FILE):
+        if name:
+            path = os.path.join(directory, name) if directory != "." else name
+            if config_store.file_identity(path) is not None:
+                return path
+    return None
+
+
+class CompiledSchedule:
+    """
+    Sorted weekly timeline of (minute of week, announcement type, config path).
+    """
+    def __init__(self, entries: List[Tuple[int, str, str]],
+                 catch_up_seconds: float = DEFAULT_CATCH_UP_SECONDS):
+        self.entries = sorted(entries)
+        self.offsets = [entry[0] for entry in self.entries]
+        self.catch_up = datetime.timedelta(seconds=catch_up_seconds)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _week_start(ts: datetime.datetime) -> datetime.datetime:
+        return datetime.datetime.combine(ts.date() - datetime.timedelta(days=ts.weekday()), datetime.time())
+
+    def iter_from(self, start: datetime.datetime) -> Iterator[ScheduledEvent]:
+        """
+        Yield events at or after start in chronological order, indefinitely.
+        """
+        if not self.entries:
+            return
+        week_start = self._week_start(start)
+        minute_of_week = int((start - week_start).total_seconds() // 60)
+        index = bisect.bisect_left(self.offsets, minute_of_week)
+        while True:
+            if index >= len(self.entries):
+                index = 0
+                week_start += datetime.timedelta(days=7)
+            offset, announcement_type, config_path = self.entries[index]
+            when = week_start + datetime.timedelta(minutes=offset)
+            if when >= start:
+                yield ScheduledEvent(when, announcement_type, config_path)
+            index += 1
+
+    def next_event(self, now: datetime.datetime,
+                   after: Optional[datetime.datetime] = None) -> Optional[ScheduledEvent]:
+        """
+        Return the next event to announce. Events up to the catch-up window in
+        the past are returned (late) unless they are at or before after, the
+        last slot already handled.
+        """
+        start = now - self.catch_up
+        if after is not None and after >= start:
+            start = after + datetime.timedelta(seconds=1)
+        for event in self.iter_from(start):
+            return event
+        return None
+
+    def upcoming(self, now: datetime.datetime, until: datetime.datetime) -> List[ScheduledEvent]:
+        """
+        Return every event in [now, until).
+        """
+        events = []
+        for event in self.iter_from(now):
+            if event.when >= until:
+                break
+            events.append(event)
+        return events
+
+
+def compile_week(active_path: Optional[str] = None, active_times: Optional[Dict[str, str]] = None,
+                 now: Optional[datetime.datetime] = None, directory: str = ".",
+                 catch_up_seconds: float = DEFAULT_CATCH_UP_SECONDS) -> CompiledSchedule:
+    """
+    Compile the [times] of every day file into a weekly timeline.
+    The operating day containing now uses active_path/active_times (the loaded
+    configuration, which may have been switched from the web interface).
+    """
+    active_weekday = operating_weekday(now or datetime.datetime.now())
+    boundary = DAY_BOUNDARY.hour * 60 + DAY_BOUNDARY.minute
+    entries: List[Tuple[int, str, str]] = []
+    for weekday in range(7):
+        if weekday == active_weekday and active_path is not None and active_times is not None:
+            path, times = active_path, active_times
+        else:
+            path = day_config_path(weekday, directory)
+            if path is None:
+                continue
+            snapshot = config_store.load(path)
+            times = dict(snapshot.section('times')) if snapshot else {}
+        for time_str, announcement_type in times.items():
+            minute = parse_hhmm(time_str)
+            if minute is None:
+                logger.warning("Invalid time format in %s: %s", path, time_str)
+                continue
+            # Entries before the day boundary belong to the early hours of the next calendar day
+            day = weekday + 1 if minute < boundary else weekday
+            entries.append(((day * MINUTES_PER_DAY + minute) % MINUTES_PER_WEEK, announcement_type, path))
+    schedule = CompiledSchedule(entries, catch_up_seconds)
+    logger.info("Compiled weekly schedule: %s announcements", len(schedule))
+    return schedule
+
+
+def load_last_announced(path: str = STATE_FILE) -> Optional[datetime.datetime]:
+    """
+    Return the last slot that was announced before a restart, if recorded.
+    """
+    try:
+        with open(path) as f:
+            return datetime.datetime.fromisoformat(json.load(f)["last_announced"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable announcer state %s: %s", path, e)
+        return None
+
+
+def save_last_announced(when: datetime.datetime, path: str = STATE_FILE) -> None:
+    """
+    Record the last announced slot so a restart does not repeat it.
+    """
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump({"last_announced": when.isoformat()}, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("Could not record announcer state: %s", e)
@@ -7,23 +7,41 @@ and other system settings. This version includes concurrency protections
 (using file locking and a global RLock), retry logic, and enhanced error handling.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, Response
 import threading
 import os
 import logging
-import subprocess
 import json
-import tempfile
-import asyncio
 import datetime
-from typing import Dict, Any
+import time
+import bisect
+import collections
+import functools
+import hashlib
+import io
+from typing import Dict, Any, Callable, List, Optional, Tuple
 import announcer
+import announce_queue
+import announcement_templates
+import color_rotation
+import config_store
+import control
+import log_setup
+import metrics
+import playback
+import prerender
+import schedule_engine
+import state_events
+import status_board
+import timing
 
 # Import file locking and global lock from announcer
 from announcer import locked_file, global_lock, get_day_config_filename
 
 import fcntl
 
+logger = logging.getLogger("settings")
+
 # Initialize Flask application
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this in production
@@ -31,6 +49,34 @@ app.secret_key = 'your_secret_key_here'  # Change this in production
 # Global variable for the announcer thread (if needed)
 announcement_thread = None
 
+# Files that can be viewed and edited in the INI editor
+EDITABLE_INI_FILES = ("thurs.ini", "fri.ini", "sat.ini", "sun.ini", "config.ini")
+
+REQUEST_SECONDS = metrics.histogram("settings_http_request_duration_seconds",
+                                    "Web interface requests by route, method and status",
+                                    ["route", "method", "status"])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        # The route pattern, not the path, keeps label values bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=str(response.status_code))
+    return response
+
+@app.after_request
+def push_state_changes(response):
+    # Writes from this tab reach every open tab straight away rather than at the next tick
+    if request.method == 'POST' and response.status_code < 400:
+        panel_events.notify()
+    return response
+
 class ConfigHandler:
     """
     Handles reading, writing, and managing configuration data.
@@ -58,64 +104,69 @@ class ConfigHandler:
 
     def read_config(self) -> Dict[str, Any]:
         """
-        Read and parse the configuration file.
+        Read the configuration file through the shared parsed-config cache.
         """
         try:
-            current_section = None
-            if os.path.exists(self.config_file):
-                with locked_file(self.config_file, 'r', fcntl.LOCK_SH) as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line or line.startswith('#'):
-                            continue
-                        if line.startswith('[') and line.endswith(']'):
-                            current_section = line[1:-1].lower()
-                            continue
-                        if '=' in line:
-                            key, value = [x.strip() for x in line.split('=', 1)]
-                            if current_section == 'times':
-                                self.config['times'][key] = value
-                            elif current_section == 'announcements':
-                                clean_value = value.strip('"\'')
-                                if key.startswith('custom_') or key in ['fiftyfive', 'hour', 'rules', 'ad']:
-                                    self.config['announcements'][key] = clean_value
-                            elif current_section in self.config:
-                                if key.lower() in self.config[current_section]:
-                                    clean_value = value.strip('"\'')
-                                    self.config[current_section][key.lower()] = clean_value
+            snapshot = config_store.load(self.config_file)
+            if snapshot is None:
+                return self.config
+            for section, values in snapshot.sections.items():
+                if section == 'times':
+                    self.config['times'].update(values)
+                elif section == 'announcements':
+                    for key, value in values.items():
+                        if key.startswith('custom_') or key in ['fiftyfive', 'hour', 'rules', 'ad']:
+                            self.config['announcements'][key] = value
+                elif section == 'database':
+                    for key, value in values.items():
+                        if key in self.config['database']:
+                            self.config['database'][key] = value
+                else:
+                    # [tts] and any other sections are kept whole so writes preserve them
+                    self.config.setdefault(section, {}).update(values)
             return self.config
         except Exception as e:
-            logging.error(f"Error reading config: {e}", exc_info=True)
+            logger.error("Error reading config: %s", e, exc_info=True)
             return self.config
 
     def write_config(self) -> None:
         """
         Write the current configuration back to the file.
         """
+        f = io.StringIO()
+        f.write("[database]\n")
+        for key, value in self.config['database'].items():
+            f.write(f"{key} = {value}\n")
+        f.write("\n")
+        f.write("[times]\n")
+        for time_key, value in sorted(self.config['times'].items()):
+            f.write(f"{time_key} = {value}\n")
+        f.write("\n")
+        f.write("[announcements]\n")
+        standard_types = ['fiftyfive', 'hour', 'rules', 'ad']
+        for key in standard_types:
+            if key in self.config['announcements']:
+                f.write(f"{key} = {self.config['announcements'][key]}\n")
+        for key, value in self.config['announcements'].items():
+            if key.startswith('custom_'):
+                escaped_value = value.replace('\n', '\\n').replace('"', '\\"')
+                f.write(f"{key} = \"{escaped_value}\"\n")
+        f.write("\n")
+        f.write("[tts]\n")
+        f.write(f"voice_id = {self.config['tts']['voice_id']}\n")
+        for key, value in self.config['tts'].items():
+            if key != 'voice_id':
+                f.write(f"{key} = {value}\n")
+        for section, values in self.config.items():
+            if section in ('database', 'times', 'announcements', 'tts'):
+                continue
+            f.write(f"\n[{section}]\n")
+            for key, value in values.items():
+                f.write(f"{key} = {value}\n")
         try:
-            with locked_file(self.config_file, 'w', fcntl.LOCK_EX) as f:
-                f.write("[database]\n")
-                for key, value in self.config['database'].items():
-                    f.write(f"{key} = {value}\n")
-                f.write("\n")
-                f.write("[times]\n")
-                for time_key, value in sorted(self.config['times'].items()):
-                    f.write(f"{time_key} = {value}\n")
-                f.write("\n")
-                f.write("[announcements]\n")
-                standard_types = ['fiftyfive', 'hour', 'rules', 'ad']
-                for key in standard_types:
-                    if key in self.config['announcements']:
-                        f.write(f"{key} = {self.config['announcements'][key]}\n")
-                for key, value in self.config['announcements'].items():
-                    if key.startswith('custom_'):
-                        escaped_value = value.replace('\n', '\\n').replace('"', '\\"')
-                        f.write(f"{key} = \"{escaped_value}\"\n")
-                f.write("\n")
-                f.write("[tts]\n")
-                f.write(f"voice_id = {self.config['tts']['voice_id']}\n")
+            config_store.write_atomic(self.config_file, f.getvalue())
         except Exception as e:
-            logging.error(f"Error writing config: {e}", exc_info=True)
+            logger.error("Error writing config: %s", e, exc_info=True)
             raise
 
 def list_available_configs():
@@ -125,11 +176,11 @@ def list_available_configs():
     config_files = ["wed.ini", "thurs.ini", "fri.ini", "sat.ini", "sun.ini", "config.ini"]
     available_configs = {}
     for config_file in config_files:
-        exists = os.path.exists(config_file)
+        identity = config_store.file_identity(config_file)
         available_configs[config_file] = {
-            "exists": exists,
-            "size": os.path.getsize(config_file) if exists else 0,
-            "modified": os.path.getmtime(config_file) if exists else 0
+            "exists": identity is not None,
+            "size": identity[1] if identity else 0,
+            "modified": identity[0] / 1e9 if identity else 0
         }
     current_day = datetime.datetime.now().weekday()
     day_names = {0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday", 4: "Friday", 5: "Saturday", 6: "Sunday"}
@@ -144,45 +195,381 @@ def list_available_configs():
         }
     }
 
-def restart_services() -> bool:
+def config_files_key() -> Tuple:
     """
-    Restart the announcer service by signaling a configuration reload.
-    Uses file locking when writing the reload_config file.
+    Identify the current contents of every day configuration file, plus the
+    active file and weekday. Any edit, copy or day change gives a new key.
     """
+    config_files = sorted(set(schedule_engine.DAY_CONFIG_FILES.values()) | {schedule_engine.DEFAULT_CONFIG_FILE})
+    return (get_day_config_filename(), datetime.datetime.now().weekday(),
+            tuple(config_store.file_identity(name) for name in config_files))
+
+# Live status record published by the announcer (status_board.py)
+announcer_status = status_board.StatusReader()
+
+# (config_files_key(), compiled weekly schedule) of the last compilation
+_compiled_week: Optional[Tuple[Tuple, schedule_engine.CompiledSchedule]] = None
+_compiled_week_lock = threading.Lock()
+
+def compiled_week() -> schedule_engine.CompiledSchedule:
+    """
+    The weekly schedule of all day files, as the announcer compiles it.
+    Recompiled only when one of the files (or the day) changes.
+    """
+    global _compiled_week
+    key = config_files_key()
+    with _compiled_week_lock:
+        if _compiled_week is None or _compiled_week[0] != key:
+            current_config = key[0]
+            times = ConfigHandler(current_config).read_config()['times']
+            _compiled_week = (key, schedule_engine.compile_week(current_config, times))
+        return _compiled_week[1]
+
+# Parts of the panel state rebuilt only when the files they come from change
+_panel_cache: Dict[str, Any] = {}
+
+def build_panel_state() -> Dict[str, Any]:
+    """
+    Assemble the control panel state pushed over /events. The INI files are
+    only re-read when one of them changed; otherwise this is a few stat calls.
+    """
+    now = datetime.datetime.now()
+    current_config = get_day_config_filename()
+    config_key = config_files_key()
+    if _panel_cache.get('config_key') != config_key:
+        config = ConfigHandler(current_config).read_config()
+        announcements = config['announcements']
+        _panel_cache['schedule'] = {
+            'config_file': current_config,
+            'times': dict(config['times']),
+            'announcements': {key: announcements.get(key, '') for key in ('fiftyfive', 'hour', 'rules', 'ad')},
+            'custom_types': {k.replace('custom_', ''): v for k, v in announcements.items() if k.startswith('custom_')}
+        }
+        _panel_cache['day_configs'] = list_available_configs()
+        _panel_cache['config_key'] = config_key
+    state_key = config_store.file_identity(schedule_engine.STATE_FILE)
+    if 'state_key' not in _panel_cache or _panel_cache['state_key'] != state_key:
+        _panel_cache['last_announced'] = schedule_engine.load_last_announced()
+        _panel_cache['state_key'] = state_key
+    last_announced = _panel_cache['last_announced']
+
+    next_event = compiled_week().next_event(now, after=last_announced)
+    # None marks a removed key in the merge patches, so unset fields are left out
+    announcer_record = {key: value for key, value in (announcer_status.read_record() or {}).items()
+                        if value is not None and key != 'updated'}
+    return {
+        'schedule': _panel_cache['schedule'],
+        'day_configs': _panel_cache['day_configs'],
+        'now_playing': {job['id']: {'text': job.get('text', ''), 'status': job.get('status', ''),
+                                    'kind': job.get('kind', 'instant')}
+                        for job in announce_queue.active_jobs()},
+        'next_announcement': {
+            'time': next_event.when.isoformat(timespec='minutes'),
+            'type': next_event.announcement_type,
+            'config_file': next_event.config_path
+        } if next_event else {},
+        'last_announced': last_announced.isoformat(timespec='minutes') if last_announced else '',
+        'announcer': announcer_record
+    }
+
+panel_events = state_events.StateBroadcaster(build_panel_state)
+
+# /upcoming serves windows of up to a week from a timeline precomputed a day further
+UPCOMING_MAX_HOURS = 7 * 24
+UPCOMING_HORIZON = datetime.timedelta(hours=UPCOMING_MAX_HOURS + 24)
+UNKNOWN_COLORS = {f'color{i}': {'color': 'unknown'} for i in range(1, 5)}
+_upcoming_timeline: Optional[Dict[str, Any]] = None
+_upcoming_lock = threading.Lock()
+
+def _render_slot(config: Optional[announcer.Config], event: schedule_engine.ScheduledEvent,
+                 colors: Dict[str, Dict[str, str]],
+                 rotation: Optional[color_rotation.ColorRotation]) -> Optional[str]:
+    if config is None:
+        return None
+    template = announcer.get_announcement_template(config, event.announcement_type)
+    # Same instant as the colors, as the announcer renders it
+    color_time = event.when - prerender.DEFAULT_COLOR_LEAD
+    minutes_remaining = rotation.minutes_until_rotation(color_time) if rotation else None
     try:
-        current_config = get_day_config_filename()
+        return announcement_templates.compile_template(template).render(
+            announcer.build_format_vars(event.time_str, colors or UNKNOWN_COLORS, minutes_remaining))
+    except (KeyError, IndexError, ValueError):
+        return None
+
+def upcoming_timeline() -> Dict[str, Any]:
+    """
+    Every scheduled slot from now until UPCOMING_HORIZON, with its rendered
+    text and predicted colors. Rebuilt only when a day file or the color
+    rotation inputs published by the announcer change, or the horizon runs short.
+    """
+    global _upcoming_timeline
+    now = datetime.datetime.now()
+    rotation_inputs = (announcer_status.read_record() or {}).get('rotation')
+    key = (config_files_key(), json.dumps(rotation_inputs, sort_keys=True))
+    with _upcoming_lock:
+        timeline = _upcoming_timeline
+        if (timeline is not None and timeline['key'] == key
+                and now + datetime.timedelta(hours=UPCOMING_MAX_HOURS) <= timeline['until']):
+            return timeline
+        rotation = color_rotation.ColorRotation.from_dict(rotation_inputs) if rotation_inputs else None
+        configs: Dict[str, Optional[announcer.Config]] = {}
+        times, slots = [], []
+        for event in compiled_week().upcoming(now, now + UPCOMING_HORIZON):
+            if event.config_path not in configs:
+                snapshot = config_store.load(event.config_path)
+                configs[event.config_path] = announcer.config_from_snapshot(snapshot) if snapshot else None
+            # Colors are fetched (and predicted) shortly before each slot, so a slot on a
+            # rotation boundary announces the order that is ending
+            colors = rotation.colors_at(event.when - prerender.DEFAULT_COLOR_LEAD) if rotation else {}
+            times.append(event.when)
+            slots.append({
+                'time': event.when.isoformat(timespec='minutes'),
+                'type': event.announcement_type,
+                'config_file': event.config_path,
+                'text': _render_slot(configs[event.config_path], event, colors, rotation),
+                'colors': {name: value['color'] for name, value in colors.items()}
+            })
+        _upcoming_timeline = {
+            'key': key,
+            'version': hashlib.sha1(repr((key, now)).encode()).hexdigest()[:12],
+            'until': now + UPCOMING_HORIZON,
+            'times': times,
+            'slots': slots,
+            'colors_predicted': rotation is not None
+        }
+        return _upcoming_timeline
+
+def _upcoming_hours() -> Optional[float]:
+    try:
+        hours = float(request.args.get('hours', 1))
+    except ValueError:
+        return None
+    return hours if 0 < hours <= UPCOMING_MAX_HOURS else None
+
+def _upcoming_window() -> Tuple[Dict[str, Any], int, int]:
+    timeline = upcoming_timeline()
+    now = datetime.datetime.now()
+    # Slots are minute-aligned; the one starting this minute is still upcoming
+    start = bisect.bisect_left(timeline['times'], now.replace(second=0, microsecond=0))
+    end = bisect.bisect_left(timeline['times'], now + datetime.timedelta(hours=_upcoming_hours()))
+    return timeline, start, end
+
+def upcoming_version() -> Optional[Tuple]:
+    if _upcoming_hours() is None:
+        return None
+    timeline, start, end = _upcoming_window()
+    return (timeline['version'], start, end)
+
+# Serialized bodies of the read-only JSON endpoints, most recently used last
+JSON_CACHE_SIZE = 32
+_json_cache: "collections.OrderedDict[Tuple[str, str], bytes]" = collections.OrderedDict()
+_json_cache_lock = threading.Lock()
+
+def versioned_json(version: Callable[[], Optional[Tuple]]):
+    """
+    Serve a read-only JSON endpoint with an ETag derived from version(), which
+    identifies the files the response is built from. A request whose
+    If-None-Match matches gets 304 without the view running, and the body is
+    serialized once per version. If version() returns None the view runs
+    normally; error responses are never cached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            tag = version()
+            if tag is None:
+                return view(*args, **kwargs)
+            etag = hashlib.sha1(repr((request.endpoint, tag)).encode()).hexdigest()[:24]
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                key = (request.endpoint, etag)
+                with _json_cache_lock:
+                    body = _json_cache.get(key)
+                    if body is not None:
+                        _json_cache.move_to_end(key)
+                if body is None:
+                    result = view(*args, **kwargs)
+                    if isinstance(result, tuple) or result.status_code != 200:
+                        return result
+                    body = result.get_data()
+                    with _json_cache_lock:
+                        _json_cache[key] = body
+                        while len(_json_cache) > JSON_CACHE_SIZE:
+                            _json_cache.popitem(last=False)
+                response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            # Browsers keep the body but revalidate on every request
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def current_config_version() -> Optional[Tuple]:
+    current_config = get_day_config_filename()
+    identity = config_store.file_identity(current_config)
+    return (current_config, identity) if identity is not None else None
+
+def ini_file_version() -> Optional[Tuple]:
+    # Invalid or missing files go through the view, which rejects or creates them
+    file_name = request.args.get('file')
+    if file_name not in EDITABLE_INI_FILES:
+        return None
+    identity = config_store.file_identity(file_name)
+    return (file_name, identity) if identity is not None else None
+
+def signal_reload() -> bool:
+    """
+    Ask the announcer to reload the current day's configuration now over its
+    control socket. If it is not listening, leave the reload_config marker,
+    which it picks up as soon as it runs.
+
+    Saved edits need no signal: the announcer's configuration watcher sees the
+    file change and reloads once a burst of edits has settled. This is for an
+    explicit refresh, which skips that delay.
+    """
+    try:
+        reply = control.send("reload", immediate=True)
+        if reply is not None and reply.get("ok"):
+            logger.info("Announcer configuration reloaded over the control socket")
+            return True
         with locked_file("reload_config", "w", fcntl.LOCK_EX) as f:
-            f.write(current_config)
-        try:
-            subprocess.run(['sudo', 'systemctl', 'restart', 'announcer.service'], check=True)
-            logging.info("Announcer service restarted successfully")
-        except subprocess.CalledProcessError as e:
-            logging.warning(f"Could not restart announcer service: {e}")
-            logging.info("Continuing without service restart – reload_config will trigger a reload")
+            f.write(get_day_config_filename())
+        logger.info("Signaled announcer configuration reload with reload_config")
         return True
     except Exception as e:
-        logging.error(f"Error preparing configuration reload: {e}", exc_info=True)
+        logger.error("Error requesting configuration reload: %s", e, exc_info=True)
         return False
 
+# Template keys that can be set with the set_template edit
+STANDARD_TEMPLATES = ('fiftyfive', 'hour', 'rules', 'ad')
+# Announcement types that can be scheduled besides custom:<name>
+STANDARD_TYPES = (':55', 'hour', 'rules', 'ad')
+
+def _edit_text(edit: Dict[str, Any], key: str) -> str:
+    """
+    A string field of an edit ('' if absent). Edits come from JSON, so
+    anything else is rejected; line breaks would corrupt the INI file.
+    """
+    value = edit.get(key)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{key} must be a string')
+    if key != 'template' and ('\n' in value or '\r' in value):
+        raise ValueError(f'{key} must be a single line')
+    return value.strip()
+
+def _edit_time(edit: Dict[str, Any]) -> str:
+    """
+    The edit's time as a zero-padded HH:MM key.
+    """
+    time_val = _edit_text(edit, 'time')
+    if not time_val:
+        raise ValueError('Missing time')
+    minute = schedule_engine.parse_hhmm(time_val)
+    if minute is None:
+        raise ValueError(f'Invalid time {time_val!r}; expected HH:MM')
+    return f'{minute // 60:02d}:{minute % 60:02d}'
+
+def _clean_type_name(name: str) -> str:
+    return ''.join(c.lower() if c.isalnum() or c.isspace() else '_' for c in name).replace(' ', '_')
+
+def _apply_edit(config: Dict[str, Any], edit: Dict[str, Any]) -> None:
+    """
+    Apply one schedule or template edit to a configuration read by ConfigHandler.
+    Raises ValueError for an invalid edit and LookupError if its target is missing.
+    """
+    if not isinstance(edit, dict):
+        raise ValueError('Edit must be an object')
+    op = edit.get('op')
+    announcements = config['announcements']
+    if op == 'add_time':
+        type_val = _edit_text(edit, 'type')
+        if not type_val:
+            raise ValueError('Missing time or type')
+        time_val = _edit_time(edit)
+        if type_val.startswith('custom:'):
+            custom_name = type_val.replace('custom:', '')
+            if f'custom_{custom_name}' not in announcements:
+                raise ValueError(f'Custom template {custom_name} not found')
+        elif type_val not in STANDARD_TYPES:
+            raise ValueError(f"Unknown announcement type {type_val!r}")
+        config['times'][time_val] = type_val
+    elif op == 'delete_time':
+        time_val = _edit_text(edit, 'time')
+        if not time_val:
+            raise ValueError('Missing time')
+        if time_val not in config['times']:
+            time_val = _edit_time(edit)
+        if time_val not in config['times']:
+            raise LookupError('Time not found')
+        del config['times'][time_val]
+    elif op == 'add_custom_type':
+        name, template = _clean_type_name(_edit_text(edit, 'name')), _edit_text(edit, 'template')
+        if not name or not template:
+            raise ValueError('Missing name or template')
+        announcement_templates.compile_template(template)
+        announcements[f'custom_{name}'] = template
+    elif op == 'delete_custom_type':
+        name = _edit_text(edit, 'name')
+        if not name:
+            raise ValueError('Missing name')
+        if announcements.pop(f'custom_{name}', None) is not None:
+            for t in [t for t, typ in config['times'].items() if typ == f'custom:{name}']:
+                del config['times'][t]
+    elif op == 'set_template':
+        key, template = _edit_text(edit, 'type'), edit.get('template')
+        if key not in STANDARD_TEMPLATES or not isinstance(template, str):
+            raise ValueError(f"set_template needs a type ({', '.join(STANDARD_TEMPLATES)}) and a template")
+        if '\n' in template or '\r' in template:
+            raise ValueError('template must be a single line')
+        announcement_templates.compile_template(template)
+        announcements[key] = template
+    else:
+        raise ValueError(f'Unknown operation {op!r}')
+
+def apply_schedule_edits(edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply edits to the current day's configuration as one transaction: the
+    file is read and written once, and if any edit fails nothing is written.
+    The announcer reloads it once when it sees the change. Returns the new configuration.
+    """
+    with global_lock:
+        handler = ConfigHandler(get_day_config_filename())
+        config = handler.read_config()
+        for index, edit in enumerate(edits):
+            try:
+                _apply_edit(config, edit)
+            except (ValueError, LookupError) as e:
+                if len(edits) == 1:
+                    raise
+                op = edit.get('op') if isinstance(edit, dict) else None
+                raise type(e)(f"Edit {index + 1} ({op}): {e}") from e
+        handler.config = config
+        handler.write_config()
+    return config
+
 def copy_config(source_config: str, target_config: str) -> bool:
     """
     Copy configuration from one file to another.
     """
     try:
         if not os.path.exists(source_config):
-            logging.error(f"Source config {source_config} does not exist")
+            logger.error("Source config %s does not exist", source_config)
             return False
-        with locked_file(source_config, 'r', fcntl.LOCK_SH) as src:
-            content = src.read()
-        with locked_file(target_config, 'w', fcntl.LOCK_EX) as tgt:
-            tgt.write(content)
-        logging.info(f"Successfully copied {source_config} to {target_config}")
+        with global_lock:
+            with locked_file(source_config, 'r', fcntl.LOCK_SH) as src:
+                content = src.read()
+            config_store.write_atomic(target_config, content)
+        logger.info("Successfully copied %s to %s", source_config, target_config)
         return True
     except Exception as e:
-        logging.error(f"Error copying config: {e}", exc_info=True)
+        logger.error("Error copying config: %s", e, exc_info=True)
         return False
 
 @app.route('/get_state', methods=['GET'])
+@versioned_json(config_files_key)
 def get_state():
     """
     Get the current configuration state for UI updates.
@@ -199,6 +586,7 @@ def get_state():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_day_configs', methods=['GET'])
+@versioned_json(config_files_key)
 def get_day_configs():
     """
     Get information about available day configurations.
@@ -220,8 +608,13 @@ def switch_config():
             return jsonify({'error': 'No configuration file specified'}), 400
         if not os.path.exists(config_file):
             return jsonify({'error': f'Configuration file {config_file} does not exist'}), 404
-        with locked_file("reload_config", "w", fcntl.LOCK_EX) as f:
-            f.write(config_file)
+        reply = control.send("switch_config", config_file=config_file)
+        if reply is not None and not reply.get("ok"):
+            return jsonify({'error': reply.get('error', 'Announcer rejected the configuration')}), 400
+        if reply is None:
+            # Announcer not listening; it loads the file named in the marker when it runs
+            with locked_file("reload_config", "w", fcntl.LOCK_EX) as f:
+                f.write(config_file)
         return jsonify({'message': f'Switched to {config_file}', 'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -253,23 +646,12 @@ def add_custom_type():
     """
     try:
         data = request.get_json()
-        name = data.get('name')
-        template = data.get('template')
-        if not name or not template:
-            return jsonify({'error': 'Missing name or template'}), 400
-        clean_name = ''.join(c.lower() if c.isalnum() or c.isspace() else '_' for c in name).replace(' ', '_')
-        current_config = get_day_config_filename()
-        handler = ConfigHandler(current_config)
-        config = handler.read_config()
-        config['announcements'][f'custom_{clean_name}'] = template
-        handler.config = config
-        handler.write_config()
-        if restart_services():
-            return jsonify({'message': 'Custom type added successfully'}), 200
-        else:
-            return jsonify({'error': 'Failed to restart services'}), 500
+        apply_schedule_edits([{'op': 'add_custom_type', 'name': data.get('name'), 'template': data.get('template')}])
+        return jsonify({'message': 'Custom type added successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logging.error(f"Error adding custom type: {e}", exc_info=True)
+        logger.error("Error adding custom type: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/delete_custom_type', methods=['POST'])
@@ -279,26 +661,12 @@ def delete_custom_type():
     """
     try:
         data = request.get_json()
-        name = data.get('name')
-        if not name:
-            return jsonify({'error': 'Missing name'}), 400
-        current_config = get_day_config_filename()
-        handler = ConfigHandler(current_config)
-        config = handler.read_config()
-        key = f'custom_{name}'
-        if key in config['announcements']:
-            del config['announcements'][key]
-            times_to_remove = [t for t, typ in config['times'].items() if typ == f'custom:{name}']
-            for t in times_to_remove:
-                del config['times'][t]
-        handler.config = config
-        handler.write_config()
-        if restart_services():
-            return jsonify({'message': 'Custom type deleted successfully'}), 200
-        else:
-            return jsonify({'error': 'Failed to restart services'}), 500
+        apply_schedule_edits([{'op': 'delete_custom_type', 'name': data.get('name')}])
+        return jsonify({'message': 'Custom type deleted successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        logging.error(f"Error deleting custom type: {e}", exc_info=True)
+        logger.error("Error deleting custom type: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/add_time', methods=['POST'])
@@ -308,52 +676,150 @@ def add_time():
     """
     try:
         data = request.get_json()
-        time_val = data.get('time')
-        type_val = data.get('type')
-        if not time_val or not type_val:
-            return jsonify({'error': 'Missing time or type'}), 400
-        current_config = get_day_config_filename()
-        handler = ConfigHandler(current_config)
-        config = handler.read_config()
-        if type_val.startswith('custom:'):
-            custom_name = type_val.replace('custom:', '')
-            if f'custom_{custom_name}' not in config['announcements']:
-                return jsonify({'error': f'Custom template {custom_name} not found'}), 400
-        config['times'][time_val] = type_val
-        handler.config = config
-        handler.write_config()
-        if restart_services():
-            return jsonify({'message': 'Time added successfully'}), 200
-        else:
-            return jsonify({'error': 'Failed to restart services'}), 500
+        apply_schedule_edits([{'op': 'add_time', 'time': data.get('time'), 'type': data.get('type')}])
+        return jsonify({'message': 'Time added successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/batch_update', methods=['POST'])
+def batch_update():
+    """
+    Apply several schedule and template edits in one transaction, e.g.
+    {"edits": [{"op": "add_time", "time": "14:00", "type": "hour"},
+               {"op": "delete_time", "time": "15:00"},
+               {"op": "add_custom_type", "name": "Birthday", "template": "..."},
+               {"op": "delete_custom_type", "name": "birthday"},
+               {"op": "set_template", "type": "rules", "template": "..."}]}
+    Either every edit is saved, with a single write and reload, or none is.
+    """
+    try:
+        data = request.get_json(silent=True)
+        edits = data.get('edits') if isinstance(data, dict) else None
+        if not isinstance(edits, list) or not edits:
+            return jsonify({'error': 'Expected a non-empty list of edits'}), 400
+        config = apply_schedule_edits(edits)
+        custom_types = {k.replace('custom_', ''): v for k, v in config['announcements'].items() if k.startswith('custom_')}
+        return jsonify({'message': f'Applied {len(edits)} changes', 'applied': len(edits),
+                        'times': dict(sorted(config['times'].items())), 'custom_types': custom_types}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
+        logger.error("Error applying batch update: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/play_instant', methods=['POST'])
 def play_instant():
     """
-    Play an instant announcement immediately.
+    Queue an instant announcement for the announcer and return its job id.
+    Poll /announcement_status/<job_id> for progress.
     """
     try:
         data = request.get_json()
         text = data.get('text')
         if not text:
             return jsonify({'error': 'Missing announcement text'}), 400
+        reply = control.send("enqueue", text=text, priority=playback.PRIORITY_INSTANT)
+        if reply is not None and reply.get("ok"):
+            job_id = reply["job_id"]
+        else:
+            # Announcer not listening (or still starting); it claims spooled jobs when it runs
+            job_id = announce_queue.submit(text, playback.PRIORITY_INSTANT)
+        return jsonify({'message': 'Announcement queued', 'job_id': job_id, 'status': 'queued'}), 202
+    except Exception as e:
+        logger.error("Error queueing instant announcement: %s", e, exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/announcement_status/<job_id>', methods=['GET'])
+def announcement_status(job_id):
+    """
+    Report the status of a queued announcement.
+    """
+    status = announce_queue.get_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown announcement job'}), 404
+    return jsonify(status)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Report audio cache usage and this process's hit/miss/eviction counters.
+    """
+    try:
         current_config = get_day_config_filename()
         handler = ConfigHandler(current_config)
         config = handler.read_config()
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_path = temp_file.name
-        success = asyncio.run(announcer.synthesize_speech_async(text, config['tts']['voice_id'], temp_path))
-        if not success:
-            return jsonify({'error': 'Failed to synthesize speech'}), 500
-        if not announcer.play_sound(temp_path, config['tts'].get('output_format', 'mp3')):
-            return jsonify({'error': 'Failed to play announcement'}), 500
-        return jsonify({'message': 'Announcement played successfully'}), 200
+        return jsonify(announcer.get_audio_cache(config['tts']).stats())
+    except Exception as e:
+        logger.error("Error reading cache stats: %s", e, exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/timing_stats', methods=['GET'])
+def timing_stats():
+    """
+    Report the announcer's learned playback offset and announcement lateness histogram.
+    """
+    stats = timing.load_stats()
+    if stats is None:
+        return jsonify({'error': 'No announcements have been timed yet'}), 404
+    return jsonify(stats)
+
+@app.route('/upcoming', methods=['GET'])
+@versioned_json(upcoming_version)
+def upcoming():
+    """
+    Scheduled announcements in the next `hours` hours (default 1, up to a
+    week) across all day files, with rendered text and predicted colors.
+    """
+    if _upcoming_hours() is None:
+        return jsonify({'error': f'hours must be a number between 0 and {UPCOMING_MAX_HOURS}'}), 400
+    try:
+        timeline, start, end = _upcoming_window()
+        return jsonify({'announcements': timeline['slots'][start:end],
+                        'colors_predicted': timeline['colors_predicted']})
     except Exception as e:
-        logging.error(f"Error playing instant announcement: {e}", exc_info=True)
+        logger.error("Error building upcoming announcements: %s", e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/status', methods=['GET'])
+def status():
+    """
+    Live announcer status (configuration, next slot, colors, now playing, last
+    result), served straight from the announcer's shared status record.
+    """
+    latest = announcer_status.read()
+    if latest is None:
+        return jsonify({'error': 'Announcer status not available', 'running': False}), 503
+    sequence, payload = latest
+    etag = f"status-{sequence}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Stream control panel state as server-sent events: one snapshot, then merge patches.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(panel_events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Export this process's metrics in the Prometheus text format.
+    The announcer serves its own on 127.0.0.1:9464/metrics.
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/delete_time', methods=['POST'])
 def delete_time():
     """
@@ -361,21 +827,12 @@ def delete_time():
     """
     try:
         data = request.get_json()
-        time_val = data.get('time')
-        if not time_val:
-            return jsonify({'error': 'Missing time'}), 400
-        current_config = get_day_config_filename()
-        handler = ConfigHandler(current_config)
-        config = handler.read_config()
-        if time_val in config['times']:
-            del config['times'][time_val]
-            handler.write_config()
-            if restart_services():
-                return jsonify({'message': 'Time deleted successfully'}), 200
-            else:
-                return jsonify({'error': 'Failed to restart services'}), 500
-        else:
-            return jsonify({'error': 'Time not found'}), 404
+        apply_schedule_edits([{'op': 'delete_time', 'time': data.get('time')}])
+        return jsonify({'message': 'Time deleted successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -403,10 +860,10 @@ def index():
 @app.route('/save_config', methods=['POST'])
 def save_config():
     """
-    Save the full configuration and restart the service.
+    Save the full configuration; the announcer reloads it when it sees the change.
     """
     try:
-        logging.info("Processing save configuration request")
+        logger.info("Processing save configuration request")
         current_config = get_day_config_filename()
         handler = ConfigHandler(current_config)
         config = handler.config
@@ -436,20 +893,22 @@ def save_config():
                 if '=' in line:
                     name, template = [part.strip() for part in line.split('=', 1)]
                     config['announcements'][f'custom_{name}'] = template
+        template_errors = announcement_templates.check_templates(config['announcements'])
+        if template_errors:
+            flash('Configuration not saved: ' + '; '.join(template_errors.values()), 'error')
+            return redirect(url_for('index'))
         config['tts']['voice_id'] = request.form['voice_id']
         handler.config = config
         handler.write_config()
-        if restart_services():
-            flash('Configuration saved and announcer service restarted successfully!', 'success')
-        else:
-            flash('Configuration saved but service restart failed. Please restart manually.', 'error')
+        flash('Configuration saved! The announcer reloads it automatically.', 'success')
         return redirect(url_for('index'))
     except Exception as e:
-        logging.error(f"Error saving configuration: {e}", exc_info=True)
+        logger.error("Error saving configuration: %s", e, exc_info=True)
         flash(f'Error saving configuration: {str(e)}', 'error')
         return redirect(url_for('index'))
 
 @app.route('/get_ini_content', methods=['GET'])
+@versioned_json(ini_file_version)
 def get_ini_content():
     """
     Retrieve the content of the specified INI file.
@@ -457,8 +916,7 @@ def get_ini_content():
     file_name = request.args.get('file')
     if not file_name:
         return jsonify({'error': 'No file specified'}), 400
-    valid_files = ["thurs.ini", "fri.ini", "sat.ini", "sun.ini", "config.ini"]
-    if file_name not in valid_files:
+    if file_name not in EDITABLE_INI_FILES:
         return jsonify({'error': 'Invalid file name'}), 400
     try:
         if not os.path.exists(file_name):
@@ -467,11 +925,10 @@ def get_ini_content():
                         "[times]\n# No times configured\n\n" +
                         "[announcements]\n# No announcements configured\n\n" +
                         "[tts]\nvoice_id = en-US-AriaNeural\n")
-        with locked_file(file_name, 'r', fcntl.LOCK_SH) as f:
-            content = f.read()
-        return jsonify({'content': content})
+        snapshot = config_store.load(file_name)
+        return jsonify({'content': snapshot.text if snapshot else ''})
     except Exception as e:
-        logging.error(f"Error reading INI file {file_name}: {e}", exc_info=True)
+        logger.error("Error reading INI file %s: %s", file_name, e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/save_ini_content', methods=['POST'])
@@ -484,21 +941,24 @@ def save_ini_content():
     content = data.get('content')
     if not file_name or content is None:
         return jsonify({'error': 'Missing file or content'}), 400
+    template_errors = announcement_templates.check_templates(
+        config_store.parse_ini_text(content).get('announcements', {}))
+    if template_errors:
+        return jsonify({'error': '; '.join(f"[announcements] {key}: {error}" for key, error in template_errors.items())}), 400
     try:
-        with locked_file(file_name, 'w', fcntl.LOCK_EX) as f:
-            f.write(content)
+        with global_lock:
+            config_store.write_atomic(file_name, content)
         current_config = get_day_config_filename()
         if file_name == current_config:
-            if restart_services():
-                return jsonify({'message': 'File saved and configuration reloaded', 'reload_triggered': True})
-            else:
-                return jsonify({'message': 'File saved but service restart failed', 'reload_triggered': False})
+            # The announcer's configuration watcher reloads the changed file
+            return jsonify({'message': 'File saved and configuration reloaded', 'reload_triggered': True})
         return jsonify({'message': 'File saved successfully', 'reload_triggered': False})
     except Exception as e:
-        logging.error(f"Error saving INI file {file_name}: {e}", exc_info=True)
+        logger.error("Error saving INI file %s: %s", file_name, e, exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_current_schedule', methods=['GET'])
+@versioned_json(current_config_version)
 def get_current_schedule():
     """
     Get the current announcement schedule and types.
@@ -517,7 +977,7 @@ def get_current_schedule():
         custom_types = {k.replace('custom_', ''): v for k, v in config['announcements'].items() if k.startswith('custom_')}
         return jsonify({'times': times, 'announcements': announcements, 'custom_types': custom_types, 'status': 'success'})
     except Exception as e:
-        logging.error(f"Error getting current schedule: {e}", exc_info=True)
+        logger.error("Error getting current schedule: %s", e, exc_info=True)
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
 @app.route('/update_schedule', methods=['POST'])
@@ -529,26 +989,35 @@ def update_schedule():
         current_config = get_day_config_filename()
         handler = ConfigHandler(current_config)
         config = handler.read_config()
-        if restart_services():
+        if signal_reload():
             times = {t: typ for t, typ in sorted(config['times'].items())}
             custom_types = {k.replace('custom_', ''): v for k, v in config['announcements'].items() if k.startswith('custom_')}
             return jsonify({'message': 'Schedule updated and service reloaded', 'times': times, 'custom_types': custom_types, 'success': True})
         else:
             return jsonify({'error': 'Failed to reload service', 'success': False}), 500
     except Exception as e:
-        logging.error(f"Error updating schedule: {e}", exc_info=True)
+        logger.error("Error updating schedule: %s", e, exc_info=True)
         return jsonify({'error': str(e), 'success': False}), 500
 
 # Global error handlers
 @app.errorhandler(404)
 def not_found_error(error):
-    logging.error("404 error: %s", error)
+    logger.error("404 error: %s", error)
     return jsonify({"error": "Resource not found"}), 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    logging.error("500 error: %s", error, exc_info=True)
+    logger.error("500 error: %s", error, exc_info=True)
     return jsonify({"error": "Internal server error"}), 500
 
+def setup_app() -> Flask:
+    """
+    Set up process-wide state for serving the web interface and return the app.
+    Call this from a WSGI entry point; importing the module does not do it.
+    """
+    # The web interface keeps its own log file; the announcer owns announcement_script.log
+    log_setup.setup_logging(log_setup.SETTINGS_LOG_FILE, log_setup.read_options(get_day_config_filename()))
+    return app
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    setup_app().run(host='0.0.0.0', port=5000, debug=True)
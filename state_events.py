@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+state_events.py
+
+Server-sent events for the control panel. One publisher thread per web
+process rebuilds the panel state about once a second (and immediately after
+a change made through the web interface) and publishes only what changed, as
+a JSON merge patch (RFC 7396): changed keys carry their new value, removed
+keys are null. A connecting tab receives the full state once and then only
+the patches, so each open tab costs one idle stream instead of repeated
+fetches that re-read the INI files.
+
+Events:
+    event: snapshot   data: {"version": n, "state": {...}}
+    event: patch      data: {"version": n, "patch": {...}}
+Each event's id is its version, so a reconnecting EventSource resumes from
+Last-Event-ID with the patches it missed (or a new snapshot if it fell too
+far behind). A comment line is sent every HEARTBEAT_SECONDS so proxies keep
+the connection open and closed tabs are noticed.
+"""
+
+import collections
+import json
+import logging
+import threading
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger("state_events")
+
+# How often the publisher rebuilds the state while clients are connected
+TICK_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+# Patches kept so reconnecting clients can catch up without a full snapshot
+HISTORY_SIZE = 100
+
+CLIENTS = metrics.gauge("settings_event_stream_clients", "Open control panel event streams")
+EVENTS = metrics.counter("settings_event_stream_events_total", "Events sent to control panel streams", ["event"])
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the JSON merge patch that turns old into new. Nested dictionaries
+    are diffed key by key; any other changed value is replaced whole.
+    State values must not be None, since null marks a removed key.
+    """
+    patch: Dict[str, Any] = {}
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = merge_patch(previous, value)
+            if nested:
+                patch[key] = nested
+        elif key not in old or previous != value:
+            patch[key] = value
+    return patch
+
+
+def _event(name: str, version: int, payload: Dict[str, Any]) -> str:
+    EVENTS.inc(event=name)
+    data = json.dumps(dict(payload, version=version), separators=(",", ":"))
+    return f"id: {version}\nevent: {name}\ndata: {data}\n\n"
+
+
+class StateBroadcaster:
+    """
+    Publishes changes to the state returned by build_state() to every open stream.
+    """
+    def __init__(self, build_state: Callable[[], Dict[str, Any]], tick: float = TICK_SECONDS,
+                 history: int = HISTORY_SIZE):
+        self.build_state = build_state
+        self.tick = tick
+        self.version = 0
+        self.state: Dict[str, Any] = {}
+        self.clients = 0
+        self._patches: Deque[Tuple[int, Dict[str, Any]]] = collections.deque(maxlen=history)
+        self._condition = threading.Condition()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def notify(self) -> None:
+        """
+        Rebuild the state now instead of at the next tick, e.g. after a write.
+        """
+        self._wake.set()
+
+    def refresh(self) -> bool:
+        """
+        Rebuild the state and publish a patch if it changed. Returns True if it did.
+        """
+        try:
+            new_state = self.build_state()
+        except Exception as e:
+            logger.error("Could not build control panel state: %s", e, exc_info=True)
+            return False
+        with self._condition:
+            patch = merge_patch(self.state, new_state)
+            if not patch and self.version:
+                return False
+            self.version += 1
+            self.state = new_state
+            self._patches.append((self.version, patch))
+            self._condition.notify_all()
+        return True
+
+    def _ensure_thread(self) -> None:
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="state-events", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Sleep until a client connects; nothing is rebuilt for an empty audience
+            self._wake.wait(self.tick if self.clients else None)
+            self._wake.clear()
+            if self.clients:
+                self.refresh()
+
+    def _catch_up(self, since: int) -> Optional[list]:
+        """
+        Patches after version since, or None if some of them are no longer kept.
+        """
+        pending = [(version, patch) for version, patch in self._patches if version > since]
+        if pending and pending[0][0] != since + 1:
+            return None
+        return pending
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate the text/event-stream for one client.
+        """
+        self._ensure_thread()
+        with self._condition:
+            self.clients += 1
+            CLIENTS.set(self.clients)
+        try:
+            if not self.version:
+                self.refresh()
+            self._wake.set()
+            with self._condition:
+                version, state = self.version, self.state
+                resumed = None
+                if last_event_id and last_event_id.isdigit() and int(last_event_id) <= version:
+                    resumed = self._catch_up(int(last_event_id))
+            if resumed is None:
+                yield _event("snapshot", version, {"state": state})
+            else:
+                for patch_version, patch in resumed:
+                    yield _event("patch", patch_version, {"patch": patch})
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self.version > version, HEARTBEAT_SECONDS)
+                    pending = self._catch_up(version)
+                    latest, state = self.version, self.state
+                if not pending:
+                    if pending is None:
+                        yield _event("snapshot", latest, {"state": state})
+                        version = latest
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+                for patch_version, patch in pending:
+                    yield _event("patch", patch_version, {"patch": patch})
+                version = pending[-1][0]
+        finally:
+            with self._condition:
+                self.clients -= 1
+                CLIENTS.set(self.clients)
@@ -248,6 +248,11 @@ const iniEditor = {
      * Fetches fresh data from the server
      */
     updateUIAfterReload: async function() {
+        if (liveUpdates.isConnected()) {
+            // The saved file arrives as a patch on the event stream
+            Utils.showNotification('Configuration reloaded', 'success');
+            return;
+        }
         try {
             // Fetch updated schedule and announcement data
             const response = await fetch('/get_current_schedule');
@@ -514,10 +519,11 @@ function fixSwitchConfigButton() {
                     throw new Error(result.error || 'Failed to switch configuration');
                 }
                 Utils.showNotification(`Successfully switched to ${selectedConfig}`, 'success');
-                setTimeout(() => window.location.reload(), 1000);
+                await syncState();
             } catch (error) {
                 console.error('Error switching configuration:', error);
                 Utils.showNotification(error.message, 'error');
+            } finally {
                 UI.hideLoading();
             }
         });
@@ -582,7 +588,7 @@ const scheduleEditor = {
                 throw new Error(result.error || 'Failed to add time');
             }
             Utils.showNotification('Time added successfully', 'success');
-            await refreshState();
+            await syncState();
         } catch (error) {
             console.error('Error adding time:', error);
             Utils.showNotification(error.message, 'error');
@@ -611,7 +617,7 @@ const scheduleEditor = {
                 throw new Error(result.error || 'Failed to delete time');
             }
             Utils.showNotification('Time deleted successfully', 'success');
-            await refreshState();
+            await syncState();
         } catch (error) {
             console.error('Error deleting time:', error);
             Utils.showNotification(error.message, 'error');
@@ -764,7 +770,7 @@ const customTypes = {
             nameInput.value = '';
             templateInput.value = '';
             Utils.showNotification('Custom type added successfully', 'success');
-            await refreshState();
+            await syncState();
         } catch (error) {
             console.error('Error adding custom type:', error);
             Utils.showNotification(error.message, 'error');
@@ -866,24 +872,7 @@ const dayConfigManager = {
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const data = await response.json();
-            if (data.current_day) {
-                const dayInfo = data.current_day;
-                currentDayElement.textContent = dayInfo.day_name;
-                activeConfigElement.textContent = dayInfo.config_file;
-                if (dayInfo.is_operating_day) {
-                    configStatusElement.textContent = 'Operating Day';
-                    configStatusElement.className = 'status-active';
-                } else {
-                    configStatusElement.textContent = 'Non-Operating Day';
-                    configStatusElement.className = 'status-inactive';
-                }
-                const configSelector = document.getElementById('configSelector');
-                if (configSelector) {
-                    configSelector.value = dayInfo.config_file;
-                }
-            }
-            this.updateConfigFileStatus(data.configs);
+            this.applyDayConfigs(await response.json());
         } catch (error) {
             console.error('Error loading day configuration info:', error);
             currentDayElement.textContent = 'Error loading';
@@ -893,6 +882,33 @@ const dayConfigManager = {
         }
     },
 
+    /**
+     * Show day configuration info from /get_day_configs or the live state stream.
+     * @param {Object} data - Object with current_day and configs.
+     */
+    applyDayConfigs: function(data) {
+        const currentDayElement = document.getElementById('currentDay');
+        const activeConfigElement = document.getElementById('activeConfig');
+        const configStatusElement = document.getElementById('configStatus');
+        if (data.current_day && currentDayElement && activeConfigElement && configStatusElement) {
+            const dayInfo = data.current_day;
+            currentDayElement.textContent = dayInfo.day_name;
+            activeConfigElement.textContent = dayInfo.config_file;
+            if (dayInfo.is_operating_day) {
+                configStatusElement.textContent = 'Operating Day';
+                configStatusElement.className = 'status-active';
+            } else {
+                configStatusElement.textContent = 'Non-Operating Day';
+                configStatusElement.className = 'status-inactive';
+            }
+            const configSelector = document.getElementById('configSelector');
+            if (configSelector) {
+                configSelector.value = dayInfo.config_file;
+            }
+        }
+        this.updateConfigFileStatus(data.configs);
+    },
+
     /**
      * Update the status of configuration files in the UI.
      * @param {Object} configs - An object containing configuration file statuses.
@@ -937,10 +953,11 @@ const dayConfigManager = {
             throw new Error(result.error || 'Failed to switch configuration');
         }
         Utils.showNotification(`Successfully switched to ${selectedConfig}`, 'success');
-        setTimeout(() => window.location.reload(), 1000);
+        await syncState();
     } catch (error) {
         console.error('Error switching configuration:', error);
         Utils.showNotification(error.message, 'error');
+    } finally {
         UI.hideLoading();
     }
 },
@@ -985,7 +1002,7 @@ copyConfig: async function() {
             copyStatus.className = 'status-message success';
         }
         Utils.showNotification(`Successfully copied ${source} to ${target}`, 'success');
-        await this.updateDayConfigInfo();
+        await syncState();
     } catch (error) {
         console.error('Error copying configuration:', error);
         if (copyStatus) {
@@ -1042,6 +1059,179 @@ try {
 }
 }
 
+/**
+ * Bring the UI up to date after a change made from this tab.
+ * With a live event stream the server pushes the change itself.
+ */
+async function syncState() {
+    if (!liveUpdates.isConnected()) {
+        await refreshState();
+    }
+}
+
+/* ============================
+   Live Updates Module
+============================ */
+
+/**
+ * Keeps the panel in sync through the server-sent /events stream.
+ * The server sends the full state once, then JSON merge patches with only
+ * what changed; each patch re-renders only the sections it touches.
+ */
+const liveUpdates = {
+    source: null,
+    state: {},
+
+    /**
+     * Open the event stream. Browsers without EventSource keep the fetch-based refresh.
+     */
+    init: function() {
+        if (!window.EventSource) {
+            console.log('EventSource not supported; using manual refresh');
+            return;
+        }
+        this.source = new EventSource('/events');
+        this.source.addEventListener('snapshot', (event) => {
+            const data = JSON.parse(event.data);
+            this.state = data.state;
+            this.render(this.state);
+        });
+        this.source.addEventListener('patch', (event) => {
+            const data = JSON.parse(event.data);
+            this.state = this.applyPatch(this.state, data.patch);
+            this.render(data.patch);
+        });
+        // EventSource reconnects by itself and resumes from the last event id
+        this.source.onerror = () => console.warn('Event stream interrupted, reconnecting...');
+    },
+
+    /**
+     * @returns {boolean} True while the event stream is open.
+     */
+    isConnected: function() {
+        return this.source !== null && this.source.readyState === EventSource.OPEN;
+    },
+
+    /**
+     * Apply a JSON merge patch (RFC 7396): null removes a key, objects merge, anything else replaces.
+     * @param {Object} target - Current state.
+     * @param {Object} patch - Merge patch from the server.
+     * @returns {Object} The patched state.
+     */
+    applyPatch: function(target, patch) {
+        if (patch === null || typeof patch !== 'object' || Array.isArray(patch)) {
+            return patch;
+        }
+        const result = (target && typeof target === 'object' && !Array.isArray(target)) ? { ...target } : {};
+        Object.entries(patch).forEach(([key, value]) => {
+            if (value === null) {
+                delete result[key];
+            } else {
+                result[key] = this.applyPatch(result[key], value);
+            }
+        });
+        return result;
+    },
+
+    /**
+     * Re-render the sections named in changed (a snapshot or a patch) from the current state.
+     * @param {Object} changed - Keys that changed.
+     */
+    render: function(changed) {
+        if (changed.schedule) {
+            this.renderSchedule(this.state.schedule, changed.schedule);
+        }
+        if (changed.day_configs) {
+            dayConfigManager.applyDayConfigs(this.state.day_configs);
+        }
+        if (changed.announcer && changed.announcer.rotation) {
+            // New rotation inputs change the predicted colors
+            updateUpcomingAnnouncements();
+        }
+        if ('now_playing' in changed || 'next_announcement' in changed || 'last_announced' in changed ||
+                'announcer' in changed) {
+            this.renderStatus();
+        }
+    },
+
+    /**
+     * Update schedule, custom types and templates. A template being edited is left alone.
+     * @param {Object} schedule - Current schedule state.
+     * @param {Object} changed - Changed parts of the schedule.
+     */
+    renderSchedule: function(schedule, changed) {
+        if (changed.times) {
+            scheduleEditor.times.clear();
+            Object.entries(schedule.times || {}).forEach(([time, type]) => {
+                scheduleEditor.times.set(time, type);
+            });
+            scheduleEditor.updateScheduleList();
+            updateUpcomingAnnouncements();
+        }
+        if (changed.custom_types) {
+            customTypes.types.clear();
+            Object.entries(schedule.custom_types || {}).forEach(([name, template]) => {
+                customTypes.types.set(name, template);
+            });
+            customTypes.updateTypesList();
+            customTypes.updateTypeDropdown();
+        }
+        if (changed.announcements) {
+            const templates = {
+                'hour_template': 'hour',
+                'fiftyfive_template': 'fiftyfive',
+                'rules_template': 'rules',
+                'ad_template': 'ad'
+            };
+            Object.entries(templates).forEach(([id, key]) => {
+                const element = document.getElementById(id);
+                if (element && key in changed.announcements && document.activeElement !== element) {
+                    element.value = schedule.announcements[key] || '';
+                }
+            });
+        }
+    },
+
+    /**
+     * Update the Now Playing card.
+     */
+    renderStatus: function() {
+        const nowPlaying = document.getElementById('nowPlaying');
+        const nextAnnouncement = document.getElementById('nextAnnouncement');
+        const lastAnnounced = document.getElementById('lastAnnounced');
+        const jobs = Object.values(this.state.now_playing || {});
+        const announcer = this.state.announcer || {};
+        if (nowPlaying) {
+            // The announcer's own record also covers scheduled announcements
+            const playing = announcer.now_playing || jobs.find(job => job.status === 'playing');
+            if (playing) {
+                nowPlaying.textContent = playing.label || playing.text;
+            } else if (jobs.length > 0) {
+                nowPlaying.textContent = `${jobs.length} queued`;
+            } else {
+                nowPlaying.textContent = 'Nothing playing';
+            }
+        }
+        const next = this.state.next_announcement || {};
+        if (nextAnnouncement) {
+            nextAnnouncement.textContent = next.time
+                ? `Next: ${Utils.formatTime(next.time.slice(11, 16))} (${next.type})`
+                : '';
+        }
+        if (lastAnnounced) {
+            const last = announcer.last_announcement;
+            if (last) {
+                const lateness = last.lateness_ms !== null ? `, ${last.lateness_ms > 0 ? '+' : ''}${last.lateness_ms} ms` : '';
+                lastAnnounced.textContent = `Last: ${Utils.formatTime(last.time.slice(11, 16))} (${last.result}${lateness})`;
+            } else {
+                lastAnnounced.textContent = this.state.last_announced
+                    ? `Last: ${Utils.formatTime(this.state.last_announced.slice(11, 16))}`
+                    : '';
+            }
+        }
+    }
+};
+
 /* ============================
 Instant Announcement Setup
 ============================ */
@@ -1080,6 +1270,15 @@ playInstantBtn.addEventListener('click', async () => {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         const result = await response.json();
+        UI.hideLoading();
+        instantStatus.textContent = 'Announcement queued...';
+        const finalStatus = await waitForAnnouncement(result.job_id, status => {
+            const labels = { queued: 'Announcement queued...', synthesizing: 'Preparing announcement...', playing: 'Playing announcement...' };
+            instantStatus.textContent = labels[status] || instantStatus.textContent;
+        });
+        if (finalStatus.status !== 'done') {
+            throw new Error(finalStatus.error || `Announcement ${finalStatus.status}`);
+        }
         instantStatus.textContent = 'Announcement played successfully';
         instantStatus.className = 'status-message success';
     } catch (error) {
@@ -1094,30 +1293,82 @@ playInstantBtn.addEventListener('click', async () => {
 });
 }
 
+/**
+* Poll a queued announcement until it finishes.
+* @param {string} jobId - Job id returned by /play_instant.
+* @param {Function} onProgress - Called with each intermediate status.
+* @returns {Promise<Object>} The final job status.
+*/
+async function waitForAnnouncement(jobId, onProgress) {
+const finished = ['done', 'failed', 'timeout', 'preempted'];
+const deadline = Date.now() + 5 * 60 * 1000;
+while (Date.now() < deadline) {
+    const response = await fetch(`/announcement_status/${jobId}`);
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const job = await response.json();
+    if (finished.includes(job.status)) {
+        return job;
+    }
+    onProgress(job.status);
+    await new Promise(resolve => setTimeout(resolve, 500));
+}
+throw new Error('Timed out waiting for the announcer');
+}
+
 /* ============================
 Upcoming Announcements Update
 ============================ */
 
 /**
-* Update the upcoming announcements display.
-* @param {Object} [colorData=null] - Optional color data for announcements.
+* Update the upcoming announcements display from the server's /upcoming timeline,
+* which covers every day file and includes rendered text and predicted colors.
+* Falls back to the local schedule if the request fails.
+* @param {Object} [colorData=null] - Optional color data for the local fallback.
 */
-function updateUpcomingAnnouncements(colorData = null) {
-console.log('Updating upcoming announcements...');
+async function updateUpcomingAnnouncements(colorData = null) {
 const container = document.getElementById('upcomingList');
 if (!container) {
     console.error('Upcoming list container not found');
     return;
 }
+try {
+    const response = await fetch('/upcoming?hours=1');
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    const now = new Date();
+    renderUpcomingItems(container, data.announcements.map(slot => {
+        const colorKey = slot.type === ':55' ? 'color3' : slot.type === 'hour' ? 'color4' : null;
+        return {
+            time: slot.time.slice(11, 16),
+            type: slot.type,
+            minutesUntil: Math.max(0, Math.round((new Date(slot.time) - now) / 1000 / 60)),
+            color: colorKey ? slot.colors[colorKey] : null,
+            text: slot.text
+        };
+    }));
+} catch (error) {
+    console.error('Error fetching upcoming announcements, using local schedule:', error);
+    updateUpcomingFromTimes(colorData);
+}
+}
+
+/**
+* Compute the next hour's announcements from the times textarea (today's file only).
+* @param {Object} [colorData=null] - Optional color data for announcements.
+*/
+function updateUpcomingFromTimes(colorData = null) {
+const container = document.getElementById('upcomingList');
 const timesTextarea = document.getElementById('times');
-if (!timesTextarea) {
-    console.error('Times textarea not found');
+if (!container || !timesTextarea) {
+    console.error('Upcoming list or times textarea not found');
     return;
 }
 const now = new Date();
 const lines = timesTextarea.value.trim().split('\n');
-container.innerHTML = '';
-const typeLabels = { ':55': 'Color Warning', 'hour': 'Hour Change', 'rules': 'Rules', 'ad': 'Advertisement' };
 const upcoming = lines
     .filter(line => line.trim())
     .map(line => {
@@ -1130,35 +1381,49 @@ const upcoming = lines
         }
         const minutesUntil = Math.round((scheduleTime - now) / 1000 / 60);
         if (minutesUntil <= 60) {
-            return { time: timeStr, type, minutesUntil, scheduleTime };
+            let color = null;
+            if (colorData && (type === ':55' || type === 'hour')) {
+                const colorKey = type === ':55' ? 'color3' : 'color4';
+                color = colorData[colorKey] ? colorData[colorKey].color : null;
+            }
+            return { time: timeStr, type, minutesUntil, scheduleTime, color };
         }
         return null;
     })
     .filter(item => item !== null)
     .sort((a, b) => a.scheduleTime - b.scheduleTime);
+renderUpcomingItems(container, upcoming);
+}
+
+/**
+* Render upcoming announcement items into the dashboard list.
+* @param {HTMLElement} container - The upcoming list element.
+* @param {Array} upcoming - Items with time, type, minutesUntil and optional color and text.
+*/
+function renderUpcomingItems(container, upcoming) {
+container.innerHTML = '';
 if (upcoming.length === 0) {
     container.innerHTML = '<div class="upcoming-item empty"><span class="type">No announcements scheduled for the next hour</span></div>';
     return;
 }
-upcoming.forEach(({ time, type, minutesUntil }) => {
+const typeLabels = { ':55': 'Color Warning', 'hour': 'Hour Change', 'rules': 'Rules', 'ad': 'Advertisement' };
+upcoming.forEach(({ time, type, minutesUntil, color, text }) => {
     const typeLabel = type.startsWith('custom:')
         ? `Custom: ${type.replace('custom:', '')}`
         : typeLabels[type] || type;
-    let colorInfo = '';
-    if (colorData && (type === ':55' || type === 'hour')) {
-        const colorKey = type === ':55' ? 'color3' : 'color4';
-        if (colorData[colorKey] && colorData[colorKey].color) {
-            colorInfo = ` (${colorData[colorKey].color})`;
-        }
+    const colorInfo = color ? ` (${color})` : '';
+    const item = document.createElement('div');
+    item.className = 'upcoming-item';
+    item.dataset.type = type;
+    if (text) {
+        item.title = text;
     }
-    const itemHtml = `
-        <div class="upcoming-item" data-type="${type}">
-            <span class="time">${Utils.formatTime(time)}</span>
-            <span class="type">${typeLabel}${colorInfo}</span>
-            <span class="countdown">in ${Utils.formatMinutes(minutesUntil)}</span>
-        </div>
+    item.innerHTML = `
+        <span class="time">${Utils.formatTime(time)}</span>
+        <span class="type">${typeLabel}${colorInfo}</span>
+        <span class="countdown">in ${Utils.formatMinutes(minutesUntil)}</span>
     `;
-    container.insertAdjacentHTML('beforeend', itemHtml);
+    container.appendChild(item);
 });
 }
 
@@ -1173,6 +1438,9 @@ customTypes.init();
 dayConfigManager.init();
 setupInstantAnnouncement();
 updateUpcomingAnnouncements();
+// Keep the countdowns current; responses are 304 until the window changes
+setInterval(updateUpcomingAnnouncements, 60 * 1000);
+liveUpdates.init();
 
 // Add a manual refresh button for the schedule (optional enhancement)
 const configForm = document.getElementById('configForm');
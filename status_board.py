@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+status_board.py
+
+Live status record of the announcer, shared with the web interface through a
+memory-mapped file (announcer_status.bin). The announcer publishes a small
+JSON record whenever something changes: loaded configuration, next slot,
+current color order, what is playing and how the last announcement went.
+The web interface reads it without locks, file parsing or database access.
+
+The file is a fixed-size header followed by the JSON payload:
+
+    magic "ANST" | layout version (u16) | reserved (u16) | sequence (u64) | length (u32)
+
+Writes follow a sequence lock: the sequence is made odd, the payload is
+written, and the sequence is made even again. A reader that sees an odd
+sequence, or a different sequence after copying the payload, retries, so it
+never returns a half-written record. The sequence doubles as the record's
+version, e.g. for ETags.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("status_board")
+
+STATUS_FILE = "announcer_status.bin"
+MAGIC = b"ANST"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<4sHHQI")
+SEQUENCE_OFFSET = 8
+PAYLOAD_OFFSET = 32
+FILE_SIZE = 64 * 1024
+READ_RETRIES = 100
+
+
+class StatusBoard:
+    """
+    Announcer-side writer. publish() merges fields into the record and
+    rewrites it; it is safe to call from any thread.
+    """
+    def __init__(self, path: str = STATUS_FILE):
+        self.path = path
+        self.record: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != FILE_SIZE:
+                os.ftruncate(fd, FILE_SIZE)
+            self._map = mmap.mmap(fd, FILE_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        magic, version, _, sequence, _ = HEADER.unpack_from(self._map, 0)
+        # Continue the sequence across restarts so readers' cached versions stay distinct
+        self._sequence = sequence + (sequence & 1) if magic == MAGIC and version == LAYOUT_VERSION else 0
+
+    def publish(self, **fields: Any) -> None:
+        """
+        Update the given fields of the record and publish it.
+        """
+        with self._lock:
+            self.record.update(fields)
+            self.record["updated"] = time.time()
+            payload = json.dumps(self.record, separators=(",", ":")).encode("utf-8")
+            if PAYLOAD_OFFSET + len(payload) > FILE_SIZE:
+                logger.warning("Announcer status record too large (%s bytes); not published", len(payload))
+                return
+            self._sequence += 1
+            HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, 0, self._sequence, 0)
+            self._map[PAYLOAD_OFFSET:PAYLOAD_OFFSET + len(payload)] = payload
+            self._sequence += 1
+            HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, 0, self._sequence, len(payload))
+
+    def close(self) -> None:
+        with self._lock:
+            self._map.close()
+
+
+class StatusReader:
+    """
+    Reader for the web interface. read() returns (sequence, JSON bytes) of the
+    latest record, or None if the announcer has not published one.
+    """
+    def __init__(self, path: str = STATUS_FILE):
+        self.path = path
+        self._map: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+        self._last: Optional[Tuple[int, bytes]] = None
+        self._decoded: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _mapping(self) -> Optional[mmap.mmap]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if self._map is None or st.st_ino != self._inode:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if st.st_size < PAYLOAD_OFFSET:
+                return None
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._inode = st.st_ino
+            self._last = None
+        return self._map
+
+    def read(self) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            mapping = self._mapping()
+            if mapping is None:
+                return None
+            for _ in range(READ_RETRIES):
+                magic, version, _, sequence, length = HEADER.unpack_from(mapping, 0)
+                if magic != MAGIC or version != LAYOUT_VERSION or sequence == 0:
+                    return None
+                if sequence & 1:
+                    # The announcer is writing; it takes microseconds
+                    time.sleep(0)
+                    continue
+                if self._last is not None and self._last[0] == sequence:
+                    return self._last
+                payload = mapping[PAYLOAD_OFFSET:PAYLOAD_OFFSET + min(length, len(mapping) - PAYLOAD_OFFSET)]
+                if struct.unpack_from("<Q", mapping, SEQUENCE_OFFSET)[0] == sequence:
+                    self._last = (sequence, payload)
+                    return self._last
+            logger.warning("Gave up reading announcer status after %s retries", READ_RETRIES)
+            return None
+
+    def read_record(self) -> Optional[Dict[str, Any]]:
+        """
+        The latest record decoded (once per version), or None.
+        """
+        latest = self.read()
+        if latest is None:
+            return None
+        decoded = self._decoded
+        if decoded is None or decoded[0] != latest[0]:
+            decoded = self._decoded = (latest[0], json.loads(latest[1]))
+        return decoded[1]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+streaming.py
+
+Streaming synthesis-to-playback. Audio chunks are written into a named pipe
+as the TTS service produces them, and the persistent player LOADs that pipe,
+so playback starts after the first chunk instead of after the whole file has
+been synthesized and written to disk. The streamed audio is collected in
+memory and handed back so the caller can store it in the audio cache once
+playback is under way.
+
+Time to first audio (request to the player reporting the stream started) is
+measured for every stream and reported in the log and in stats().
+"""
+
+import asyncio
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import metrics
+import playback
+
+logger = logging.getLogger("streaming")
+
+# How often to check whether the player has opened the pipe yet
+OPEN_POLL_SECONDS = 0.02
+
+TIME_TO_FIRST_AUDIO = metrics.histogram("announcer_stream_time_to_first_audio_seconds",
+                                        "Streamed announcements: synthesis request to audio starting")
+
+_stats_lock = threading.Lock()
+_stats = {
+    "streams": 0,
+    "failures": 0,
+    "last_first_chunk_ms": None,
+    "last_time_to_first_audio_ms": None,
+    "avg_time_to_first_audio_ms": None
+}
+_ttfa_total = 0.0
+_ttfa_count = 0
+
+
+def _open_writer(fifo_path: str, job: playback.PlaybackJob) -> Optional[int]:
+    """
+    Open the pipe for writing once the player has opened it for reading.
+    Returns None if the job finished (e.g. failed) before the player got to it.
+    """
+    while True:
+        try:
+            fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            if job.done():
+                return None
+            time.sleep(OPEN_POLL_SECONDS)
+            continue
+        os.set_blocking(fd, True)
+        return fd
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _record_start(job: playback.PlaybackJob, requested: float, first_chunk: float) -> None:
+    global _ttfa_total, _ttfa_count
+    with _stats_lock:
+        _stats["streams"] += 1
+        _stats["last_first_chunk_ms"] = first_chunk * 1000
+        if job.result and job.started_at is not None and job.start_latency is not None:
+            ttfa = job.started_at + job.start_latency - requested
+            _ttfa_total += ttfa
+            _ttfa_count += 1
+            _stats["last_time_to_first_audio_ms"] = ttfa * 1000
+            _stats["avg_time_to_first_audio_ms"] = _ttfa_total / _ttfa_count * 1000
+            TIME_TO_FIRST_AUDIO.observe(ttfa)
+            logger.info("Streamed announcement: first chunk after %.0f ms, time to first audio %.0f ms",
+                        first_chunk * 1000, ttfa * 1000)
+        else:
+            _stats["failures"] += 1
+
+
+async def stream_to_player(chunks: AsyncIterator[bytes], engine: playback.PlaybackEngine,
+                           requested: float, priority: int = playback.PRIORITY_INSTANT,
+                           on_status=None, timeout: Optional[float] = None
+                           ) -> Tuple[playback.PlaybackJob, Optional[bytes]]:
+    """
+    Play audio chunks as they arrive. requested is the time.monotonic() at which
+    synthesis was requested; chunks should already have produced their first
+    chunk (so a failing backend never occupies the player). Returns the playback
+    job and the complete audio, or None for the audio if the stream was cut short.
+    """
+    loop = asyncio.get_running_loop()
+    first_chunk = time.monotonic() - requested
+    directory = tempfile.mkdtemp(prefix="announce-stream-")
+    fifo_path = os.path.join(directory, "stream.mp3")
+    os.mkfifo(fifo_path)
+    job = engine.submit(fifo_path, cleanup=False, timeout=timeout, priority=priority,
+                        on_status=on_status, replayable=False)
+    job.add_done_callback(lambda finished: _record_start(finished, requested, first_chunk))
+    audio = bytearray()
+    complete = False
+    fd = None
+    try:
+        fd = await loop.run_in_executor(None, _open_writer, fifo_path, job)
+        if fd is None:
+            logger.error("Player never opened the stream for job %s", job.id)
+            return job, None
+        async for chunk in chunks:
+            audio += chunk
+            await loop.run_in_executor(None, _write_all, fd, chunk)
+        complete = True
+    except BrokenPipeError:
+        logger.warning("Player stopped reading stream for job %s", job.id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Streaming synthesis failed mid-announcement: %s", e, exc_info=True)
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+        if fd is not None:
+            os.close(fd)
+        # The player keeps its open handle; the pipe itself is no longer needed
+        shutil.rmtree(directory, ignore_errors=True)
+    return job, bytes(audio) if complete and audio else None
+
+
+def stats() -> Dict[str, Optional[float]]:
+    """
+    Return stream counts and time-to-first-audio figures.
+    """
+    with _stats_lock:
+        return dict(_stats)
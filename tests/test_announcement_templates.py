@@ -0,0 +1,29 @@
+"""
+Tests for announcement_templates validation and rendering.
+"""
+
+import pytest
+
+import announcement_templates
+
+COLORS = {'color1': {'color': 'Red'}, 'color2': {'color': 'Blue'}}
+
+
+def test_template_renders_with_and_without_a_rotation():
+    template = announcement_templates.compile_template('{color1} out, {next_color} next in {minutes_remaining} min')
+    assert template.render(announcement_templates.build_variables('1 PM', COLORS, 12)) == \
+        'Red out, Blue next in 12 min'
+    assert template.render(announcement_templates.build_variables('1 PM', None, None)) == \
+        'unknown out, unknown next in unknown min'
+
+
+@pytest.mark.parametrize('text', ['{minutes_remaining:02d} min', '{color1:d}', '{next_color:.1f}', '{bogus}', '{}'])
+def test_template_that_cannot_render_every_slot_is_rejected(text):
+    with pytest.raises(announcement_templates.TemplateError):
+        announcement_templates.compile_template(text)
+
+
+def test_format_spec_valid_for_fallback_values_is_accepted():
+    template = announcement_templates.compile_template('{color_count:d} colors, {color1:>8}')
+    assert template.render(announcement_templates.build_variables('1 PM', None, None)) == \
+        '0 colors,  unknown'
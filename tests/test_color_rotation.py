@@ -0,0 +1,165 @@
+"""
+Tests for color_rotation against an in-memory sqlite3 stand-in for the
+CenterEdge tables.
+"""
+
+import datetime
+import sqlite3
+
+import pytest
+
+import color_rotation
+
+RED, YELLOW, BLUE, GREEN, ORANGE = -65536, -256, -16711681, -16711936, -23296
+
+
+def make_db(shift_start="10:15:00", colors=(RED, YELLOW, BLUE, GREEN)):
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE applicationinfo (shiftdatechangetime TEXT)")
+    conn.execute("CREATE TABLE ticketprintergroupcolors (ticketprintergroupno INTEGER, color INTEGER, corder INTEGER)")
+    conn.execute("INSERT INTO applicationinfo VALUES (?)", (shift_start,))
+    set_colors(conn, colors)
+    # Another printer group must not leak into the rotation
+    conn.execute("INSERT INTO ticketprintergroupcolors VALUES (2, ?, 1)", (ORANGE,))
+    return conn
+
+
+def set_colors(conn, colors):
+    conn.execute("DELETE FROM ticketprintergroupcolors WHERE ticketprintergroupno = 1")
+    # Inserted out of order so corder, not rowid, decides the base order
+    for corder, color in reversed(list(enumerate(colors, start=1))):
+        conn.execute("INSERT INTO ticketprintergroupcolors VALUES (1, ?, ?)", (color, corder))
+
+
+def sql_colors(shift_start, colors, ts):
+    """
+    The rotation query's arithmetic: interval = DATEDIFF(MINUTE, shift_start, now) / 30 % T,
+    position = (ROW_NUMBER - 1 - interval + T) % T + 1.
+    """
+    total = len(colors)
+    minutes = (ts.hour * 60 + ts.minute) - (shift_start.hour * 60 + shift_start.minute)
+    if minutes < 0:
+        minutes += 24 * 60
+    interval = minutes // 30 % total
+    result = {}
+    for row_number, name in enumerate(colors, start=1):
+        position = (row_number - 1 - interval + total) % total + 1
+        result[f'color{position}'] = {'color': name, 'time': f'Interval {position}'}
+    return result
+
+
+def at(hour, minute):
+    return datetime.datetime(2026, 10, 16, hour, minute)
+
+
+def test_load_rotation_reads_shift_start_and_ordered_colors():
+    rotation = color_rotation.load_rotation(make_db(), placeholder="?")
+    assert rotation.shift_start == datetime.time(10, 15)
+    assert rotation.colors == ["Red", "Yellow", "Blue", "Green"]
+
+
+def test_load_rotation_requires_colors():
+    conn = make_db(colors=())
+    with pytest.raises(ValueError):
+        color_rotation.load_rotation(conn, placeholder="?")
+
+
+@pytest.mark.parametrize("shift_start", ["10:00:00", "10:15:00", "23:45:00"])
+def test_colors_at_matches_sql_every_minute(shift_start):
+    rotation = color_rotation.load_rotation(make_db(shift_start, (RED, YELLOW, BLUE, GREEN, ORANGE)), placeholder="?")
+    for minute in range(24 * 60):
+        ts = at(minute // 60, minute % 60)
+        assert rotation.colors_at(ts) == sql_colors(rotation.shift_start, rotation.colors, ts), ts
+
+
+def test_interval_wraps_before_shift_start():
+    rotation = color_rotation.ColorRotation(datetime.time(10, 15), ["Red", "Yellow", "Blue", "Green"])
+    # 10:14 is 1439 minutes after the previous day's shift start: interval 47 % 4
+    assert rotation.interval_at(at(10, 14)) == 3
+    assert rotation.interval_at(at(10, 15)) == 0
+    assert rotation.interval_at(at(0, 0)) == (13 * 60 + 45) // 30 % 4
+
+
+@pytest.mark.parametrize("before, after", [((10, 59), (11, 0)), ((11, 29), (11, 30))])
+def test_colors_advance_on_half_hour_boundaries(before, after):
+    rotation = color_rotation.ColorRotation(datetime.time(10, 0), ["Red", "Yellow", "Blue", "Green"])
+    assert rotation.interval_at(at(*after)) == rotation.interval_at(at(*before)) + 1
+    assert rotation.colors_at(at(*after))['color1']['color'] == rotation.colors_at(at(*before))['color2']['color']
+    assert rotation.minutes_until_rotation(at(*before)) == 1
+    assert rotation.minutes_until_rotation(at(*after)) == 30
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(color_rotation, "time", fake)
+    return fake
+
+
+def test_verify_mismatch_reloads_inputs(clock):
+    conn = make_db()
+    engine = color_rotation.RotationEngine(lambda fn: fn(conn), placeholder="?")
+    ts = at(12, 0)
+    assert engine.verify(ts, sql_colors(datetime.time(10, 15), ["Red", "Yellow", "Blue", "Green"], ts))
+    assert engine.mismatches == 0
+
+    set_colors(conn, (GREEN, BLUE, YELLOW, RED))
+    db_colors = sql_colors(datetime.time(10, 15), ["Green", "Blue", "Yellow", "Red"], ts)
+    assert not engine.verify(ts, db_colors)
+    assert engine.mismatches == 1
+    assert engine.rotation.colors == ["Green", "Blue", "Yellow", "Red"]
+    assert engine.colors_at(ts) == db_colors
+
+
+def test_verify_without_db_colors_does_not_reload(clock):
+    calls = []
+    engine = color_rotation.RotationEngine(lambda fn: calls.append(fn) or fn(make_db()), placeholder="?")
+    assert not engine.verify(at(12, 0), None)
+    assert calls == []
+
+
+def test_unreachable_database_backs_off(clock):
+    attempts = []
+
+    def run_query(fn):
+        attempts.append(clock.now)
+        raise ConnectionError("database unreachable")
+
+    engine = color_rotation.RotationEngine(run_query, placeholder="?")
+    assert engine.colors_at(at(12, 0)) is None
+    assert engine.colors_at(at(12, 0)) is None
+    assert len(attempts) == 1
+
+    clock.now += color_rotation.RETRY_SECONDS - 1
+    assert engine.colors_at(at(12, 0)) is None
+    assert len(attempts) == 1
+
+    clock.now += 1
+    assert engine.colors_at(at(12, 0)) is None
+    assert len(attempts) == 2
+
+
+def test_unreachable_database_keeps_previous_inputs(clock):
+    conn = make_db()
+    reachable = [True]
+
+    def run_query(fn):
+        if not reachable[0]:
+            raise ConnectionError("database unreachable")
+        return fn(conn)
+
+    changes = []
+    engine = color_rotation.RotationEngine(run_query, placeholder="?", on_change=changes.append)
+    loaded = engine.refresh()
+    reachable[0] = False
+    assert engine.refresh() is loaded
+    assert engine.colors_at(at(12, 0)) == loaded.colors_at(at(12, 0))
+    assert len(changes) == 1
@@ -0,0 +1,52 @@
+"""
+Tests for config_store snapshot caching.
+"""
+
+import contextlib
+import os
+
+import config_store
+
+
+def write_atomic(path, text):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def test_reload_after_atomic_replace(tmp_path):
+    path = str(tmp_path / "fri.ini")
+    write_atomic(path, "[times]\n10:00 = hour\n")
+    assert dict(config_store.load(path).section("times")) == {"10:00": "hour"}
+    write_atomic(path, "[times]\n11:00 = hour\n")
+    assert dict(config_store.load(path).section("times")) == {"11:00": "hour"}
+
+
+def test_replace_during_read_is_not_cached_under_new_identity(tmp_path, monkeypatch):
+    path = str(tmp_path / "fri.ini")
+    write_atomic(path, "[times]\n10:00 = hour\n")
+    original = config_store.locked_file
+
+    class ReplacedAfterRead:
+        def __init__(self, f):
+            self.f = f
+
+        def read(self):
+            text = self.f.read()
+            # The web interface replaces the file while the reader still holds its lock
+            write_atomic(path, "[times]\n11:00 = hour\n")
+            return text
+
+        def fileno(self):
+            return self.f.fileno()
+
+    @contextlib.contextmanager
+    def replaced_after_read(filepath, mode="r", lock_type=None):
+        with original(filepath, mode) as f:
+            yield ReplacedAfterRead(f)
+
+    monkeypatch.setattr(config_store, "locked_file", replaced_after_read)
+    assert dict(config_store.load(path).section("times")) == {"10:00": "hour"}
+    monkeypatch.setattr(config_store, "locked_file", original)
+    assert dict(config_store.load(path).section("times")) == {"11:00": "hour"}
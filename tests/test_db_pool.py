@@ -0,0 +1,185 @@
+"""
+Tests for db_pool.ConnectionPool against a fake DB-API connection.
+"""
+
+import pytest
+
+import db_pool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise ConnectionError("connection reset")
+        self.conn.queries.append(query)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    """
+    Connection factory that records every connection it opens.
+    """
+    def __init__(self):
+        self.connections = []
+        self.reachable = True
+
+    def connect(self):
+        if not self.reachable:
+            raise ConnectionError("database unreachable")
+        conn = FakeConnection(len(self.connections) + 1)
+        self.connections.append(conn)
+        return conn
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def query(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT color FROM ticketprintergroupcolors")
+        return conn.number
+    finally:
+        cursor.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(db_pool, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+def test_connection_is_returned_and_reused(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    assert pool.run(query) == 1
+    assert pool.run(query) == 1
+    assert len(db.connections) == 1
+    assert pool.stats()["idle"] == 1
+    assert not pool.stats()["degraded"]
+
+
+def test_broken_connection_is_discarded_and_retried_once(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    pool.run(query)
+    db.connections[0].broken = True
+    assert pool.run(query) == 2
+    assert db.connections[0].closed
+    assert pool.stats()["query_failures"] == 1
+    assert pool.stats()["idle"] == 1
+    assert pool.run(query) == 2
+
+
+def test_failure_on_fresh_connection_raises_and_degrades(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+
+    def failing(conn):
+        raise ConnectionError("query failed")
+
+    with pytest.raises(ConnectionError):
+        pool.run(failing)
+    assert len(db.connections) == 2
+    assert all(conn.closed for conn in db.connections)
+    assert pool.degraded
+    clock.now += db_pool.RECOVERY_BACKOFF_SECONDS + 1
+    assert not pool.degraded
+
+
+def test_unreachable_database_is_not_retried(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    db.reachable = False
+    with pytest.raises(ConnectionError):
+        pool.run(query)
+    assert pool.stats()["connect_failures"] == 1
+    assert pool.degraded
+    db.reachable = True
+    assert pool.run(query) == 1
+    assert not pool.degraded
+
+
+def test_idle_connection_is_pinged_before_reuse(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    pool.run(query)
+    clock.now += db_pool.PING_AFTER_SECONDS + 1
+    assert pool.run(query) == 1
+    assert db.connections[0].queries[-2] == pool.ping_query
+    assert pool.stats()["pings"] == 1
+
+
+def test_connection_failing_ping_is_replaced(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    pool.run(query)
+    db.connections[0].broken = True
+    clock.now += db_pool.PING_AFTER_SECONDS + 1
+    assert pool.run(query) == 2
+    assert db.connections[0].closed
+    assert pool.stats()["ping_failures"] == 1
+    # A failed ping is not a failed query
+    assert pool.stats()["query_failures"] == 0
+
+
+def test_stale_idle_connection_is_closed_without_ping(db, clock):
+    pool = db_pool.ConnectionPool(db.connect)
+    pool.run(query)
+    clock.now += db_pool.MAX_IDLE_SECONDS + 1
+    assert pool.run(query) == 2
+    assert db.connections[0].closed
+    assert pool.stats()["pings"] == 0
+
+
+def test_exhausted_pool_opens_extra_connections_and_keeps_size_idle(db, clock):
+    pool = db_pool.ConnectionPool(db.connect, size=1)
+
+    def nested(conn):
+        # Every pooled connection is checked out while this one is in use
+        return conn.number, pool.run(query)
+
+    assert pool.run(nested) == (1, 2)
+    assert len(db.connections) == 2
+    assert pool.stats()["idle"] == 1
+    # The connection released last does not fit and is closed
+    assert [conn.closed for conn in db.connections] == [True, False]
+    assert pool.run(query) == 2
+
+
+def test_close_closes_idle_connections(db, clock):
+    pool = db_pool.ConnectionPool(db.connect, size=2)
+    pool.run(lambda conn: pool.run(query))
+    pool.close()
+    assert pool.stats()["idle"] == 0
+    assert all(conn.closed for conn in db.connections)
@@ -0,0 +1,68 @@
+"""
+Tests for playback.PlaybackEngine shutdown with the fake sink.
+"""
+
+import time
+
+import playback
+
+
+def make_files(tmp_path, count):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"{index}.mp3"
+        path.write_bytes(b"\xff\xfb")
+        paths.append(str(path))
+    return paths
+
+
+def test_close_plays_queued_jobs_before_closing_the_sink(tmp_path):
+    sink = playback.FakeSink(duration=0.02)
+    engine = playback.PlaybackEngine(sink)
+    jobs = [engine.submit(path) for path in make_files(tmp_path, 3)]
+    engine.close()
+    assert [job.status for job in jobs] == ["done"] * 3
+    assert len(sink.played) == 3
+
+
+def test_close_abandons_jobs_left_after_the_timeout(tmp_path):
+    sink = playback.FakeSink(duration=0.3)
+    engine = playback.PlaybackEngine(sink)
+    paths = make_files(tmp_path, 3)
+    jobs = [engine.submit(path, cleanup=True) for path in paths]
+    engine.close(timeout=0.05)
+    assert jobs[0].wait(1.0) is False
+    assert [job.status for job in jobs[1:]] == ["failed", "failed"]
+    assert jobs[2].error == "playback shut down"
+    assert not any(tmp_path.joinpath(name).exists() for name in ("1.mp3", "2.mp3"))
+    assert sink.played == paths[:1]
+
+
+def test_urgent_job_preempts_and_replays_rules(tmp_path):
+    sink = playback.FakeSink(duration=0.3)
+    engine = playback.PlaybackEngine(sink)
+    rules_path, hour_path = make_files(tmp_path, 2)
+    rules = engine.submit(rules_path, priority=playback.PRIORITY_RULES)
+    deadline = time.monotonic() + 1.0
+    while rules.status != "playing" and time.monotonic() < deadline:
+        time.sleep(0.005)
+    hour = engine.submit(hour_path, priority=playback.PRIORITY_HOUR)
+    assert hour.wait(2.0) and rules.wait(2.0)
+    assert sink.played == [rules_path, hour_path, rules_path]
+    assert engine.stats()["preemptions"] == 1
+    engine.close()
+
+
+def test_preemption_never_stops_a_job_started_after_the_check(tmp_path, monkeypatch):
+    sink = playback.FakeSink(duration=0.05)
+    engine = playback.PlaybackEngine(sink)
+    rules_path, hour_path = make_files(tmp_path, 2)
+    stops = []
+    monkeypatch.setattr(sink, "stop", lambda: stops.append(engine._current))
+    rules = engine.submit(rules_path, priority=playback.PRIORITY_RULES)
+    assert rules.wait(1.0)
+    # The rules job has finished; an urgent job must play out in full
+    hour = engine.submit(hour_path, priority=playback.PRIORITY_HOUR)
+    assert hour.wait(1.0)
+    assert stops == []
+    engine.close()
@@ -0,0 +1,101 @@
+"""
+Tests for tts_backends.FailoverBackend using the fake TTS backend.
+"""
+
+import asyncio
+
+import pytest
+
+import tts_backends
+import tts_pool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def fake(name, **options):
+    backend = tts_pool.FakeTTSBackend(latency=0.0, seed=1, **options)
+    backend.name = name
+    return backend
+
+
+def synthesize(failover, path):
+    return asyncio.run(failover("Red wristbands, your time is up", "en-US", str(path)))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(tts_backends, "time", fake_clock)
+    return fake_clock
+
+
+def test_first_backend_is_used_while_it_works(tmp_path, clock):
+    primary, secondary = fake("primary"), fake("secondary")
+    failover = tts_backends.FailoverBackend([primary, secondary])
+    assert synthesize(failover, tmp_path / "a.mp3") == "primary"
+    assert (primary.calls, secondary.calls) == (1, 0)
+
+
+def test_failing_backend_falls_over_and_recovers(tmp_path, clock):
+    primary, secondary = fake("primary", failure_rate=1.0), fake("secondary")
+    failover = tts_backends.FailoverBackend([primary, secondary], cooldown=60)
+
+    assert synthesize(failover, tmp_path / "a.mp3") == "secondary"
+    assert (primary.calls, secondary.calls) == (1, 1)
+    assert (tmp_path / "a.mp3").exists()
+    stats = failover.stats()
+    assert stats["primary"]["failures"] == 1
+    assert stats["primary"]["cooling_down"]
+    assert stats["secondary"]["successes"] == 1
+
+    # While it cools down the failed backend is tried last
+    assert [backend.name for backend in failover.ordered()] == ["secondary", "primary"]
+    assert synthesize(failover, tmp_path / "b.mp3") == "secondary"
+    assert primary.calls == 1
+
+    # Once the cool-down has passed it is preferred again
+    primary.failure_rate = 0.0
+    clock.now += 61
+    assert [backend.name for backend in failover.ordered()] == ["primary", "secondary"]
+    assert synthesize(failover, tmp_path / "c.mp3") == "primary"
+    assert not failover.stats()["primary"]["cooling_down"]
+
+
+def test_cooling_backend_is_still_tried_when_the_others_fail(tmp_path, clock):
+    primary, secondary = fake("primary", failure_rate=1.0), fake("secondary")
+    failover = tts_backends.FailoverBackend([primary, secondary])
+    synthesize(failover, tmp_path / "a.mp3")
+    secondary.failure_rate = 1.0
+    primary.failure_rate = 0.0
+    assert synthesize(failover, tmp_path / "b.mp3") == "primary"
+    assert (primary.calls, secondary.calls) == (2, 2)
+
+
+def test_every_backend_failing_returns_false(tmp_path, clock):
+    failover = tts_backends.FailoverBackend([fake("primary", failure_rate=1.0),
+                                            fake("secondary", failure_rate=1.0)])
+    assert synthesize(failover, tmp_path / "a.mp3") is False
+    assert not (tmp_path / "a.mp3").exists()
+
+
+def test_stalled_backend_times_out_to_the_next(tmp_path, clock):
+    primary = fake("primary", stall_rate=1.0, stall_seconds=5.0)
+    secondary = fake("secondary")
+    failover = tts_backends.FailoverBackend([primary, secondary], attempt_timeout=0.05)
+    assert synthesize(failover, tmp_path / "a.mp3") == "secondary"
+    assert failover.stats()["primary"]["last_error"] == "timeout"
+
+
+def test_latency_selection_prefers_the_fastest_backend(tmp_path, clock):
+    slow, quick = fake("slow"), fake("quick")
+    failover = tts_backends.FailoverBackend([slow, quick], selection="latency")
+    failover._record("slow", True, 2.0)
+    failover._record("quick", True, 0.5)
+    assert [backend.name for backend in failover.ordered()] == ["quick", "slow"]
+    assert synthesize(failover, tmp_path / "a.mp3") == "quick"
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+timing.py
+
+On-time playback for scheduled announcements. The announcer waits for each slot
+on the event loop's monotonic clock so wall-clock adjustments cannot stretch or
+shorten the wait. The player's start-up latency (and the synthesis time) are
+learned as moving averages, and playback is started early by the learned
+start-up offset so the first word lands on the scheduled second.
+
+Every scheduled announcement records its lateness (audio start minus the
+scheduled time) in a histogram that is persisted to timing_stats.json, where
+the web interface can read it.
+"""
+
+import bisect
+import collections
+import json
+import logging
+import os
+import threading
+from typing import Any, Deque, Dict, Optional
+
+import metrics
+
+logger = logging.getLogger("timing")
+
+DEFAULT_STATS_FILE = "timing_stats.json"
+# Upper bounds (ms) of the lateness histogram buckets; negative means early
+LATENESS_BUCKETS_MS = (-1000, -500, -250, -100, -50, -20, 20, 50, 100, 250, 500, 1000, 2500, 5000)
+# Weight of the newest sample in the learned latencies
+EWMA_ALPHA = 0.2
+# Never start playback more than this far ahead of the slot
+MAX_START_OFFSET_SECONDS = 5.0
+RECENT_SAMPLES = 50
+
+LATENESS_SECONDS = metrics.histogram("announcer_schedule_lateness_seconds",
+                                     "Audio start of scheduled announcements relative to the slot (negative is early)",
+                                     buckets=[bound / 1000 for bound in LATENESS_BUCKETS_MS])
+
+
+class LatencyEstimate:
+    """
+    Exponentially weighted moving average of a latency in seconds.
+    """
+    def __init__(self, alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self.samples = 0
+
+    def update(self, seconds: float) -> None:
+        if self.value is None:
+            self.value = seconds
+        else:
+            self.value += self.alpha * (seconds - self.value)
+        self.samples += 1
+
+    def get(self, default: float = 0.0) -> float:
+        return self.value if self.value is not None else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seconds": self.value, "samples": self.samples}
+
+    def load(self, data: Dict[str, Any]) -> None:
+        self.value = data.get("seconds")
+        self.samples = int(data.get("samples", 0))
+
+
+class LatenessHistogram:
+    """
+    Bucketed lateness of announcements in milliseconds.
+    """
+    def __init__(self, buckets=LATENESS_BUCKETS_MS):
+        self.buckets = list(buckets)
+        # One extra bucket for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms: Optional[float] = None
+        self.min_ms: Optional[float] = None
+
+    def observe(self, lateness_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, lateness_ms)] += 1
+        self.count += 1
+        self.total_ms += lateness_ms
+        self.max_ms = lateness_ms if self.max_ms is None else max(self.max_ms, lateness_ms)
+        self.min_ms = lateness_ms if self.min_ms is None else min(self.min_ms, lateness_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "min_ms": self.min_ms,
+            "max_ms": self.max_ms
+        }
+
+    def load(self, data: Dict[str, Any]) -> None:
+        counts = list(data.get("buckets", {}).values())
+        if len(counts) == len(self.counts):
+            self.counts = [int(c) for c in counts]
+        self.count = int(data.get("count", sum(self.counts)))
+        mean = data.get("mean_ms")
+        self.total_ms = mean * self.count if mean is not None else 0.0
+        self.min_ms = data.get("min_ms")
+        self.max_ms = data.get("max_ms")
+
+
+class TimingTracker:
+    """
+    Learns playback and synthesis latency and records announcement lateness.
+    """
+    def __init__(self, stats_path: str = DEFAULT_STATS_FILE):
+        self.stats_path = stats_path
+        self.start_latency = LatencyEstimate()
+        self.synthesis = LatencyEstimate()
+        self.histogram = LatenessHistogram()
+        self.recent: Deque[Dict[str, Any]] = collections.deque(maxlen=RECENT_SAMPLES)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        data = load_stats(self.stats_path)
+        if not data:
+            return
+        try:
+            self.start_latency.load(data.get("start_latency", {}))
+            self.synthesis.load(data.get("synthesis", {}))
+            self.histogram.load(data.get("lateness", {}))
+            self.recent.extend(data.get("recent", []))
+            logger.info("Loaded timing stats: start offset %.0f ms from %s announcements",
+                        self.start_offset() * 1000, self.start_latency.samples)
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.warning("Ignoring malformed timing stats %s: %s", self.stats_path, e)
+
+    def start_offset(self) -> float:
+        """
+        Seconds to start playback ahead of the slot so audio begins on time.
+        """
+        with self._lock:
+            return min(max(self.start_latency.get(), 0.0), MAX_START_OFFSET_SECONDS)
+
+    def record_synthesis(self, seconds: float) -> None:
+        with self._lock:
+            self.synthesis.update(seconds)
+
+    def record_playback(self, slot: str, announcement_type: str, deadline: float,
+                        started_at: Optional[float], start_latency: Optional[float]) -> Optional[float]:
+        """
+        Record an announcement scheduled for the monotonic deadline whose player
+        was started at started_at. Returns the lateness in milliseconds.
+        """
+        if started_at is None or start_latency is None:
+            return None
+        lateness_ms = (started_at + start_latency - deadline) * 1000
+        LATENESS_SECONDS.observe(lateness_ms / 1000)
+        with self._lock:
+            self.start_latency.update(start_latency)
+            self.histogram.observe(lateness_ms)
+            self.recent.append({
+                "slot": slot,
+                "type": announcement_type,
+                "lateness_ms": round(lateness_ms, 1),
+                "start_latency_ms": round(start_latency * 1000, 1)
+            })
+        self.save()
+        return lateness_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "start_offset_ms": min(max(self.start_latency.get(), 0.0), MAX_START_OFFSET_SECONDS) * 1000,
+                "start_latency": self.start_latency.to_dict(),
+                "synthesis": self.synthesis.to_dict(),
+                "lateness": self.histogram.to_dict(),
+                "recent": list(self.recent)
+            }
+
+    def save(self) -> None:
+        temp_path = f"{self.stats_path}.tmp-{os.getpid()}"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self.stats(), f, indent=2)
+            os.replace(temp_path, self.stats_path)
+        except OSError as e:
+            logger.warning("Could not write timing stats: %s", e)
+
+
+def load_stats(path: str = DEFAULT_STATS_FILE) -> Optional[Dict[str, Any]]:
+    """
+    Read the persisted timing stats, or None if none have been recorded.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read timing stats %s: %s", path, e)
+        return None
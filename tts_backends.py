@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+tts_backends.py
+
+Pluggable text-to-speech backends. Every backend is an async callable
+backend(text, voice_id, output_path) -> bool that writes MP3 audio, so the
+audio cache, fragment assembly and the mpg123 player work unchanged.
+
+- EdgeBackend: Microsoft Edge online TTS (edge_tts); needs network access.
+- EspeakBackend: local offline engine (espeak-ng) encoded to MP3 with lame or
+  ffmpeg; lower quality, but keeps the rink announcing without internet.
+- FailoverBackend: tries backends in order (or fastest first) and skips a
+  backend for a cool-down period after it fails.
+
+Backends that can also stream audio chunks as they are produced (edge and
+fake) expose stream(text, voice_id), an async iterator of MP3 bytes.
+
+Backends are configured from the [tts] section of the day INI, e.g.
+    backends = edge, espeak
+    backend_selection = order      (or: latency)
+    backend_timeout = 8
+    espeak_voice = en-us
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import tts_pool
+
+try:
+    import edge_tts
+except ImportError:
+    edge_tts = None
+
+logger = logging.getLogger("tts_backends")
+
+DEFAULT_BACKENDS = "edge"
+DEFAULT_ESPEAK_VOICE = "en-us"
+# Each backend gets this long before the next one is tried
+DEFAULT_ATTEMPT_TIMEOUT_SECONDS = 8.0
+# A failed backend is skipped for this long before being tried again
+FAILURE_COOLDOWN_SECONDS = 60.0
+# Weight of the newest sample in each backend's latency average
+LATENCY_EWMA_ALPHA = 0.2
+SELECTION_MODES = ("order", "latency")
+
+BACKEND_SECONDS = metrics.histogram("announcer_tts_backend_attempt_seconds",
+                                    "Synthesis attempts per TTS backend by outcome", ["backend", "result"])
+
+
+class EdgeBackend:
+    """
+    Microsoft Edge online neural voices.
+    """
+    name = "edge"
+
+    def available(self) -> bool:
+        return edge_tts is not None
+
+    async def __call__(self, text: str, voice_id: str, output_path: str) -> bool:
+        if edge_tts is None:
+            logger.error("edge_tts is not installed")
+            return False
+        try:
+            logger.info("Synthesizing speech (first 50 chars): %s...", text[:50])
+            communicate = edge_tts.Communicate(text, voice_id)
+            await communicate.save(output_path)
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                logger.info("Speech synthesis successful")
+                return True
+            else:
+                logger.error("Speech synthesis failed – output file empty or missing")
+                return False
+        except Exception as e:
+            logger.error("Error during speech synthesis: %s", e, exc_info=True)
+            return False
+
+    async def stream(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """
+        Yield MP3 audio chunks as the service produces them.
+        """
+        if edge_tts is None:
+            raise RuntimeError("edge_tts is not installed")
+        logger.info("Streaming speech (first 50 chars): %s...", text[:50])
+        communicate = edge_tts.Communicate(text, voice_id)
+        async for chunk in communicate.stream():
+            if chunk.get("type") == "audio" and chunk.get("data"):
+                yield chunk["data"]
+
+
+class EspeakBackend:
+    """
+    Offline espeak-ng synthesis, piped through lame (or ffmpeg) to produce MP3.
+    """
+    name = "espeak"
+
+    def __init__(self, voice: str = DEFAULT_ESPEAK_VOICE, binary: Optional[str] = None):
+        self.voice = voice
+        self.binary = binary or shutil.which("espeak-ng") or shutil.which("espeak")
+        self.encoder = shutil.which("lame") or shutil.which("ffmpeg")
+
+    def available(self) -> bool:
+        return self.binary is not None and self.encoder is not None
+
+    def _encoder_command(self, output_path: str) -> List[str]:
+        if os.path.basename(self.encoder).startswith("ffmpeg"):
+            return [self.encoder, "-loglevel", "error", "-y", "-f", "wav", "-i", "pipe:0",
+                    "-codec:a", "libmp3lame", "-b:a", "64k", "-f", "mp3", output_path]
+        return [self.encoder, "--quiet", "-b", "64", "-", output_path]
+
+    async def __call__(self, text: str, voice_id: str, output_path: str) -> bool:
+        # Online voice ids (e.g. en-US-GuyNeural) mean nothing to espeak; use the configured voice
+        if not self.available():
+            logger.error("Offline TTS unavailable: espeak-ng and lame or ffmpeg are required")
+            return False
+        logger.info("Synthesizing speech offline with %s (first 50 chars): %s...",
+                    os.path.basename(self.binary), text[:50])
+        speak = encode = None
+        try:
+            speak = await asyncio.create_subprocess_exec(
+                self.binary, "-v", self.voice, "--stdout", text,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            wav, speak_err = await speak.communicate()
+            if speak.returncode != 0 or not wav:
+                logger.error("espeak failed (%s): %s", speak.returncode, speak_err.decode(errors='replace').strip())
+                return False
+            encode = await asyncio.create_subprocess_exec(
+                *self._encoder_command(output_path),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+            _, encode_err = await encode.communicate(wav)
+            if encode.returncode != 0:
+                logger.error("MP3 encoding failed (%s): %s",
+                             encode.returncode, encode_err.decode(errors='replace').strip())
+                return False
+        except asyncio.CancelledError:
+            for proc in (speak, encode):
+                if proc is not None and proc.returncode is None:
+                    proc.kill()
+            raise
+        except OSError as e:
+            logger.error("Error during offline speech synthesis: %s", e, exc_info=True)
+            return False
+        return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+
+class _BackendState:
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+
+class FailoverBackend:
+    """
+    Tries each backend in turn until one produces audio. Returns the name of
+    the backend that succeeded (truthy) or False if all of them failed.
+    """
+    def __init__(self, backends: List[Callable[[str, str, str], Awaitable[bool]]],
+                 selection: str = "order", cooldown: float = FAILURE_COOLDOWN_SECONDS,
+                 attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT_SECONDS):
+        self.backends = backends
+        self.attempt_timeout = attempt_timeout
+        self.selection = selection if selection in SELECTION_MODES else "order"
+        self.cooldown = cooldown
+        self.primary = backends[0].name if backends else None
+        self._state: Dict[str, _BackendState] = {backend.name: _BackendState() for backend in backends}
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return "+".join(backend.name for backend in self.backends)
+
+    def ordered(self) -> List[Callable[[str, str, str], Awaitable[bool]]]:
+        """
+        Return the backends in the order they should be tried.
+        Backends cooling down after a failure go last.
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = dict(self._state)
+        position = {backend.name: index for index, backend in enumerate(self.backends)}
+
+        def sort_key(backend):
+            state = states[backend.name]
+            cooling = state.cooldown_until > now
+            if self.selection == "latency" and state.latency is not None:
+                # Measured backends, fastest first, ahead of ones never measured
+                return (cooling, 0, state.latency, position[backend.name])
+            return (cooling, 1 if self.selection == "latency" else 0, 0.0, position[backend.name])
+        return sorted(self.backends, key=sort_key)
+
+    def _record(self, name: str, ok: bool, elapsed: float, error: Optional[str] = None) -> None:
+        BACKEND_SECONDS.observe(elapsed, backend=name, result="ok" if ok else "failed")
+        with self._lock:
+            state = self._state[name]
+            if ok:
+                state.successes += 1
+                state.cooldown_until = 0.0
+                if state.latency is None:
+                    state.latency = elapsed
+                else:
+                    state.latency += LATENCY_EWMA_ALPHA * (elapsed - state.latency)
+            else:
+                state.failures += 1
+                state.last_error = error
+                state.cooldown_until = time.monotonic() + self.cooldown
+
+    async def __call__(self, text: str, voice_id: str, output_path: str) -> tts_pool.BackendResult:
+        for backend in self.ordered():
+            started = time.monotonic()
+            try:
+                ok = await asyncio.wait_for(backend(text, voice_id, output_path), self.attempt_timeout)
+                error = None if ok else "synthesis failed"
+            except asyncio.TimeoutError:
+                logger.error("TTS backend %s timed out after %.1fs", backend.name, self.attempt_timeout)
+                ok, error = False, "timeout"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("TTS backend %s raised: %s", backend.name, e, exc_info=True)
+                ok, error = False, str(e)
+            self._record(backend.name, ok, time.monotonic() - started, error)
+            if ok:
+                if backend.name != self.primary:
+                    logger.warning("Announcement synthesized by fallback TTS backend '%s'", backend.name)
+                return backend.name
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            logger.warning("TTS backend %s failed; trying the next backend", backend.name)
+        logger.error("Every TTS backend failed")
+        return False
+
+    async def open_stream(self, text: str, voice_id: str) -> Tuple[str, AsyncIterator[bytes]]:
+        """
+        Start streaming text from the first streaming-capable backend that
+        produces audio. Returns (backend name, chunk iterator); the first chunk
+        has already arrived. Raises RuntimeError if no backend could stream.
+        """
+        for backend in self.ordered():
+            if not hasattr(backend, "stream"):
+                continue
+            started = time.monotonic()
+            chunks = backend.stream(text, voice_id).__aiter__()
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), self.attempt_timeout)
+            except asyncio.CancelledError:
+                await chunks.aclose()
+                raise
+            except Exception as e:
+                await chunks.aclose()
+                error = "timeout" if isinstance(e, asyncio.TimeoutError) else (str(e) or "no audio")
+                logger.warning("TTS backend %s could not stream (%s); trying the next backend", backend.name, error)
+                self._record(backend.name, False, time.monotonic() - started, error)
+                continue
+            self._record(backend.name, True, time.monotonic() - started)
+            return backend.name, _prepend(first, chunks)
+        raise RuntimeError("No TTS backend could stream audio")
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """
+        Return per-backend success, failure, latency and cool-down figures.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    "successes": state.successes,
+                    "failures": state.failures,
+                    "avg_latency": state.latency,
+                    "cooling_down": state.cooldown_until > now,
+                    "last_error": state.last_error
+                }
+                for name, state in self._state.items()
+            }
+
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+def create_backend(name: str, tts: Dict[str, str]):
+    """
+    Build a single backend by name: 'edge', 'espeak' (alias 'espeak-ng') or 'fake'.
+    """
+    name = name.strip().lower()
+    if name == "edge":
+        return EdgeBackend()
+    if name in ("espeak", "espeak-ng"):
+        return EspeakBackend(tts.get("espeak_voice") or DEFAULT_ESPEAK_VOICE)
+    if name == "fake":
+        return tts_pool.FakeTTSBackend()
+    raise ValueError(f"Unknown TTS backend: {name}")
+
+
+def create_failover(tts: Dict[str, str]) -> FailoverBackend:
+    """
+    Build the failover chain from the [tts] `backends` list.
+    Unknown or unavailable backends are skipped with a warning.
+    """
+    backends = []
+    for name in (tts.get("backends") or DEFAULT_BACKENDS).split(","):
+        if not name.strip():
+            continue
+        try:
+            backend = create_backend(name, tts)
+        except ValueError as e:
+            logger.warning(str(e))
+            continue
+        if hasattr(backend, "available") and not backend.available():
+            logger.warning("TTS backend '%s' is not available on this system; skipping it", backend.name)
+            continue
+        backends.append(backend)
+    if not backends:
+        logger.error("No usable TTS backend configured; falling back to edge")
+        backends.append(EdgeBackend())
+    selection = (tts.get("backend_selection") or "order").strip().lower()
+    if selection not in SELECTION_MODES:
+        logger.warning("Unknown backend_selection '%s'; using 'order'", selection)
+    try:
+        attempt_timeout = float(tts.get("backend_timeout", DEFAULT_ATTEMPT_TIMEOUT_SECONDS))
+    except ValueError:
+        logger.warning("Invalid backend_timeout in configuration; using default")
+        attempt_timeout = DEFAULT_ATTEMPT_TIMEOUT_SECONDS
+    return FailoverBackend(backends, selection, attempt_timeout=attempt_timeout)
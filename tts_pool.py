@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+tts_pool.py
+
+Bounded, deadline-aware speech synthesis. Requests run concurrently on the
+caller's event loop, at most `concurrency` at a time, and each one is given up
+after its deadline so a stalled TTS request cannot hold up an announcement.
+Optionally a second (hedged) request is fired when the first has not finished
+within a threshold; whichever succeeds first wins and the other is cancelled.
+Each request is hedged at most once, so hedges can at most double the load.
+
+A backend is any coroutine function backend(text, voice_id, output_path) that
+returns a truthy value (True, or the name of the engine used) on success.
+FakeTTSBackend is a local stand-in that injects latency, stalls and failures.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import metrics
+
+logger = logging.getLogger("tts_pool")
+
+BackendResult = Union[bool, str]
+Backend = Callable[[str, str, str], Awaitable[BackendResult]]
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT_SECONDS = 20.0
+# 0 disables hedging
+DEFAULT_HEDGE_AFTER_SECONDS = 0.0
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz), about 26 ms of audio
+SILENT_MP3_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+# Frames per chunk when the fake backend streams
+STREAM_CHUNK_FRAMES = 8
+
+SYNTHESIS_SECONDS = metrics.histogram("announcer_tts_synthesis_seconds",
+                                      "Speech synthesis requests by outcome (ok, failed, timeout)", ["result"])
+HEDGES = metrics.counter("announcer_tts_hedged_requests_total", "Hedged second synthesis requests sent")
+HEDGE_WINS = metrics.counter("announcer_tts_hedge_wins_total", "Synthesis requests won by the hedged request")
+
+
+class FakeTTSBackend:
+    """
+    Local TTS stand-in that writes silent MP3 audio after a configurable delay.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 stall_rate: float = 0.0, stall_seconds: float = 60.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    async def __call__(self, text: str, voice_id: str, output_path: str) -> bool:
+        self.calls += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self._random.random() < self.stall_rate:
+            delay = self.stall_seconds
+        await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            logger.error("Fake TTS backend injected a synthesis failure")
+            return False
+        # Roughly one frame per two characters so longer texts produce longer audio
+        with open(output_path, "wb") as f:
+            f.write(SILENT_MP3_FRAME * max(1, len(text) // 2))
+        return True
+
+    async def stream(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """
+        Yield the same silent audio in chunks, as a streaming service would.
+        """
+        self.calls += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self._random.random() < self.stall_rate:
+            delay = self.stall_seconds
+        await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            raise RuntimeError("Fake TTS backend injected a streaming failure")
+        frames = max(1, len(text) // 2)
+        for start in range(0, frames, STREAM_CHUNK_FRAMES):
+            yield SILENT_MP3_FRAME * min(STREAM_CHUNK_FRAMES, frames - start)
+            await asyncio.sleep(0)
+
+
+class SynthesisPool:
+    """
+    Runs synthesis requests with bounded concurrency, deadlines and optional hedging.
+    """
+    def __init__(self, backend: Backend, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                 hedge_after: float = DEFAULT_HEDGE_AFTER_SECONDS):
+        self.backend = backend
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latency_total = 0.0
+        self._attempt_ids = itertools.count(1)
+        # Semaphores are bound to an event loop, so keep one per loop
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(id(loop))
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.concurrency)
+                self._semaphores[id(loop)] = semaphore
+        return semaphore
+
+    async def _attempt(self, text: str, voice_id: str, output_path: str,
+                       hedge: bool = False) -> Tuple[BackendResult, str]:
+        attempt_path = f"{output_path}.a{next(self._attempt_ids)}"
+        try:
+            if hedge:
+                # Hedges skip the queue: stalled requests may be what is holding every slot
+                ok = await self.backend(text, voice_id, attempt_path)
+            else:
+                async with self._semaphore():
+                    ok = await self.backend(text, voice_id, attempt_path)
+        except asyncio.CancelledError:
+            _remove(attempt_path)
+            raise
+        except Exception as e:
+            logger.error("Speech synthesis attempt failed: %s", e, exc_info=True)
+            ok = False
+        if ok and (not os.path.exists(attempt_path) or os.path.getsize(attempt_path) == 0):
+            ok = False
+        if not ok:
+            _remove(attempt_path)
+        return ok, attempt_path
+
+    async def synthesize(self, text: str, voice_id: str, output_path: str,
+                         timeout: Optional[float] = None, hedge_after: Optional[float] = None) -> BackendResult:
+        """
+        Synthesize text into output_path. Returns the winning attempt's backend
+        result, or False on failure or when the deadline passes; a hedged second
+        request is started after hedge_after seconds.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        started = loop.time()
+        deadline = started + timeout
+        with self._lock:
+            self.requests += 1
+        tasks = [loop.create_task(self._attempt(text, voice_id, output_path))]
+        hedged = False
+        hedge_task: Optional[asyncio.Task] = None
+        winner: Optional[asyncio.Task] = None
+        try:
+            while tasks and winner is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wait_for = remaining
+                if hedge_after > 0 and not hedged:
+                    wait_for = min(remaining, max(0.0, started + hedge_after - loop.time()))
+                done, _ = await asyncio.wait(tasks, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.result()[0] and winner is None:
+                        winner = task
+                if winner is None and hedge_after > 0 and not hedged and loop.time() - started >= hedge_after:
+                    # The first request is slow (or already failed); race a second one against it
+                    hedged = True
+                    with self._lock:
+                        self.hedges += 1
+                    HEDGES.inc()
+                    logger.warning("Speech synthesis slower than %.1fs; sending a hedged request", hedge_after)
+                    hedge_task = loop.create_task(self._attempt(text, voice_id, output_path, hedge=True))
+                    tasks.append(hedge_task)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        elapsed = loop.time() - started
+        if winner is None:
+            timed_out = loop.time() >= deadline
+            with self._lock:
+                self.failures += 1
+                if timed_out:
+                    self.timeouts += 1
+            SYNTHESIS_SECONDS.observe(elapsed, result="timeout" if timed_out else "failed")
+            if timed_out:
+                logger.error("Speech synthesis timed out after %.1fs", timeout)
+            return False
+        result, attempt_path = winner.result()
+        os.replace(attempt_path, output_path)
+        with self._lock:
+            self.successes += 1
+            self._latency_total += elapsed
+            if winner is hedge_task:
+                self.hedge_wins += 1
+        SYNTHESIS_SECONDS.observe(elapsed, result="ok")
+        if winner is hedge_task:
+            HEDGE_WINS.inc()
+        return result
+
+    async def synthesize_many(self, items: Iterable[Tuple[str, str, str]],
+                              timeout: Optional[float] = None) -> List[BackendResult]:
+        """
+        Synthesize many (text, voice_id, output_path) items concurrently.
+        Returns one result per item, in order.
+        """
+        return list(await asyncio.gather(*(self.synthesize(text, voice_id, path, timeout)
+                                           for text, voice_id, path in items)))
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        Return request, failure, timeout and hedging counters.
+        """
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "avg_latency": self._latency_total / self.successes if self.successes else None
+            }
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Failed to clean up file %s: %s", path, e)